@@ -0,0 +1,99 @@
+# core/ansi_render.py
+import re
+import html
+import threading
+from collections import OrderedDict
+from ansi2html import Ansi2HTMLConverter # 需要 pip install ansi2html
+from .log_tailer import LogTailer
+
+SGR_RE = re.compile(r"\x1b\[([\d;]*)m")
+
+
+def advance_sgr_state(state, text):
+    """
+    跟踪颜色状态：返回 text 结束时仍然生效的 SGR 参数列表。
+    遇到 0 / 空参数就清空，其余参数依次累加 (只保留最近几个，足够还原颜色)。
+    """
+    state = list(state)
+    for m in SGR_RE.finditer(text):
+        params = m.group(1)
+        for p in (params.split(";") if params else ["0"]):
+            if p in ("", "0"):
+                state = []
+            else:
+                state.append(p)
+    return state[-8:]
+
+
+class AnsiHtmlCache:
+    """
+    日志 ANSI -> HTML 的增量缓存：
+    - 按 (日志路径, 行首偏移) 缓存已经转换好的 HTML 片段
+    - 每次刷新只转换新追加的行 (以及还没写完的最后半行)
+    - 每行记录结束时的颜色状态，下一行转换时先补上，跨行/跨 chunk 的颜色不会丢
+    """
+    _instance = None
+
+    MAX_FILES = 32
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AnsiHtmlCache, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._files = OrderedDict()
+            cls._instance.conv = Ansi2HTMLConverter(dark_bg=True, scheme='xterm', inline=True)
+        return cls._instance
+
+    def _file_cache(self, path):
+        with self._lock:
+            cache = self._files.get(path)
+            if cache is None:
+                cache = {"lock": threading.Lock(), "lines": OrderedDict()}
+                self._files[path] = cache
+                while len(self._files) > self.MAX_FILES:
+                    self._files.popitem(last=False)
+            else:
+                self._files.move_to_end(path)
+            return cache
+
+    def _convert(self, text, state):
+        prefix = f"\x1b[{';'.join(state)}m" if state else ""
+        try:
+            return self.conv.convert(prefix + text, full=False)
+        except Exception:
+            return html.escape(text)
+
+    def render_lines(self, log_path, lines=150):
+        """返回 [(行首偏移, HTML 片段), ...]；日志不存在时返回 None"""
+        rows = LogTailer().read_lines(log_path, lines)
+        if rows is None:
+            return None
+
+        cache = self._file_cache(log_path)
+        result = []
+        with cache["lock"]:
+            entries = cache["lines"]
+            state = []
+            for offset, text in rows:
+                # 同一行的 HTML 还取决于进来时的颜色 (窗口起点变了，上一行带进来的颜色可能不同)
+                key = (hash(text), tuple(state))
+                hit = entries.get(offset)
+                if hit is not None and hit[0] == key:
+                    frag, state = hit[1], hit[2]
+                else:
+                    frag = self._convert(text, state)
+                    state = advance_sgr_state(state, text)
+                    entries[offset] = (key, frag, state)
+                result.append((offset, frag))
+
+            # 只保留当前窗口附近的行，旧的丢掉
+            keep = LogTailer.MAX_LINES
+            while len(entries) > keep:
+                entries.popitem(last=False)
+        return result
+
+    def render(self, log_path, lines=150):
+        rows = self.render_lines(log_path, lines)
+        if rows is None:
+            return None
+        return "\n".join(frag for _, frag in rows)
@@ -0,0 +1,256 @@
+# core/autotune.py
+import os
+import re
+import json
+import time
+import shutil
+import datetime
+import threading
+import statistics
+from .metrics import LightningScraper
+from .process_mgr import ProcessManager
+from .job_host import raw_log_path
+
+LINE_SPLIT_RE = re.compile(r"\r\n|\n|\r")
+
+
+def read_rates(log_path, scraper=None):
+    """
+    日志里 Lightning 训练进度条的 [(step, it/s), ...] (验证进度条不算)。
+    压缩过的主日志每 progress_interval 秒只留一帧，有 .raw.log 时读原始输出；
+    探测任务本身提交时就关掉了压缩 (job_opts={"compact": False})
+    """
+    scraper = scraper or LightningScraper()
+    if not log_path or not os.path.exists(log_path):
+        return []
+    if os.path.exists(raw_log_path(log_path)):
+        log_path = raw_log_path(log_path)
+    with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    samples = []
+    for line in LINE_SPLIT_RE.split(text):
+        for rec in scraper.parse_line(line):
+            rate = rec["metrics"].get("it_per_s")
+            if rec["step"] is not None and rate:
+                samples.append((rec["step"], rate))
+    return samples
+
+
+def summarize(samples, warmup_steps=0, samples_per_it=1):
+    """
+    去掉 warmup_steps 之前的采样 (dataloader worker 启动、cudnn benchmark 都在前面)，
+    返回 {"it_per_s": 中位数, "samples_per_s", "cv": 变异系数, "n": 采样数}；没有有效采样时返回 None
+    """
+    rates = [r for step, r in samples if step >= warmup_steps]
+    if not rates:
+        return None
+    median = statistics.median(rates)
+    cv = statistics.pstdev(rates) / statistics.mean(rates) if len(rates) > 1 else 0.0
+    return {"it_per_s": median, "samples_per_s": median * samples_per_it, "cv": cv, "n": len(rates)}
+
+
+class Probe:
+    def __init__(self, name, num_workers, batch_size, world=1):
+        self.name = name
+        self.num_workers = int(num_workers)
+        self.batch_size = int(batch_size)
+        self.world = int(world)
+        # waiting -> running -> done / unstable / too_few / failed
+        self.status = "waiting"
+        self.log_path = None
+        self.started = None
+        self.last_step = 0
+        self.result = None
+        self.error = None
+
+
+class ProbeStudy:
+    """
+    DataLoader 吞吐探测：(NUM_WORKERS × BATCH_SIZE) 的每个组合跑一个很短的训练，
+    跑到 max_steps 步 (或 timeout 秒) 就停掉，按日志里的 it/s 算 samples/s，挑最快且稳定的组合。
+    - 同时在跑的探测不超过 parallel 个 (GPU 卡槽由队列管)，且所有在跑探测的 worker 数加起来不超过 CPU 核数，
+      否则互相抢 CPU，量出来的 NUM_WORKERS 没有参考价值
+    - launch_fn(probe) -> (success, log_path)，由调用方 (TrainingModule) 负责真正提交
+    - on_finish(study) 在全部探测结束后调用 (例如带着最佳设置启动正式训练)
+    """
+
+    POLL_SEC = 5
+    MAX_CV = 0.15
+    MIN_SAMPLES = 3
+
+    def __init__(self, study_id, probes, launch_fn, max_steps=200, timeout=600, parallel=1,
+                 cpu_budget=None, cleanup_dirs=None, record_dir=None, on_finish=None):
+        self.study_id = study_id
+        self.probes = probes
+        self.launch_fn = launch_fn
+        self.max_steps = int(max_steps)
+        self.warmup_steps = max(1, self.max_steps // 5)
+        self.timeout = float(timeout)
+        self.parallel = max(1, int(parallel))
+        self.cpu_budget = cpu_budget or os.cpu_count() or 1
+        self.cleanup_dirs = cleanup_dirs or []
+        self.record_dir = record_dir
+        self.on_finish = on_finish
+        self.status = "pending"
+        self.best = None
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ================= 调度 =================
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"autotune-{self.study_id}", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._stop.set()
+        for p in self.probes:
+            if p.status == "running" and p.log_path:
+                ProcessManager.stop_job(p.log_path)
+
+    def _has_room(self, probe, running):
+        if len(running) >= self.parallel:
+            return False
+        # 一个都没在跑时总要放一个出去，哪怕它自己就超过了 CPU 预算
+        used = sum(p.num_workers + 1 for p in running)
+        return not running or used + probe.num_workers + 1 <= self.cpu_budget
+
+    def _run(self):
+        self.status = "running"
+        try:
+            waiting = list(self.probes)
+            running = []
+            while (waiting or running) and not self._stop.is_set():
+                for probe in list(waiting):
+                    if not self._has_room(probe, running):
+                        break
+                    waiting.remove(probe)
+                    success, log = self.launch_fn(probe)
+                    if success:
+                        probe.status, probe.log_path = "running", log
+                        running.append(probe)
+                    else:
+                        probe.status, probe.error = "failed", log
+                for probe in list(running):
+                    if self._poll(probe):
+                        running.remove(probe)
+                self._save_record()
+                if waiting or running:
+                    self._stop.wait(self.POLL_SEC)
+            if self._stop.is_set():
+                self.status = "cancelled"
+                return
+            self.best = self.pick_best()
+            self.status = "finished"
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            self._cleanup()
+            self._save_record()
+        if self.on_finish and self.status == "finished":
+            self.on_finish(self)
+
+    def _poll(self, probe):
+        """更新一个探测的进度，结束了 (量够了 / 超时 / 进程自己退出) 返回 True"""
+        state = ProcessManager.job_state(probe.log_path)
+        if state == "queued":
+            return False
+        if probe.started is None:
+            probe.started = time.time()
+        samples = read_rates(probe.log_path)
+        probe.last_step = samples[-1][0] if samples else 0
+        enough = probe.last_step >= self.max_steps
+        timed_out = time.time() - probe.started > self.timeout
+        if state in ("running", "orphaned") and not (enough or timed_out):
+            return False
+        # 进程是我们停的，或者自己正常跑完 (一个 epoch 比 max_steps 还短)，说明这组设置本身能跑
+        healthy = state in ("running", "orphaned", "finished")
+        if state in ("running", "orphaned"):
+            ProcessManager.stop_job(probe.log_path)
+
+        probe.result = summarize(samples, self.warmup_steps, probe.batch_size * probe.world)
+        n = probe.result["n"] if probe.result else 0
+        if n < self.MIN_SAMPLES and healthy:
+            # 能跑但读数不够 (max_steps 太小 / 进度条刷新太慢)，和 OOM 之类的真失败分开
+            probe.status = "too_few"
+            probe.error = probe.error or f"只量到 {n} 个 it/s 读数 (至少 {self.MIN_SAMPLES} 个)，加大探测步数再试"
+        elif n < self.MIN_SAMPLES:
+            probe.status = "failed"
+            probe.error = probe.error or f"进程异常退出 (状态 {state})，可能 OOM 或 dataloader 崩溃"
+        elif probe.result["cv"] > self.MAX_CV:
+            probe.status = "unstable"
+        else:
+            probe.status = "done"
+        return True
+
+    def pick_best(self):
+        """samples/s 最高的稳定组合；并列时取 worker 少的 (省 CPU / 内存)"""
+        stable = [p for p in self.probes if p.status == "done"]
+        if not stable:
+            return None
+        return max(stable, key=lambda p: (round(p.result["samples_per_s"], 1), -p.num_workers))
+
+    def _cleanup(self):
+        for d in self.cleanup_dirs:
+            shutil.rmtree(d, ignore_errors=True)
+
+    # ================= 展示 / 记录 =================
+    def to_rows(self):
+        rows = []
+        for p in self.probes:
+            r = p.result or {}
+            rows.append({
+                "探测": p.name,
+                "NUM_WORKERS": p.num_workers,
+                "BATCH_SIZE": p.batch_size,
+                "状态": ("🏆 " if p is self.best else "") + p.status,
+                "step": p.last_step,
+                "it/s": round(r["it_per_s"], 2) if r else None,
+                "samples/s": round(r["samples_per_s"], 1) if r else None,
+                "波动 (CV)": round(r["cv"], 3) if r else None,
+                "错误": p.error or "",
+            })
+        return rows
+
+    def _save_record(self):
+        if not self.record_dir:
+            return
+        os.makedirs(self.record_dir, exist_ok=True)
+        record = {
+            "study_id": self.study_id,
+            "status": self.status,
+            "error": self.error,
+            "max_steps": self.max_steps,
+            "best": {"NUM_WORKERS": self.best.num_workers, "BATCH_SIZE": self.best.batch_size} if self.best else None,
+            "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+            "probes": [{"name": p.name, "num_workers": p.num_workers, "batch_size": p.batch_size,
+                        "status": p.status, "result": p.result, "log_path": p.log_path} for p in self.probes],
+        }
+        with open(os.path.join(self.record_dir, f"{self.study_id}_autotune.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+
+
+class ProbeScheduler:
+    """进程内所有吞吐探测的登记表 (单例)，页面刷新后还能看到进度"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ProbeScheduler, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._studies = {}
+        return cls._instance
+
+    def start(self, study):
+        with self._lock:
+            old = self._studies.get(study.study_id)
+            if old and old.status == "running":
+                raise RuntimeError(f"{study.study_id} 还在跑，先取消再重新提交")
+            self._studies[study.study_id] = study
+        study.start()
+        return study
+
+    def get(self, study_id):
+        with self._lock:
+            return self._studies.get(study_id)
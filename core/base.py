@@ -3,18 +3,40 @@ import streamlit as st
 from abc import ABC, abstractmethod
 from .context import GlobalContext 
 from .process_mgr import ProcessManager
+from .gpu_queue import GPUJobQueue
+from .ansi_render import AnsiHtmlCache
+from .log_stream import LogStreamServer
+from .job_registry import JobRegistry
+from .failure_watch import FailureRecovery
 import os
-import time
+import json
+from urllib.parse import urlencode
 import streamlit.components.v1 as components
-from ansi2html import Ansi2HTMLConverter # 需要 pip install ansi2html
 
 class BaseModule(ABC):
+    # 日志面板的终端样式，模仿 VSCode 终端
+    TERMINAL_CSS = """
+        <style>
+            body {
+                background-color: #1e1e1e;
+                color: #cccccc;
+                font-family: 'Menlo', 'Monaco', 'Courier New', monospace;
+                font-size: 12px;
+                margin: 0; padding: 10px;
+                line-height: 1.2;
+            }
+            .ansi2html-content { white-space: pre-wrap; word-break: break-all; }
+            /* 隐藏 ansi2html 生成的头信息 */
+            .original-src { display: none; }
+        </style>
+        """
+    # 局部刷新区域 (日志面板等) 的默认刷新间隔 (秒)
+    LIVE_REFRESH_SEC = 5
+
     def __init__(self):
         self.ctx = GlobalContext()
         self.name = "Unknown"
         self.icon = "📦"
-        # 初始化转换器 (黑底白字)
-        self.conv = Ansi2HTMLConverter(dark_bg=True, scheme='xterm', inline=True)
         self._key_prefix = self.__class__.__name__ 
     
     def _get_key(self, widget_name):
@@ -28,12 +50,67 @@ class BaseModule(ABC):
     def set_state(self, key, value):
         full_key = f"{self.__class__.__name__}_{key}"
         st.session_state[full_key] = value
+        if key == "last_log_path":
+            # 任务归到当前模块名下，刷新浏览器 / 重启服务后还能从任务表找回来
+            JobRegistry().attach(value, self._key_prefix)
     
+    def render_gpu_selector(self, label="GPU", key="gpu_select"):
+        """侧边栏的 GPU 选择：auto 表示交给队列挑最空闲的卡"""
+        gpu_queue = GPUJobQueue()
+        options = ["auto"] + gpu_queue.devices
+        choice = st.selectbox(label, options, key=self._get_key(key),
+                              help="auto: 由 GPU 队列自动分配空闲的卡 (自动设置 CUDA_VISIBLE_DEVICES)")
+        snap = gpu_queue.snapshot()
+        if snap["slots"]:
+            usage = " | ".join(f"#{d}: {snap['usage'].get(d, 0)}/{n}" for d, n in snap["slots"].items())
+            st.caption(f"卡槽占用 {usage} · 排队 {len(snap['pending'])}")
+        else:
+            st.caption("⚠️ 没有探测到 GPU")
+        return choice
+
+    def render_cache_toggle(self, key="force_rerun"):
+        """输入和参数都没变时默认直接复用上次的产物 (见 core/result_cache.py)，勾上则强制重跑"""
+        return st.checkbox("🔁 强制重跑 (忽略结果缓存)", value=False, key=self._get_key(key),
+                           help="同样的命令 + 参数 + 输入文件内容之前成功跑过且产物还在时，会直接返回上次的结果")
+
+    def notify_cache_hit(self, log_path):
+        """提交后调用：命中缓存时提示一下，返回是否命中"""
+        if ProcessManager.cache_hit(log_path):
+            st.toast("♻️ 输入和参数都没变，直接复用上次的结果 (日志为上次那次运行)")
+            return True
+        return False
+
+    def live_region(self, render_fn, run_every=None):
+        """
+        把 render_fn 包成局部刷新区域 (st.fragment)：
+        按 run_every 秒只重跑这一块，区域里的组件交互也只重跑这一块，不会 rerun 整个 main.py。
+        老版本 streamlit 没有 fragment 时退化为普通调用。
+        用法: self.live_region(self._render_xxx, run_every=5)(arg1, arg2)
+        """
+        fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+        if fragment is None:
+            return render_fn
+        return fragment(run_every=run_every)(render_fn)
+
     def render_log_monitor(self):
         st.divider()
         st.subheader("📋 实时终端监控 (Live Terminal)")
         
         log_path = self.get_state("last_log_path")
+        if not log_path:
+            # session 丢了 (刷新 / 重启)：从持久化任务表里接上本模块最近的任务
+            latest = JobRegistry().latest(self._key_prefix)
+            if latest and os.path.exists(latest["log_path"]):
+                log_path = latest["log_path"]
+                self.set_state("last_log_path", log_path)
+
+        # 任务失败后被自动重新排队的话，跟到新的那个
+        resolved = FailureRecovery().resolve(log_path) if log_path else log_path
+        if resolved != log_path:
+            log_path = resolved
+            self.set_state("last_log_path", log_path)
+
+        self._render_job_picker(log_path)
 
         # 1. 控制栏
         c1, c2, c3 = st.columns([1, 1.5, 5])
@@ -43,49 +120,93 @@ class BaseModule(ABC):
         with c2:
             # 默认开启自动刷新，为了看进度条
             auto_refresh = st.toggle("⚡ 自动同步", value=False, key=f"tog_{self.name}")
+
+        # 自动同步时，状态栏和日志面板各自按间隔局部刷新，页面其余部分不动
+        run_every = self.LIVE_REFRESH_SEC if auto_refresh else None
         with c3:
-            if log_path:
-                st.caption(f"Watching: `{os.path.basename(log_path)}`")
-            else:
-                st.info("等待任务启动...")
-
-        # 2. 读取日志 (已在 ProcessManager 里处理了 \r 回车符)
-        raw_content = ProcessManager.read_log_tail(log_path, lines=150)
-
-        # 3. 转换为 HTML (保留颜色!)
-        # 将 \n 转换为 <br>，并处理颜色代码
-        try:
-            html_content = self.conv.convert(raw_content, full=False)
-        except:
-            html_content = f"<pre>{raw_content}</pre>"
-
-        # 4. 渲染 CSS 样式，模仿 VSCode 终端
+            self.live_region(self._render_job_caption, run_every=run_every)(log_path)
+
+        # 2. 自动同步：优先走 SSE 推送，日志面板自己更新
+        if auto_refresh and log_path and LogStreamServer().ensure_started():
+            self._render_log_stream(log_path)
+            return
+
+        # 3. 推送服务起不来 (端口被占用 / 配置关闭) 时退回定时局部刷新
+        self.live_region(self._render_log_snapshot, run_every=run_every)(log_path)
+
+    def _render_job_picker(self, log_path):
+        """本模块的历史任务：按状态过滤、切换查看、结束上一次启动留下的任务"""
+        jobs = JobRegistry().list(module=self._key_prefix, limit=50)
+        if not jobs:
+            return
+        with st.expander(f"🗂️ 本模块任务 ({len(jobs)})", expanded=False):
+            statuses = sorted({j["status"] for j in jobs if j["status"]})
+            chosen = st.multiselect("状态", statuses, default=statuses, key=self._get_key("job_status_filter"))
+            jobs = [j for j in jobs if j["status"] in chosen]
+            if not jobs:
+                return
+            labels = {j["log_path"]: f"{j['task_name']} · {j['status']} · {j['start_time'] or '-'}" for j in jobs}
+            paths = list(labels.keys())
+            idx = paths.index(log_path) if log_path in paths else 0
+            picked = st.selectbox("任务", paths, index=idx, format_func=labels.get,
+                                  key=self._get_key("job_pick"))
+            b1, b2 = st.columns(2)
+            if b1.button("👀 接管查看", key=self._get_key("job_attach"), use_container_width=True):
+                self.set_state("last_log_path", picked)
+                st.rerun()
+            if b2.button("⏹️ 结束任务", key=self._get_key("job_stop"), use_container_width=True):
+                if ProcessManager.stop_job(picked):
+                    st.toast("已发送结束信号")
+                else:
+                    st.warning("任务已经结束或无法结束")
+
+    def _render_job_caption(self, log_path):
+        if not log_path:
+            st.info("等待任务启动...")
+            return
+        job = ProcessManager.get_job(log_path)
+        job_info = f" · PID {job.pid} · {job.status}" if job else ""
+        if job and job.exit_code is not None:
+            job_info += f" (exit {job.exit_code})"
+        if not job:
+            # 不归当前进程管的任务 (上一次启动留下的)，看任务表里的记录
+            row = JobRegistry().get(log_path)
+            if row:
+                job_info = f" · PID {row['pid'] or '?'} · {row['status']}"
+        failure = job.failure if job else None
+        if not failure:
+            row = JobRegistry().get(log_path)
+            failure = row.get("failure") if row else None
+        if failure:
+            job_info += f" · ⚠️ {failure[:120]}"
+        usage = ProcessManager.job_usage(log_path) if job and job.is_alive else None
+        if usage:
+            job_info += f" · CPU {usage['cpu_pct']:.0f}% · RSS {usage['rss_mb'] / 1024:.1f}G"
+            if usage["gpu_mem_mb"]:
+                job_info += f" · 显存 {usage['gpu_mem_mb'] / 1024:.1f}G"
+        queue_pos = GPUJobQueue().position(log_path)
+        if queue_pos:
+            job_info = f" · ⏳ 排队中 (第 {queue_pos} 位)"
+        st.caption(f"Watching: `{os.path.basename(log_path)}`{job_info}")
+
+    def _render_log_snapshot(self, log_path):
+        # 读取日志 + 转换为 HTML (保留颜色!)
+        # 增量缓存：只有新追加的行才会过一遍 ansi2html，颜色状态跨行延续
+        html_content = AnsiHtmlCache().render(log_path, lines=150) if log_path else None
+        if html_content is None:
+            html_content = "⏳ 等待任务启动..."
+
+        # 渲染 CSS 样式，模仿 VSCode 终端
         import datetime
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
 
-        custom_css = """
-        <style>
-            body {
-                background-color: #1e1e1e;
-                color: #cccccc;
-                font-family: 'Menlo', 'Monaco', 'Courier New', monospace;
-                font-size: 12px;
-                margin: 0; padding: 10px;
-                line-height: 1.2;
-            }
-            .ansi2html-content { white-space: pre-wrap; word-break: break-all; }
-            /* 隐藏 ansi2html 生成的头信息 */
-            .original-src { display: none; }
-        </style>
-        """
-
         final_html = f"""
         <!DOCTYPE html>
         <html>
-        <head>{custom_css}</head>
+        <head>{self.TERMINAL_CSS}</head>
         <body>
             <div id="term-box">
-                {html_content}
+                <div class="ansi2html-content">{html_content}</div>
                 <div style="margin-top:10px; color:#666; border-top:1px dashed #444; padding-top:5px;">
                     > Last Sync: {timestamp} (Auto-scroll enabled)
                 </div>
@@ -96,14 +217,64 @@ class BaseModule(ABC):
         </body>
         </html>
         """
-
-        # 5. 显示
         components.html(final_html, height=450, scrolling=True)
 
-        # 6. 自动刷新逻辑
-        if auto_refresh:
-            time.sleep(5) # 每1秒刷新一次，模拟实时感
-            st.rerun()
+    def _render_log_stream(self, log_path, lines=150):
+        """
+        订阅 LogStreamServer 的 SSE 推送。
+        这段 HTML 只和 log_path 有关，rerun 时内容不变，iframe 不会被重建。
+        """
+        server = LogStreamServer()
+        query = urlencode({"path": log_path, "lines": lines, "token": server.token})
+        if server.public_url:
+            base_js = json.dumps(server.public_url.rstrip("/"))
+        else:
+            base_js = (f"window.parent.location.protocol + '//' + "
+                       f"window.parent.location.hostname + ':{server.port}'")
+
+        stream_html = f"""
+        <!DOCTYPE html>
+        <html>
+        <head>{self.TERMINAL_CSS}</head>
+        <body>
+            <div id="term-box" class="ansi2html-content"></div>
+            <div id="term-status" style="margin-top:10px; color:#666; border-top:1px dashed #444; padding-top:5px;">
+                > 正在连接日志推送...
+            </div>
+            <script>
+                const MAX_LINES = {lines};
+                const box = document.getElementById('term-box');
+                const statusBox = document.getElementById('term-status');
+                const rows = new Map();
+                const es = new EventSource({base_js} + '/stream?{query}');
+                es.onmessage = (ev) => {{
+                    const msg = JSON.parse(ev.data);
+                    const atBottom = window.innerHeight + window.scrollY >= document.body.scrollHeight - 30;
+                    if (msg.reset) {{ box.innerHTML = ''; rows.clear(); }}
+                    for (const [offset, frag] of msg.lines) {{
+                        let el = rows.get(offset);
+                        if (!el) {{
+                            el = document.createElement('div');
+                            box.appendChild(el);
+                            rows.set(offset, el);
+                        }}
+                        el.innerHTML = frag || '&nbsp;';
+                    }}
+                    while (rows.size > MAX_LINES) {{
+                        const first = rows.keys().next().value;
+                        rows.get(first).remove();
+                        rows.delete(first);
+                    }}
+                    const job = msg.job ? ` · PID ${{msg.job.pid}} · ${{msg.job.status}}` : '';
+                    statusBox.textContent = `> Live: ${{new Date().toLocaleTimeString()}}${{job}}`;
+                    if (atBottom) window.scrollTo(0, document.body.scrollHeight);
+                }};
+                es.onerror = () => {{ statusBox.textContent = '> 推送连接断开，正在重连...'; }};
+            </script>
+        </body>
+        </html>
+        """
+        components.html(stream_html, height=450, scrolling=True)
 
     @abstractmethod
     def render_sidebar(self):
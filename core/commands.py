@@ -0,0 +1,127 @@
+# core/commands.py
+"""
+各模块的命令构造器：单独跑 (各自的页面) 和串成流水线 (PipelineModule) 用的是同一套命令。
+这里只拼字符串 / 配置，不碰 streamlit，也不启动任何进程。
+"""
+import os
+import copy
+
+# GVHMR 环境的 python (请根据实际情况修改路径)
+GVHMR_PYTHON = "/root/miniconda3/envs/gvhmr/bin/python"
+# 参数注入垫片 (见 core/job_shim.py)，任务在别的仓库目录下跑，所以用绝对路径
+JOB_SHIM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "job_shim.py")
+# 常驻 / 批量推理 worker (见 core/infer_worker.py)，同样在 MCM-LDM 的环境里执行
+INFER_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "infer_worker.py")
+
+
+# ================= GVHMR =================
+def gvhmr_inference_cmd(input_rel_path, output_rel_path, skip_visual_odometry=True, python_exec=GVHMR_PYTHON):
+    """GVHMR 文件夹推理 (在 GVHMR 根目录下执行)；CUDA_VISIBLE_DEVICES 由 GPU 队列填写"""
+    flag_s = "-s" if skip_visual_odometry else ""
+    return (
+        f"PYTHONPATH=. "
+        f"{python_exec} tools/demo/demo_folder.py "
+        f"-f {input_rel_path} "
+        f"-d {output_rel_path} "
+        f"{flag_s}"
+    )
+
+
+def gvhmr_convert_cmd(root_dir, smpl_dir, python_exec=GVHMR_PYTHON):
+    """把 GVHMR 输出目录下的 .pt 结果批量转成以视频命名的 .npy"""
+    return (
+        f"{python_exec} tools/MY_convertTool/batch_convert_pt2npy.py "
+        f"--root_dir {root_dir} "
+        f"--smpl_dir {smpl_dir}"
+    )
+
+
+# ================= HumanML3D 转换 =================
+def motion_convert_cmd(script_path, start_stage, end_stage, input_path, output_dir, is_dir=True, render_mp4=False):
+    input_flag = "--input_dir" if is_dir else "--input_file"
+    cmd = (f"python {script_path} --start_stage {start_stage} --end_stage {end_stage} "
+           f"{input_flag} '{input_path}' --output_dir '{output_dir}'")
+    if render_mp4:
+        cmd += " --render_mp4"
+    return cmd
+
+
+# ================= MLD 推理 =================
+def build_inference_cfg(launcher_cfg, ckpt_path, prompt_text, name=None):
+    """在训练时的 launcher_config 上改出推理配置；name 不为空时覆盖 NAME (结果目录跟着变)"""
+    inf_config = copy.deepcopy(launcher_cfg)
+    if 'TEST' not in inf_config: inf_config['TEST'] = {}
+    inf_config['TEST']['CHECKPOINTS'] = ckpt_path
+    inf_config['TEST']['MULTI_MODAL_TYPE'] = 'text'
+    inf_config['TEST']['MULTI_MODAL_TEXT_PROMPT'] = prompt_text
+    if name:
+        inf_config['NAME'] = name
+    return inf_config
+
+
+# demo 脚本 (相对 MCM-LDM 根目录)
+MLD_DEMO_SCRIPT = "demo_transfer_with_scene.py"
+
+
+def mld_inference_args(cfg_path, assets_file, content_dir, style_dir, scale=2.5, render_video=False):
+    """demo 脚本的参数列表；单独起进程和发给常驻 worker (core/worker_pool.py) 用的是同一份"""
+    args = [
+        "--cfg", cfg_path,
+        "--cfg_assets", assets_file,
+        "--content_motion_dir", content_dir,
+        "--style_motion_dir", style_dir,
+        "--scale", str(scale)
+    ]
+    if render_video:
+        args.append("--render_video")
+    return args
+
+
+def mld_inference_cmd(cfg_path, assets_file, content_dir, style_dir, scale=2.5, render_video=False, params_file=None):
+    """params_file 不为空时经 job_shim 启动，mld.py 里的常量 (FiLM scalar 等) 按任务单独注入"""
+    python_exec = f"python -u {JOB_SHIM} --params {params_file}" if params_file else "python -u"
+    args = mld_inference_args(cfg_path, assets_file, content_dir, style_dir, scale, render_video)
+    return " ".join([python_exec, MLD_DEMO_SCRIPT] + args)
+
+
+def mld_batch_cmd(manifest_path, root_dir, python_exec="python"):
+    """一个进程按 manifest 跑完整个 sweep 矩阵，checkpoint 只加载一次"""
+    return f"{python_exec} -u {INFER_WORKER} --batch {manifest_path} --root {root_dir}"
+
+
+def mld_results_dir(root_dir, exp_name):
+    """demo 脚本把结果写在 results/mld/<NAME>/ 下面的新子目录里"""
+    return os.path.join(root_dir, "results", "mld", exp_name)
+
+
+# ================= MLD 训练 =================
+def mld_train_cmd(train_script, cfg_path, assets_file, batch_size, n_procs=1, rank_log_dir=None):
+    """
+    单卡直接 python train.py；多卡用 torchrun 拉起 n_procs 个 rank (Lightning 会认出 torchelastic 的环境变量)。
+    --tee 3：每个 rank 的输出写进 rank_log_dir 下各自的日志，同时带 [defaultN]: 前缀汇到任务主日志里。
+    batch_size 是每张卡的 BS。
+    """
+    args = f"{train_script} --cfg {cfg_path} --cfg_assets {assets_file} --batch_size {batch_size} --nodebug"
+    if n_procs <= 1:
+        return f"python -u {args}"
+    log_flags = f"--log_dir {rank_log_dir} --tee 3 " if rank_log_dir else ""
+    return (f"python -u -m torch.distributed.run --standalone --nnodes 1 --nproc_per_node {n_procs} "
+            f"{log_flags}{args}")
+
+
+# ================= 渲染 =================
+def render_cmd(render_script, input_path, iters, mode, res, extra_arg="", is_gt=False,
+               scene_name="default_scene", use_guide_hint=False):
+    # 注意：这里 input_path 可能包含空格，建议用引号包起来，虽然 autodl 路径通常没有空格
+    cmd = f"bash {render_script} --input_folder '{input_path}' --iters {iters} --mode {mode} --res {res} {extra_arg}"
+    if is_gt:
+        cmd += " --gt"
+    cmd += f" --scene_name {scene_name}"
+    if use_guide_hint:
+        cmd += " --use_guide_hint"
+    return cmd
+
+
+def stitch_videos_cmd(list_file, output_path):
+    """把按帧分段渲染出来的 mp4 首尾拼成一个 (各段编码参数一致，直接 copy 不重新编码)"""
+    return f"ffmpeg -y -loglevel error -f concat -safe 0 -i '{list_file}' -c copy '{output_path}'"
@@ -0,0 +1,76 @@
+# core/distributed.py
+"""
+多卡 (DDP) 训练的纯函数：配置里的 DEVICE 列表、LR / BS 随卡数的缩放、各 rank 日志的位置。
+不碰 streamlit / GPU，没有卡的机器上也能直接调用和检查结果。
+"""
+import os
+import re
+import glob
+import math
+import copy
+
+# 缩放规则：侧边栏的 LR / Batch Size 按单卡调好的，换成 world 张卡时怎么改
+SCALE_RULES = {
+    "none": "不缩放 (每卡 BS 不变，全局 BS ×N，LR 不变)",
+    "linear": "线性 (每卡 BS 不变，LR ×N)",
+    "sqrt": "平方根 (每卡 BS 不变，LR ×√N)",
+    "keep_global": "保持全局 BS (每卡 BS ÷N，LR 不变)",
+}
+
+
+def scale_hparams(lr, bs, world, rule="linear", base_world=1):
+    """
+    返回 {"lr", "bs" (每卡), "global_bs"}：base_world 张卡上的 (lr, bs) 换到 world 张卡上。
+    keep_global 除不尽时向下取整，至少为 1。
+    """
+    lr, bs, world = float(lr), int(bs), max(1, int(world))
+    k = world / max(1, int(base_world))
+    if rule == "none":
+        new_lr, new_bs = lr, bs
+    elif rule == "linear":
+        new_lr, new_bs = lr * k, bs
+    elif rule == "sqrt":
+        new_lr, new_bs = lr * math.sqrt(k), bs
+    elif rule == "keep_global":
+        new_lr, new_bs = lr, max(1, int(bs / k))
+    else:
+        raise ValueError(f"未知的缩放规则: {rule}")
+    return {"lr": new_lr, "bs": new_bs, "global_bs": new_bs * world}
+
+
+def apply_world_size(cfg, world):
+    """
+    DEVICE 写成 [0, 1, ..., world-1]：真正用哪几张卡由 GPU 队列的 CUDA_VISIBLE_DEVICES 决定，
+    进程里看到的卡号总是从 0 开始。返回新的配置 (不改动 cfg)。
+    """
+    new_cfg = copy.deepcopy(cfg)
+    new_cfg["DEVICE"] = list(range(max(1, int(world))))
+    return new_cfg
+
+
+def rank_log_dir(exp_dir, stamp):
+    """torchrun 的 --log-dir：每次启动一个子目录"""
+    return os.path.join(exp_dir, "rank_logs", stamp)
+
+
+def latest_rank_log_dir(exp_dir):
+    dirs = glob.glob(os.path.join(exp_dir, "rank_logs", "*"))
+    return max(dirs, key=os.path.getmtime) if dirs else None
+
+
+def rank_logs(log_dir):
+    """
+    {local_rank: stdout 日志路径}。torchrun 的目录结构是 <log_dir>/<run_id>/attempt_<n>/<rank>/stdout.log，
+    重启过多次时取最后一次 attempt。
+    """
+    found = {}
+    for path in glob.glob(os.path.join(log_dir, "**", "attempt_*", "*", "stdout.log"), recursive=True):
+        rank_dir = os.path.dirname(path)
+        attempt = re.search(r"attempt_(\d+)", path)
+        rank = os.path.basename(rank_dir)
+        if not rank.isdigit():
+            continue
+        key = (int(attempt.group(1)) if attempt else 0, os.path.getmtime(path))
+        if int(rank) not in found or key > found[int(rank)][0]:
+            found[int(rank)] = (key, path)
+    return {rank: path for rank, (_, path) in sorted(found.items())}
@@ -0,0 +1,174 @@
+# core/failure_watch.py
+import os
+import re
+import copy
+import codecs
+import threading
+from .utils import load_global_config
+
+ANSI_RE = re.compile(r"\x1b\[[\d;?]*[A-Za-z]")
+LINE_SPLIT_RE = re.compile(r"\r\n|\n|\r")
+
+# ================= 失败特征 (可插拔) =================
+# 名字 -> 正则 (忽略大小写，逐行匹配)。global_config.yaml 的 failure_watch.patterns 可以追加 / 覆盖，
+# 代码里也可以 register_pattern() 注册新的
+FAILURE_PATTERNS = {
+    "nan_loss": r"\b[\w/]*loss[\w/]*\s*[=:]\s*(?:tensor\()?nan\b|loss is nan|detected nan",
+    "cuda_oom": r"CUDA out of memory|OutOfMemoryError|CUBLAS_STATUS_ALLOC_FAILED",
+    "dataloader_crash": r"DataLoader worker \(pids?\(?s?\)? ?[\d, ]+\)? (?:is killed|exited unexpectedly)"
+                        r"|RuntimeError: DataLoader worker",
+    "nccl_error": r"NCCL error|ProcessGroupNCCL.*(?:Timeout|watchdog)",
+}
+
+
+def register_pattern(name, regex):
+    FAILURE_PATTERNS[name] = regex
+
+
+def active_patterns():
+    """内置 + 配置里追加的，去掉 disabled 里列出的"""
+    cfg = load_global_config("failure_watch")
+    patterns = dict(FAILURE_PATTERNS)
+    patterns.update(cfg.get("patterns") or {})
+    for name in cfg.get("disabled") or []:
+        patterns.pop(name, None)
+    return patterns
+
+
+class FailureWatcher:
+    """
+    串在 JobSupervisor 的 pty 读取线程里，逐行匹配失败特征，第一次命中时返回 (特征名, 那一行)。
+    所有特征合成一个正则，每行只扫一遍；跨 chunk 的半行留到下一次。
+    """
+    MAX_CARRY = 8192
+
+    def __init__(self, patterns):
+        self.names = list(patterns.keys())
+        self._re = re.compile("|".join(f"(?P<p{i}>{rx})" for i, rx in enumerate(patterns.values())),
+                              re.IGNORECASE) if patterns else None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._carry = ""
+        self.matched = None
+
+    def feed(self, data):
+        if self._re is None or self.matched:
+            return None
+        text = self._carry + self._decoder.decode(data)
+        lines = LINE_SPLIT_RE.split(text)
+        self._carry = lines.pop()[-self.MAX_CARRY:]
+        for line in lines:
+            m = self._re.search(ANSI_RE.sub("", line))
+            if m:
+                self.matched = (self.names[int(m.lastgroup[1:])], ANSI_RE.sub("", line).strip()[:300])
+                return self.matched
+        return None
+
+
+# ================= 失败后的处理 =================
+class FailureRecovery:
+    """
+    按失败原因决定要不要自动重新排队 (单例)：
+    - 提交训练时 watch() 登记一份“怎么重新提交”(relaunch 回调 + 配置 + 实验目录)
+    - ProcessManager 的退出回调 on_job_exit()：任务被 FailureWatcher 判定失败时按策略处理
+        resume     带 TRAIN.RESUME = 最新 checkpoint 重新排队
+        shrink_bs  BATCH_SIZE 乘以 bs_factor 后带 RESUME 重新排队 (OOM)
+        none       只记录原因
+      被高优先级任务抢占 (preempted) 的按 resume 处理，不算重试次数
+    - 重新排队的任务日志路径不一样，resolve() 顺着链找到最新的那一个 (日志面板 / 早停调度都靠它跟上)
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(FailureRecovery, cls).__new__(cls)
+            cls._instance._init_recovery()
+        return cls._instance
+
+    def _init_recovery(self):
+        cfg = load_global_config("failure_watch")
+        self.policies = {"cuda_oom": "shrink_bs", "nan_loss": "resume",
+                         "dataloader_crash": "resume", "nccl_error": "resume", "preempted": "resume"}
+        self.policies.update(cfg.get("policies") or {})
+        self.max_retries = int(cfg.get("max_retries", 2))
+        self.bs_factor = float(cfg.get("bs_factor", 0.5))
+        self._lock = threading.Lock()
+        self._specs = {}
+        self._next = {}
+        self._retrying = set()
+
+    def watch(self, log_path, relaunch, cfg_data, exp_dir, bs, attempt=0):
+        """relaunch(cfg_data, bs) -> (success, log_path)"""
+        with self._lock:
+            self._specs[log_path] = {"relaunch": relaunch, "cfg": cfg_data, "exp_dir": exp_dir,
+                                     "bs": int(bs), "attempt": attempt}
+
+    def resolve(self, log_path):
+        with self._lock:
+            seen = set()
+            while log_path in self._next and log_path not in seen:
+                seen.add(log_path)
+                log_path = self._next[log_path]
+        return log_path
+
+    def pending_retry(self, log_path):
+        """任务刚结束、还没决定要不要重新排队 (调度器轮询时别急着判失败)"""
+        with self._lock:
+            return log_path in self._specs or log_path in self._retrying
+
+    def on_job_exit(self, job):
+        cause = job.failure
+        name = cause.split(":", 1)[0] if cause else None
+        policy = self.policies.get(name, "none")
+        with self._lock:
+            spec = self._specs.pop(job.log_path, None)
+            if spec and cause and policy != "none" and (name == "preempted" or spec["attempt"] < self.max_retries):
+                self._retrying.add(job.log_path)
+        if not spec or not cause:
+            return
+        try:
+            self._retry(job, spec, cause, policy)
+        finally:
+            with self._lock:
+                self._retrying.discard(job.log_path)
+
+    def _retry(self, job, spec, cause, policy):
+        from .halving import latest_checkpoint
+        from .job_registry import JobRegistry
+        preempted = cause.startswith("preempted:")
+        if policy == "none" or (spec["attempt"] >= self.max_retries and not preempted):
+            note = "不自动重试" if policy == "none" else f"已重试 {spec['attempt']} 次，不再重试"
+            self._note(job, f"{cause} · {note}")
+            return
+
+        cfg = copy.deepcopy(spec["cfg"])
+        bs = spec["bs"]
+        if policy == "shrink_bs":
+            bs = max(1, int(bs * self.bs_factor))
+            cfg["TRAIN"]["BATCH_SIZE"] = bs
+        ckpt = latest_checkpoint(spec["exp_dir"])
+        if ckpt:
+            cfg["TRAIN"]["RESUME"] = ckpt
+        success, new_log = spec["relaunch"](cfg, bs)
+        if not success:
+            self._note(job, f"{cause} · 重新排队失败: {new_log}")
+            return
+
+        with self._lock:
+            self._next[job.log_path] = new_log
+        attempt = spec["attempt"] if preempted else spec["attempt"] + 1
+        self.watch(new_log, spec["relaunch"], cfg, spec["exp_dir"], bs, attempt=attempt)
+        # 新任务归到原来的模块名下
+        row = JobRegistry().get(job.log_path)
+        if row and row.get("module"):
+            JobRegistry().attach(new_log, row["module"])
+        detail = f"BS {spec['bs']}→{bs}, " if bs != spec["bs"] else ""
+        detail += f"RESUME {os.path.basename(ckpt)}" if ckpt else "没有 checkpoint，从头开始"
+        what = "重新排队" if preempted else f"第 {attempt} 次重新排队"
+        self._note(job, f"{cause} · {what} ({detail}) -> {new_log}")
+
+    @staticmethod
+    def _note(job, text):
+        from .job_registry import JobRegistry
+        JobRegistry().upsert(job.log_path, failure=text)
+        with open(job.log_path, "a", encoding="utf-8") as f:
+            f.write(f"[FailureWatch] {text}\n")
@@ -0,0 +1,66 @@
+# core/file_watch.py
+import os
+import glob
+import time
+from .telemetry import scan_proc, process_tree
+
+
+def open_for_write(path, pids):
+    """pids 里有没有进程还开着 path 的写句柄 (读 /proc/<pid>/fd 和 fdinfo 的 flags)"""
+    target = os.path.realpath(path)
+    for pid in pids:
+        fd_dir = f"/proc/{pid}/fd"
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                if os.readlink(os.path.join(fd_dir, fd)) != target:
+                    continue
+                with open(f"/proc/{pid}/fdinfo/{fd}") as f:
+                    flags = next((line.split()[1] for line in f if line.startswith("flags:")), "0")
+            except OSError:
+                continue
+            # O_WRONLY = 1, O_RDWR = 2 (八进制 flags 的最低两位)
+            if int(flags, 8) & 0o3:
+                return True
+    return False
+
+
+class ReadyFile:
+    """
+    文件就绪判断 (轮询，不依赖 inotify)：folder 下匹配 pattern、修改时间不早于 since 的最新文件，
+    满足下面两条就算“写完了”：
+    - 大小和 mtime 连续 settle 秒没有变化
+    - 生产它的任务进程树 (root_pid) 里没有进程还开着它的写句柄
+    每次 poll() 只 stat 一个目录，调度线程可以很频繁地调用。
+    """
+
+    def __init__(self, folder, pattern, since=0, settle=5.0):
+        self.folder = folder
+        self.pattern = pattern
+        self.since = since
+        self.settle = settle
+        self._path = None
+        self._sig = None
+        self._stable_from = None
+
+    def poll(self, root_pid=None):
+        """写完了返回文件路径，否则返回 None"""
+        files = [f for f in glob.glob(os.path.join(self.folder, self.pattern))
+                 if os.path.getmtime(f) >= self.since]
+        if not files:
+            return None
+        path = max(files, key=os.path.getmtime)
+        st = os.stat(path)
+        sig = (path, st.st_size, st.st_mtime)
+        now = time.time()
+        if sig != self._sig:
+            self._sig, self._path, self._stable_from = sig, path, now
+            return None
+        if now - self._stable_from < self.settle or st.st_size == 0:
+            return None
+        if root_pid and open_for_write(path, process_tree(root_pid, scan_proc())):
+            return None
+        return path
@@ -0,0 +1,408 @@
+# core/gpu_queue.py
+import itertools
+import subprocess
+import threading
+import datetime
+from .utils import load_global_config
+from .job_registry import JobRegistry
+
+
+# ================= 设备探测 (可插拔) =================
+class DeviceProbe:
+    """设备探测接口：返回可用 GPU 编号列表 (字符串)"""
+
+    def list_devices(self):
+        raise NotImplementedError
+
+
+class NvidiaSmiProbe(DeviceProbe):
+    def list_devices(self):
+        try:
+            out = subprocess.check_output(
+                ["nvidia-smi", "--query-gpu=index", "--format=csv,noheader"],
+                stderr=subprocess.DEVNULL, timeout=5,
+            ).decode("utf-8", errors="ignore")
+            return [line.strip() for line in out.splitlines() if line.strip()]
+        except Exception:
+            return []
+
+
+class FakeDeviceProbe(DeviceProbe):
+    """纯 CPU 机器 / 调试用：直接给一个假的设备列表"""
+
+    def __init__(self, devices):
+        self.devices = [str(d) for d in devices]
+
+    def list_devices(self):
+        return list(self.devices)
+
+
+def make_probe(sched_cfg):
+    fake = sched_cfg.get("fake_devices") or []
+    if fake:
+        return FakeDeviceProbe(fake)
+    return NvidiaSmiProbe()
+
+
+# ================= 优先级 =================
+# 交互式的推理 / 单次渲染排在后台 sweep 前面；同一优先级内先来先派发
+PRIORITIES = {"interactive": 2, "normal": 1, "background": 0}
+
+
+# ================= 排队中的任务 =================
+class QueuedJob:
+    def __init__(self, ticket_id, command, task_name, root_dir, log_path,
+                 devices=None, num_devices=1, env=None, group=None, priority="normal", preemptible=False,
+                 job_opts=None):
+        self.ticket_id = ticket_id
+        self.command = command
+        self.task_name = task_name
+        self.root_dir = root_dir
+        self.log_path = log_path
+        self.allowed_devices = devices      # None = 任意卡
+        self.num_devices = num_devices
+        self.env = env or {}
+        self.job_opts = job_opts
+        # 同一组 (例如一次 sweep) 的任务共享并发上限
+        self.group = group
+        self.priority = priority
+        self.level = PRIORITIES[priority]
+        # 能不能被更高优先级的任务抢占 (要能从 checkpoint 续跑才设 True)
+        self.preemptible = preemptible
+
+        # queued -> dispatched / cancelled / failed
+        self.status = "queued"
+        self.assigned = []
+        self._released = False
+        self.submit_time = datetime.datetime.now().isoformat(timespec="seconds")
+        self.dispatch_seq = 0
+        # 抢占：被谁抢了 (运行中的任务) / 在等哪些任务让位、给自己留着哪些卡 (排队中的任务)
+        self.preempted_by = None
+        self._preemptor = None
+        self._preempt_claimed = False
+        self.waiting_for = set()
+        self.reserved = []
+        # 已经交给 ProcessManager 拉起来了 (_launch 握手完成)
+        self.launched = False
+
+
+class GPUJobQueue:
+    """
+    按 GPU 槽位派发任务的队列：
+    - 每张卡有固定数量的槽位 (slots_per_device，可按卡单独覆盖)
+    - 提交时先排队，有空闲槽位时才真正交给 ProcessManager 启动
+    - 任务结束 (on_exit 回调) 后释放槽位并继续派发
+    - 可以给一组任务设并发上限 (group_limit)，超出的继续排队
+    - 按优先级派发 (interactive > normal > background)；scheduler.preemption 打开时，
+      排不上的高优先级任务会抢占同卡上 preemptible 的低优先级任务 (SIGTERM，之后带 RESUME 重新排队)
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            # 和 JobSupervisor 一样：初始化完再挂到 _instance 上
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super(GPUJobQueue, cls).__new__(cls)
+                    instance._init_queue()
+                    cls._instance = instance
+        return cls._instance
+
+    def _init_queue(self, probe=None, sched_cfg=None):
+        if sched_cfg is None:
+            sched_cfg = load_global_config("scheduler")
+        self.sched_cfg = sched_cfg
+        self.probe = probe or make_probe(sched_cfg)
+
+        self._lock = threading.RLock()
+        # 排队 / 派发 / 释放 / 取消时唤醒 wait_until
+        self._changed = threading.Condition(self._lock)
+        self._closed = False
+        self._counter = itertools.count(1)
+        self._dispatch_counter = itertools.count(1)
+        self.preemption = bool(sched_cfg.get("preemption", True))
+        self._pending = []
+        self._running = {}
+        self._tickets = {}
+        self._usage = {}
+        self._group_limits = {}
+        self._group_running = {}
+        self.slots = {}
+        self.refresh_devices()
+
+    def configure(self, probe=None, sched_cfg=None):
+        """重新指定探测器 / 配置 (例如换成 FakeDeviceProbe)，会清空队列，只在空闲时调用"""
+        with self._lock:
+            self._init_queue(probe=probe, sched_cfg=sched_cfg if sched_cfg is not None else self.sched_cfg)
+
+    def refresh_devices(self):
+        default_slots = int(self.sched_cfg.get("slots_per_device", 1))
+        overrides = {str(k): int(v) for k, v in (self.sched_cfg.get("device_slots") or {}).items()}
+        with self._lock:
+            self.slots = {d: overrides.get(d, default_slots) for d in self.probe.list_devices()}
+            for d in self.slots:
+                self._usage.setdefault(d, 0)
+        return list(self.slots.keys())
+
+    @property
+    def devices(self):
+        return list(self.slots.keys())
+
+    # ================= 对外接口 =================
+    def submit(self, command, task_name, root_dir, devices=None, num_devices=1, env=None,
+               group=None, group_limit=None, priority="normal", preemptible=False, job_opts=None, log_path=None):
+        """log_path 不给时按任务名新分配一个"""
+        from .process_mgr import ProcessManager
+
+        if priority not in PRIORITIES:
+            return False, f"未知的优先级: {priority} (可选 {', '.join(PRIORITIES)})"
+        log_path = log_path or ProcessManager.new_log_path(task_name)
+        with self._lock:
+            if not self.slots:
+                return False, "没有探测到可用的 GPU (可以在 configs/global_config.yaml 里配置 fake_devices)"
+            if devices and not set(devices) & set(self.slots):
+                return False, f"GPU {','.join(devices)} 不存在，可用设备: {','.join(self.slots)}"
+
+            ticket = QueuedJob(f"q{next(self._counter)}", command, task_name, root_dir, log_path,
+                               devices=devices, num_devices=num_devices, env=env, group=group,
+                               priority=priority, preemptible=preemptible, job_opts=job_opts)
+            if group and group_limit:
+                self._group_limits[group] = int(group_limit)
+            self._pending.append(ticket)
+            self._tickets[log_path] = ticket
+            self._changed.notify_all()
+
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(f"[QUEUED] {ticket.submit_time} 等待 GPU 槽位 (优先级 {priority})...\n")
+        JobRegistry().upsert(log_path, task_name=task_name, command=command, root_dir=root_dir,
+                             status="queued", start_time=ticket.submit_time)
+
+        self._dispatch()
+        return True, log_path
+
+    def find_by_log(self, log_path):
+        with self._lock:
+            return self._tickets.get(log_path)
+
+    def position(self, log_path):
+        """排队位置 (从 1 开始)，不在队列里返回 0"""
+        with self._lock:
+            for i, t in enumerate(self._ordered_pending()):
+                if t.log_path == log_path:
+                    return i + 1
+        return 0
+
+    def has_waiting(self, devices):
+        """有没有排队中的任务能用上这几张卡 (例如空闲的常驻 worker 要不要让出卡槽)"""
+        devices = set(devices)
+        with self._lock:
+            return any(devices & set(self._candidates(t)) for t in self._pending)
+
+    def cancel(self, log_path):
+        """取消一个还没派发出去的任务"""
+        with self._lock:
+            ticket = self._tickets.get(log_path)
+            if not ticket or ticket not in self._pending:
+                return False
+            self._pending.remove(ticket)
+            ticket.status = "cancelled"
+            self._changed.notify_all()
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write("[CANCELLED] 任务在排队时被取消\n")
+        JobRegistry().upsert(log_path, status="cancelled",
+                             end_time=datetime.datetime.now().isoformat(timespec="seconds"))
+        return True
+
+    def wait_until(self, predicate, timeout=None):
+        """等到 predicate() 为真，队列每次排队 / 派发 / 释放 / 取消都会重新检查一次；超时返回 False"""
+        with self._changed:
+            return self._changed.wait_for(predicate, timeout)
+
+    def shutdown(self):
+        """不再派发：排队中的任务全部撤掉，已经在跑的交给 JobSupervisor.shutdown 收尾 (退出前 / 测试用)"""
+        with self._lock:
+            self._closed = True
+            pending, self._pending = self._pending, []
+            for ticket in pending:
+                ticket.status = "cancelled"
+            self._changed.notify_all()
+
+    def snapshot(self):
+        """给 UI 用的队列概况"""
+        with self._lock:
+            return {
+                "slots": dict(self.slots),
+                "usage": dict(self._usage),
+                "pending": [(t.task_name, t.log_path) for t in self._ordered_pending()],
+                "jobs": [self._ticket_row(t) for t in self._ordered_pending() + list(self._running.values())],
+            }
+
+    @staticmethod
+    def _ticket_row(t):
+        return {"task_name": t.task_name, "log_path": t.log_path, "status": t.status,
+                "priority": t.priority, "preemptible": t.preemptible,
+                "devices": ",".join(t.assigned), "submit_time": t.submit_time,
+                "note": f"让位给 {t.preempted_by}" if t.preempted_by
+                        else (f"等待 {len(t.waiting_for)} 个任务让位" if t.waiting_for else "")}
+
+    # ================= 派发 =================
+    def _ordered_pending(self):
+        # sorted 是稳定排序：同一优先级内保持提交顺序
+        return sorted(self._pending, key=lambda t: -t.level)
+
+    def _candidates(self, ticket):
+        return [d for d in (ticket.allowed_devices or list(self.slots.keys())) if d in self.slots]
+
+    def _pick_devices(self, ticket, reserved=()):
+        free = [d for d in self._candidates(ticket)
+                if d not in reserved and self._usage[d] < self.slots[d]]
+        if len(free) < ticket.num_devices:
+            return None
+        # 优先放到最空闲的卡上
+        free.sort(key=lambda d: (self._usage[d] / self.slots[d], d))
+        return free[:ticket.num_devices]
+
+    def _group_has_room(self, group):
+        limit = self._group_limits.get(group) if group else None
+        return not limit or self._group_running.get(group, 0) < limit
+
+    def set_group_limit(self, group, limit):
+        """运行中调整某组的并发上限 (None / 0 表示不限)"""
+        with self._lock:
+            if limit:
+                self._group_limits[group] = int(limit)
+            else:
+                self._group_limits.pop(group, None)
+        self._dispatch()
+
+    def _dispatch(self):
+        launches, victims = [], []
+        with self._lock:
+            if self._closed:
+                return
+            # 正在等别人让位的高优先级任务给自己留着卡，后面的任务不能趁机占掉
+            reserved = set()
+            for ticket in self._ordered_pending():
+                if not self._group_has_room(ticket.group):
+                    continue
+                devs = self._pick_devices(ticket, reserved)
+                if devs is None:
+                    if self.preemption and not ticket.waiting_for:
+                        victims.extend(self._plan_preemption(ticket, reserved))
+                    if ticket.waiting_for:
+                        reserved.update(ticket.reserved)
+                    continue
+                self._pending.remove(ticket)
+                ticket.waiting_for.clear()
+                ticket.dispatch_seq = next(self._dispatch_counter)
+                self._running[ticket.log_path] = ticket
+                for d in devs:
+                    self._usage[d] += 1
+                if ticket.group:
+                    self._group_running[ticket.group] = self._group_running.get(ticket.group, 0) + 1
+                ticket.assigned = devs
+                ticket.status = "dispatched"
+                launches.append(ticket)
+
+        for ticket in launches:
+            self._launch(ticket)
+        for victim, ticket in victims:
+            self._preempt(victim, ticket)
+        if launches:
+            with self._changed:
+                self._changed.notify_all()
+
+    def _plan_preemption(self, ticket, reserved):
+        """
+        挑出能让 ticket 派发出去的最小一批受害者：只挑候选卡上 preemptible、优先级更低、还没被抢过的任务，
+        优先级最低、最晚开始的先让 (丢的进度最少)。抢完也凑不够卡就一个都不抢。
+        """
+        candidates = [d for d in self._candidates(ticket) if d not in reserved]
+        free = {d: self.slots[d] - self._usage[d] for d in candidates}
+        pool = sorted((t for t in self._running.values()
+                       if t.preemptible and not t.preempted_by and t.level < ticket.level
+                       and set(t.assigned) & set(candidates)),
+                      key=lambda t: (t.level, -t.dispatch_seq))
+        chosen = []
+        for victim in pool:
+            if sum(1 for d in candidates if free[d] > 0) >= ticket.num_devices:
+                break
+            chosen.append(victim)
+            for d in victim.assigned:
+                if d in free:
+                    free[d] += 1
+        have = [d for d in candidates if free[d] > 0]
+        if not chosen or len(have) < ticket.num_devices:
+            return []
+        for victim in chosen:
+            victim.preempted_by = ticket.task_name
+            victim._preemptor = ticket
+        ticket.waiting_for = {v.log_path for v in chosen}
+        ticket.reserved = have
+        return [(v, ticket) for v in chosen]
+
+    def _preempt(self, victim, ticket):
+        from .process_mgr import ProcessManager
+        reason = f"让位给更高优先级的 {ticket.task_name} ({ticket.priority})"
+        with self._lock:
+            if victim._preempt_claimed:
+                return
+            if not victim.launched and not victim._released:
+                # 已经派发、还在启动：preempted_by 留着，_launch 握手完成后马上补上抢占
+                return
+            victim._preempt_claimed = True
+        if ProcessManager.preempt(victim.log_path, reason):
+            return
+        with self._lock:
+            # 刚好自己结束了 / 已经在退出：撤销这次抢占
+            victim.preempted_by = None
+            victim._preemptor = None
+            victim._preempt_claimed = False
+            ticket.waiting_for.discard(victim.log_path)
+            replan = victim._released
+        # 卡槽已经空出来了，马上重新派发，不用等下一个任务结束
+        if replan:
+            self._dispatch()
+
+    def _launch(self, ticket):
+        from .process_mgr import ProcessManager
+
+        env = dict(ticket.env)
+        env["CUDA_VISIBLE_DEVICES"] = ",".join(ticket.assigned)
+        success, msg = ProcessManager.run_with_log(
+            ticket.command, ticket.task_name, ticket.root_dir,
+            env=env, log_path=ticket.log_path, job_opts=ticket.job_opts,
+            on_exit=lambda job, t=ticket: self._release(t),
+        )
+        if not success:
+            ticket.status = "failed"
+            with open(ticket.log_path, "a", encoding="utf-8") as f:
+                f.write(f"[启动失败] {msg}\n")
+            self._release(ticket)
+            return
+        with self._lock:
+            ticket.launched = True
+            preemptor = ticket._preemptor if ticket.preempted_by and not ticket._preempt_claimed else None
+            if preemptor and preemptor not in self._pending:
+                # 抢它的任务等不及已经被撤掉了 / 拿到了别的卡
+                ticket.preempted_by = ticket._preemptor = preemptor = None
+        # 启动期间被挑中让位的任务：握手完成后立刻抢占
+        if preemptor:
+            self._preempt(ticket, preemptor)
+
+    def _release(self, ticket):
+        with self._lock:
+            if ticket._released:
+                return
+            ticket._released = True
+            self._running.pop(ticket.log_path, None)
+            for t in self._pending:
+                t.waiting_for.discard(ticket.log_path)
+            for d in ticket.assigned:
+                if d in self._usage and self._usage[d] > 0:
+                    self._usage[d] -= 1
+            if ticket.group and self._group_running.get(ticket.group, 0) > 0:
+                self._group_running[ticket.group] -= 1
+            self._changed.notify_all()
+        self._dispatch()
@@ -0,0 +1,242 @@
+# core/halving.py
+import os
+import re
+import glob
+import copy
+import json
+import math
+import datetime
+import threading
+from .metrics import MetricsStore
+from .process_mgr import ProcessManager
+from .failure_watch import FailureRecovery
+
+CKPT_EPOCH_RE = re.compile(r"epoch=(\d+)")
+
+
+def checkpoint_epoch(path):
+    """checkpoint 文件名里的 epoch=N，没有时返回 -1"""
+    m = CKPT_EPOCH_RE.search(os.path.basename(path))
+    return int(m.group(1)) if m else -1
+
+
+def latest_checkpoint(exp_dir):
+    """实验目录下最新的 checkpoint：优先按文件名里的 epoch=N，其次按修改时间"""
+    ckpts = glob.glob(os.path.join(exp_dir, "checkpoints", "*.ckpt"))
+    if not ckpts:
+        return None
+    return max(ckpts, key=lambda p: (checkpoint_epoch(p), os.path.getmtime(p)))
+
+
+def rung_budgets(min_epochs, max_epochs, eta):
+    """每一轮训练到第几个 epoch，例如 (10, 100, 3) -> [10, 30, 90, 100]"""
+    budgets, b = [], max(1, int(min_epochs))
+    while b < max_epochs:
+        budgets.append(b)
+        b = int(math.ceil(b * eta))
+    budgets.append(int(max_epochs))
+    return budgets
+
+
+class Trial:
+    def __init__(self, name, cfg_data, exp_dir, yaml_path, bs):
+        self.name = name
+        self.cfg_data = cfg_data
+        self.exp_dir = exp_dir
+        self.yaml_path = yaml_path
+        self.bs = bs
+        # waiting -> running -> promoted / stopped / done / failed
+        self.status = "waiting"
+        self.rung = -1
+        self.score = None
+        self.log_path = None
+        self.history = []   # [(rung, epochs, score), ...]
+
+
+class HalvingStudy:
+    """
+    Successive Halving：一批 trial 先跑很短的预算 (min_epochs)，
+    按日志里解析出来的指标排名，只让前 1/eta 的 trial 带着 TRAIN.RESUME 继续跑下一轮，
+    其余直接停掉，直到剩下的 trial 跑满 max_epochs。
+    - launch_fn(trial, cfg_data) -> (success, log_path)，由调用方 (TrainingModule) 负责真正提交
+    - scorer(trial) -> 分数，默认取本轮日志里 metric 最后几个值的均值
+    """
+
+    POLL_SEC = 10
+    SCORE_TAIL = 5
+
+    def __init__(self, study_id, trials, launch_fn, min_epochs=10, max_epochs=100, eta=3,
+                 metric="loss", mode="min", scorer=None, record_dir=None):
+        self.study_id = study_id
+        self.trials = trials
+        self.launch_fn = launch_fn
+        self.budgets = rung_budgets(min_epochs, max_epochs, eta)
+        self.eta = eta
+        self.metric = metric
+        self.mode = mode
+        self.scorer = scorer or self.score_from_logs
+        self.record_dir = record_dir
+        self.rung = -1
+        self.status = "pending"
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ================= 打分 =================
+    def score_from_logs(self, trial):
+        store = MetricsStore()
+        store.scan(trial.name)
+        values = [row[4] for row in store.series(trial.name, self.metric, log_path=trial.log_path)]
+        values = [v for v in values if v is not None and math.isfinite(v)]
+        if not values:
+            return None
+        tail = values[-self.SCORE_TAIL:]
+        return sum(tail) / len(tail)
+
+    def _rank_key(self, trial):
+        # 没有分数的 trial 排在最后
+        if trial.score is None:
+            return (1, 0.0)
+        return (0, trial.score if self.mode == "min" else -trial.score)
+
+    # ================= 调度 =================
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"halving-{self.study_id}", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """停止调度，并结束还在跑的 trial"""
+        self._stop.set()
+        for t in self.trials:
+            if t.status == "running" and t.log_path:
+                ProcessManager.stop_job(t.log_path)
+
+    def _run(self):
+        self.status = "running"
+        try:
+            survivors = list(self.trials)
+            for rung, epochs in enumerate(self.budgets):
+                self.rung = rung
+                self._launch_rung(survivors, rung, epochs)
+                self._wait(survivors)
+                if self._stop.is_set():
+                    self.status = "cancelled"
+                    return
+
+                for t in survivors:
+                    if t.status == "failed":
+                        continue
+                    t.score = self.scorer(t)
+                    t.history.append((rung, epochs, t.score))
+                alive = sorted([t for t in survivors if t.status != "failed"], key=self._rank_key)
+
+                if rung == len(self.budgets) - 1:
+                    for t in alive:
+                        t.status = "done"
+                    break
+                keep = max(1, int(math.ceil(len(alive) / self.eta)))
+                for t in alive[keep:]:
+                    t.status = "stopped"
+                for t in alive[:keep]:
+                    t.status = "promoted"
+                survivors = alive[:keep]
+                self._save_record()
+            self.status = "finished"
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            self._save_record()
+
+    def _launch_rung(self, survivors, rung, epochs):
+        for t in survivors:
+            cfg = copy.deepcopy(t.cfg_data)
+            cfg["TRAIN"]["END_EPOCH"] = int(epochs)
+            if rung > 0:
+                ckpt = latest_checkpoint(t.exp_dir)
+                if ckpt:
+                    cfg["TRAIN"]["RESUME"] = ckpt
+            success, log = self.launch_fn(t, cfg)
+            t.rung = rung
+            if success:
+                t.status = "running"
+                t.log_path = log
+            else:
+                t.status = "failed"
+                t.log_path = None
+
+    def _wait(self, survivors):
+        while not self._stop.is_set():
+            pending = False
+            for t in survivors:
+                if t.status != "running":
+                    continue
+                # 因 OOM / NaN 被自动重新排队的 trial 换了日志，跟到最新的那一个
+                t.log_path = FailureRecovery().resolve(t.log_path)
+                state = ProcessManager.job_state(t.log_path)
+                if state in ("queued", "running", "orphaned") or FailureRecovery().pending_retry(t.log_path):
+                    pending = True
+                elif state != "finished":
+                    t.status = "failed"
+            if not pending:
+                return
+            self._stop.wait(self.POLL_SEC)
+
+    # ================= 展示 / 记录 =================
+    def to_rows(self):
+        rows = []
+        for t in sorted(self.trials, key=self._rank_key):
+            rows.append({
+                "trial": t.name,
+                "状态": t.status,
+                "轮次": f"{t.rung + 1}/{len(self.budgets)}" if t.rung >= 0 else "-",
+                "epochs": self.budgets[t.rung] if t.rung >= 0 else "-",
+                self.metric: None if t.score is None else round(t.score, 5),
+            })
+        return rows
+
+    def _save_record(self):
+        if not self.record_dir:
+            return
+        os.makedirs(self.record_dir, exist_ok=True)
+        record = {
+            "study_id": self.study_id,
+            "status": self.status,
+            "error": self.error,
+            "budgets": self.budgets,
+            "metric": self.metric,
+            "mode": self.mode,
+            "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+            "trials": [{"name": t.name, "status": t.status, "history": t.history} for t in self.trials],
+        }
+        with open(os.path.join(self.record_dir, f"{self.study_id}_halving.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+
+
+class HalvingScheduler:
+    """进程内所有 Successive Halving 研究的登记表 (单例)，页面刷新后还能看到进度"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(HalvingScheduler, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._studies = {}
+        return cls._instance
+
+    def start(self, study):
+        with self._lock:
+            old = self._studies.get(study.study_id)
+            if old and old.status == "running":
+                raise RuntimeError(f"{study.study_id} 还在跑，先取消再重新提交")
+            self._studies[study.study_id] = study
+        study.start()
+        return study
+
+    def get(self, study_id):
+        with self._lock:
+            return self._studies.get(study_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._studies.values())
@@ -0,0 +1,311 @@
+# core/infer_worker.py
+"""
+常驻推理 worker：在 MCM-LDM 的环境里长期运行，一个 worker 对应一个 (checkpoint, GPU)。
+每来一个请求就在本进程里把 demo 脚本当 __main__ 再执行一遍，torch / 项目依赖只 import 一次，
+torch.load 和 transformers 的 from_pretrained 结果常驻内存 (LRU，最多 memo_items 份)，
+换 prompt / FiLM scalar 不用再花几分钟重新加载权重。
+
+    python -u infer_worker.py --socket <sock> --root <MCM-LDM 根目录> [--preload <ckpt>] [--memo-items 4]
+    python -u infer_worker.py --batch <manifest.json> --root <MCM-LDM 根目录>      # sweep 矩阵，跑完就退出
+
+协议 (unix socket，每个连接一行 JSON 请求、一行 JSON 回复)：
+    {"cmd": "ping"}
+    {"cmd": "shutdown"}
+    {"cmd": "run", "script": "demo_transfer_with_scene.py", "argv": [...],
+     "params_file": "<job_shim 的 params.json>", "log_path": "...", "results_dir": "..."}
+    -> {"ok": true, "outputs": [新生成的结果目录...], "seconds": 12.3, "error": null}
+
+和 job_shim 一样会被别的 conda 环境的 python 直接执行，只能依赖标准库 (torch / transformers 可选)。
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import traceback
+import collections
+
+import job_shim
+
+# 脚本所在的 core/ 目录不能留在 sys.path 里，否则 demo 脚本 import utils / metrics 会拿到我们的模块
+sys.path.pop(0)
+
+
+# ================= 权重缓存 =================
+def _copy_containers(obj):
+    """复制 dict / list 外壳，张量本身共享：调用方改 state_dict 的键不会污染缓存"""
+    if type(obj) in (dict, collections.OrderedDict):
+        return type(obj)((k, _copy_containers(v)) for k, v in obj.items())
+    if type(obj) is list:
+        return [_copy_containers(v) for v in obj]
+    return obj
+
+
+class Memo:
+    """进程内的 LRU：超过 max_items 时丢掉最久没用过的那份，并释放显存缓存"""
+
+    def __init__(self, max_items=4):
+        self.max_items = max(1, int(max_items))
+        self._items = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        if key in self._items:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+        self.misses += 1
+        value = loader()
+        self._items[key] = value
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+            self._free_cuda()
+        return value
+
+    @staticmethod
+    def _free_cuda():
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def keys(self):
+        return [str(k[:2]) for k in self._items]
+
+    def install(self):
+        """给 torch.load / from_pretrained 套上缓存 (对应的库没装就跳过)"""
+        try:
+            import torch
+        except ImportError:
+            return
+        original_load = torch.load
+
+        def cached_load(f, map_location=None, *args, **kwargs):
+            if args or set(kwargs) - {"weights_only"} or not isinstance(f, (str, os.PathLike)):
+                return original_load(f, map_location, *args, **kwargs)
+            path = os.path.abspath(f)
+            st = os.stat(path)
+            key = ("torch.load", path, st.st_mtime, st.st_size, repr(map_location), repr(kwargs))
+            value = self.get(key, lambda: original_load(f, map_location, **kwargs))
+            return _copy_containers(value)
+        torch.load = cached_load
+
+        try:
+            from transformers import PreTrainedModel
+        except ImportError:
+            return
+        original_fp = PreTrainedModel.from_pretrained.__func__
+
+        def cached_from_pretrained(cls, *args, **kwargs):
+            key = ("from_pretrained", cls.__qualname__, repr(args), repr(sorted(kwargs.items())))
+            return self.get(key, lambda: original_fp(cls, *args, **kwargs))
+        PreTrainedModel.from_pretrained = classmethod(cached_from_pretrained)
+
+
+# ================= 执行一次请求 =================
+def purge_project_modules(root):
+    """项目自己的模块每次重新 import (带上这次请求的常量补丁)，torch 等第三方库保持常驻"""
+    root = os.path.abspath(root) + os.sep
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if path and os.path.abspath(path).startswith(root):
+            del sys.modules[name]
+
+
+def list_dirs(folder):
+    if not folder or not os.path.isdir(folder):
+        return set()
+    return {os.path.join(folder, d) for d in os.listdir(folder) if os.path.isdir(os.path.join(folder, d))}
+
+
+def run_request(req, root):
+    start = time.time()
+    os.chdir(root)
+    # 按“执行前后多出来的目录”找产物，不看 mtime (文件系统时间戳精度不够，秒级请求会漏)
+    before = list_dirs(req.get("results_dir"))
+    purge_project_modules(root)
+
+    params = {}
+    if req.get("params_file"):
+        with open(req["params_file"], "r", encoding="utf-8") as f:
+            params = json.load(f)
+    finder = job_shim.PatchFinder(params["patch"]) if params.get("patch") else None
+    if finder:
+        sys.meta_path.insert(0, finder)
+
+    script = os.path.abspath(req["script"])
+    script_dir = os.path.dirname(script)
+    saved_argv = sys.argv
+    saved_fds = (os.dup(1), os.dup(2))
+    log = open(req["log_path"], "a", buffering=1, encoding="utf-8", errors="replace")
+    ok, error = True, None
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        print(f"♨️ warm run: {os.path.basename(script)} {' '.join(req.get('argv', []))}", flush=True)
+
+        with open(script, "r", encoding="utf-8") as f:
+            source = f.read()
+        if params.get("assign"):
+            source = job_shim.substitute(source, params["assign"], script)
+        sys.argv = [script] + list(req.get("argv", []))
+        sys.path.insert(0, script_dir)
+        globs = {"__name__": "__main__", "__file__": script, "__builtins__": __builtins__}
+        exec(compile(source, script, "exec", dont_inherit=True), globs)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            ok, error = False, f"exit code {e.code}"
+    except Exception as e:
+        # 一个请求失败不能带走整个 worker
+        traceback.print_exc()
+        ok, error = False, f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        for fd in saved_fds:
+            os.close(fd)
+        seconds = time.time() - start
+        log.write(f"\n=== Task Finished ({'ok' if ok else error}, {seconds:.1f}s) ===\n")
+        log.close()
+        sys.argv = saved_argv
+        if script_dir in sys.path:
+            sys.path.remove(script_dir)
+        if finder in sys.meta_path:
+            sys.meta_path.remove(finder)
+    return {"ok": ok, "error": error, "seconds": round(seconds, 2),
+            "outputs": sorted(list_dirs(req.get("results_dir")) - before)}
+
+
+# ================= 批量 (sweep 矩阵) =================
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def run_batch(manifest_path, root):
+    """
+    manifest: {"index": 矩阵的 index.json,
+               "cells": [{"key", "cell_dir", "script", "argv", "params_file", "meta", "results_dir"}, ...]}
+    每个格子在本进程里跑一遍 demo 脚本 (权重走 Memo 缓存，只读一次)。results_dir 是这个格子独占的
+    demo 输出目录 (推理配置里的 NAME 每格不同)，跑完把里面的产物整个挪进 cell_dir，
+    不靠对比共享目录前后的差异，旁边并行的推理任务写出来的东西不会混进来。
+    每跑完一格就重写一次 index.json；index 里已经 done 的格子直接跳过。返回失败的格子数。
+    """
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    index_path = manifest["index"]
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+
+    cells = manifest["cells"]
+    failed = 0
+    for i, cell in enumerate(cells, 1):
+        key, cell_dir = cell["key"], cell["cell_dir"]
+        if index.get(key, {}).get("status") == "done" and os.path.isdir(cell_dir):
+            print(f"[{i}/{len(cells)}] {key} 已有结果，跳过", flush=True)
+            continue
+        os.makedirs(cell_dir, exist_ok=True)
+        results_dir = cell["results_dir"]
+        # 上次中断留下的半成品先清掉
+        shutil.rmtree(results_dir, ignore_errors=True)
+        req = {"script": cell["script"], "argv": cell["argv"], "params_file": cell.get("params_file"),
+               "log_path": os.path.join(cell_dir, "run.log"), "results_dir": results_dir}
+        reply = run_request(req, root)
+        outputs = [shutil.move(o, os.path.join(cell_dir, os.path.basename(o))) for o in sorted(list_dirs(results_dir))]
+        shutil.rmtree(results_dir, ignore_errors=True)
+        if not reply["ok"]:
+            failed += 1
+        index[key] = {**cell.get("meta", {}), "path": cell_dir, "status": "done" if reply["ok"] else "failed",
+                      "seconds": reply["seconds"], "outputs": outputs, "error": reply["error"]}
+        _write_json(index_path, index)
+        print(f"[{i}/{len(cells)}] {key} {'ok' if reply['ok'] else reply['error']} ({reply['seconds']}s)", flush=True)
+    return failed
+
+
+# ================= socket 服务 =================
+def _read_line(conn):
+    buf = b""
+    while not buf.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        buf += chunk
+    return buf.decode("utf-8")
+
+
+def serve(sock_path, root, memo):
+    if os.path.exists(sock_path):
+        os.remove(sock_path)
+    os.makedirs(os.path.dirname(os.path.abspath(sock_path)), exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(sock_path)
+    server.listen(16)
+    print(f"♨️ worker ready on {sock_path} (pid {os.getpid()})", flush=True)
+    served = 0
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    req = json.loads(_read_line(conn) or "{}")
+                except ValueError:
+                    req = {}
+                cmd = req.get("cmd")
+                if cmd == "run":
+                    print(f"[{time.strftime('%H:%M:%S')}] request -> {req.get('log_path')}", flush=True)
+                    reply = run_request(req, root)
+                    served += 1
+                    print(f"[{time.strftime('%H:%M:%S')}] done in {reply['seconds']}s ok={reply['ok']} "
+                          f"(memo hits {memo.hits} / misses {memo.misses})", flush=True)
+                elif cmd == "ping":
+                    reply = {"ok": True, "pid": os.getpid(), "served": served, "memo": memo.keys()}
+                elif cmd == "shutdown":
+                    conn.sendall(json.dumps({"ok": True}).encode("utf-8") + b"\n")
+                    break
+                else:
+                    reply = {"ok": False, "error": f"unknown cmd: {cmd}"}
+                conn.sendall(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+    finally:
+        server.close()
+        if os.path.exists(sock_path):
+            os.remove(sock_path)
+        print("♨️ worker stopped", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="warm MCM-LDM inference worker")
+    parser.add_argument("--socket", default=None)
+    parser.add_argument("--batch", default=None, help="sweep 矩阵的 manifest.json，跑完所有格子后退出")
+    parser.add_argument("--root", required=True)
+    parser.add_argument("--preload", default=None, help="启动时先把这个 checkpoint 读进缓存")
+    parser.add_argument("--memo-items", type=int, default=4)
+    opts = parser.parse_args()
+
+    sys.dont_write_bytecode = True
+    memo = Memo(opts.memo_items)
+    memo.install()
+    if opts.preload and os.path.exists(opts.preload) and "torch" in sys.modules:
+        t = time.time()
+        sys.modules["torch"].load(opts.preload, map_location="cpu")
+        print(f"♨️ preloaded {opts.preload} in {time.time() - t:.1f}s", flush=True)
+    if opts.batch:
+        failed = run_batch(opts.batch, opts.root)
+        print(f"♨️ batch finished, {failed} failed (memo hits {memo.hits} / misses {memo.misses})", flush=True)
+        sys.exit(1 if failed else 0)
+    if not opts.socket:
+        parser.error("--socket 和 --batch 至少给一个")
+    serve(os.path.abspath(opts.socket), opts.root, memo)
+
+
+if __name__ == "__main__":
+    main()
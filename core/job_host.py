@@ -0,0 +1,173 @@
+# core/job_host.py
+"""
+任务宿主进程：JobSupervisor 用 setsid 把它拉起来，由它持有伪终端、把输出写进日志、等子进程退出。
+和 Streamlit 进程完全脱钩，服务重启 / 退出时任务照样跑完；
+子进程 PID、退出码、失败原因落在 <日志>.state.json 里，重启后的任务表靠它对账。
+
+    python -m core.job_host <日志>.job.json
+
+<日志>.job.json:
+    {"command": ..., "root_dir": ..., "log_path": ..., "compact": true, "progress_interval": 5,
+     "keep_raw": false, "watch": true, "kill": false, "patterns": {...}, "kill_grace": 30, "rows": 50, "cols": 200}
+kill 为 false 时命中失败特征只记警告，任务照常跑完，按退出码判成败
+"""
+import os
+import sys
+import pty
+import json
+import fcntl
+import struct
+import signal
+import termios
+import datetime
+import threading
+import subprocess
+
+READ_CHUNK = 64 * 1024
+
+
+def spec_path(log_path):
+    root, _ = os.path.splitext(log_path)
+    return f"{root}.job.json"
+
+
+def state_path(log_path):
+    root, _ = os.path.splitext(log_path)
+    return f"{root}.state.json"
+
+
+def raw_log_path(log_path):
+    root, ext = os.path.splitext(log_path)
+    return f"{root}.raw{ext}"
+
+
+def read_state(log_path):
+    """宿主写下的状态 {"host_pid", "pid", "start_time", "exit_code", "end_time", "failure", "warning"}，没有时返回 {}"""
+    try:
+        with open(state_path(log_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state(log_path, **fields):
+    state = read_state(log_path)
+    state.update(fields)
+    tmp = state_path(log_path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    # 原子替换，读的一方不会读到写了一半的文件
+    os.replace(tmp, state_path(log_path))
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _signal_group(pgid, sig):
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def run(spec):
+    from core.log_compactor import LogCompactor
+    from core.failure_watch import FailureWatcher
+
+    log_path = spec["log_path"]
+    log_f = open(log_path, "ab", buffering=0)
+    sep = "--------------------------------\n"
+    log_f.write((sep + f"[CMD] {spec['command']}\n" + sep).encode("utf-8"))
+
+    # 压缩进度条后写主日志；需要的话原始输出另存一份 .raw.log
+    compactor = LogCompactor(interval=float(spec.get("progress_interval", 5))) if spec.get("compact", True) else None
+    raw_f = open(raw_log_path(log_path), "ab", buffering=0) if compactor and spec.get("keep_raw") else None
+    # 失败特征匹配器 (NaN / OOM / dataloader 崩溃...)
+    watcher = FailureWatcher(spec.get("patterns") or {}) if spec.get("watch", True) else None
+
+    master_fd, slave_fd = pty.openpty()
+    fcntl.ioctl(slave_fd, termios.TIOCSWINSZ,
+                struct.pack("HHHH", int(spec.get("rows", 50)), int(spec.get("cols", 200)), 0, 0))
+    try:
+        proc = subprocess.Popen(
+            ["bash", "-c", spec["command"]],
+            cwd=spec["root_dir"],
+            stdin=slave_fd,
+            stdout=slave_fd,
+            stderr=slave_fd,
+            start_new_session=True,
+            close_fds=True,
+        )
+    except Exception as e:
+        os.close(master_fd)
+        os.close(slave_fd)
+        log_f.write(f"[启动失败] {e}\n".encode("utf-8"))
+        log_f.close()
+        _write_state(log_path, host_pid=os.getpid(), pid=None, exit_code=None, error=str(e), end_time=_now())
+        return 1
+    os.close(slave_fd)
+    _write_state(log_path, host_pid=os.getpid(), pid=proc.pid, start_time=_now())
+
+    # 宿主自己被 SIGTERM 时转发给整个任务进程组
+    signal.signal(signal.SIGTERM, lambda *_: _signal_group(proc.pid, signal.SIGTERM))
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    try:
+        while True:
+            try:
+                data = os.read(master_fd, READ_CHUNK)
+            except OSError:
+                # Linux 下 slave 端全部关闭后读 master 会抛 EIO
+                break
+            if not data:
+                break
+            if raw_f:
+                raw_f.write(data)
+            log_f.write(compactor.feed(data) if compactor else data)
+            hit = watcher.feed(data) if watcher else None
+            if hit:
+                _on_failure(spec, proc, log_path, log_f, *hit)
+        # 读到 EIO 时任务可能还没退干净：先等它退出再关 master，
+        # 否则关 pty 带来的 SIGHUP 会打在它身上，没有输出的快任务退出码变成 -1
+        proc.wait()
+    finally:
+        os.close(master_fd)
+        if compactor:
+            log_f.write(compactor.close())
+        if raw_f:
+            raw_f.close()
+        code = proc.wait()
+        log_f.write(f"\n=== Task Finished (exit code {code}) ===\n".encode("utf-8"))
+        log_f.close()
+        _write_state(log_path, exit_code=code, end_time=_now())
+    return 0
+
+
+def _on_failure(spec, proc, log_path, log_f, name, line):
+    """
+    命中失败特征：要求了 kill 的任务记下原因 (之后判 failed、按策略重试)，结束整个进程组，
+    kill_grace 秒后还在就 SIGKILL；其它任务只记一条警告，可能自己就恢复了 (例如 OOM 后降分辨率重试)
+    """
+    if not spec.get("kill"):
+        _write_state(log_path, warning=f"{name}: {line}")
+        log_f.write(f"\n[FailureWatch] ⚠️ 检测到 {name} (只记录，不结束任务): {line}\n".encode("utf-8"))
+        return
+    _write_state(log_path, failure=f"{name}: {line}")
+    log_f.write(f"\n[FailureWatch] 检测到 {name}，结束任务: {line}\n".encode("utf-8"))
+    _signal_group(proc.pid, signal.SIGTERM)
+    grace = float(spec.get("kill_grace", 30))
+    if grace > 0:
+        timer = threading.Timer(grace, lambda: proc.poll() is None and _signal_group(proc.pid, signal.SIGKILL))
+        timer.daemon = True
+        timer.start()
+
+
+def main():
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    sys.exit(run(spec))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# core/job_params.py
+"""
+每个任务一份私有的参数快照，代替“启动前用正则改共享脚本”的老做法：
+- 配置 / 脚本副本写进 logs/job_params/<tag>_<内容哈希>/，共享的 .sh / .py 源码一个字节都不动
+- 目录名按内容哈希取：参数一样的任务拿到同一份文件 (命令也一样，结果缓存能命中)，参数不一样的互不覆盖
+- Python 常量通过 core/job_shim.py 在内存里替换，见那边的说明 (命令由 core/commands.py 拼)
+"""
+import os
+import re
+import json
+import hashlib
+import yaml
+
+JOB_PARAMS_DIR = "logs/job_params"
+
+
+def job_file(tag, name, text):
+    """把 text 写成 <按内容哈希的目录>/name，返回绝对路径；先写临时文件再改名，并发写同一份也安全"""
+    digest = hashlib.sha1(f"{name}\n{text}".encode("utf-8")).hexdigest()[:12]
+    job_dir = os.path.abspath(os.path.join(JOB_PARAMS_DIR, f"{tag}_{digest}"))
+    os.makedirs(job_dir, exist_ok=True)
+    path = os.path.join(job_dir, name)
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    return path
+
+
+def write_params(tag, assign=None, patch=None):
+    """给 job_shim 用的 params.json：assign 改目标脚本里的常量，patch 改被 import 的模块里的常量"""
+    params = {"assign": assign or {}, "patch": patch or {}}
+    return job_file(tag, "params.json", json.dumps(params, ensure_ascii=False, indent=2, sort_keys=True))
+
+
+def patched_script(src_path, tag, subs):
+    """
+    共享脚本的私有副本：subs 是 [(正则, 替换), ...]，按顺序作用在副本上。
+    某条正则一次都没匹配到时抛 ValueError (脚本被人改过，参数注入不进去)。
+    副本和原脚本同名，由调用方在原来的工作目录下执行，脚本里的相对路径照常可用。
+    """
+    with open(src_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    for pattern, repl in subs:
+        content, n = re.subn(pattern, lambda m, r=repl: r, content)
+        if n == 0:
+            raise ValueError(f"{os.path.basename(src_path)} 里没有匹配到 {pattern}")
+    return job_file(tag, os.path.basename(src_path), content)
+
+
+def job_yaml(tag, name, data):
+    """私有的 yaml 配置 (格式和 utils.save_yaml 一致)"""
+    return job_file(tag, name, yaml.dump(data, default_flow_style=False, sort_keys=False))
@@ -0,0 +1,222 @@
+# core/job_registry.py
+import os
+import re
+import time
+import signal
+import sqlite3
+import datetime
+import threading
+import subprocess
+from .utils import load_global_config
+
+# 还没结束的状态：重启后需要和真实进程对账
+ACTIVE_STATUSES = ("queued", "pending", "running", "orphaned", "screen")
+
+
+class JobRegistry:
+    """
+    持久化的任务表 (SQLite WAL)，Streamlit 重启 / 浏览器刷新之后任务也不会“失联”：
+    - 记录命令、所属模块、工作目录、日志、PID、状态和起止时间
+    - 启动时和真实进程对账：还活着但不归本进程管的记为 orphaned；已经结束的按任务宿主留下的
+      <日志>.state.json 记为 finished / failed，连 state.json 都没有的记为 lost
+    - 老版本留下的 screen 会话也会被登记进来 (status = screen)
+    """
+    _instance = None
+
+    COLUMNS = ("log_path", "module", "task_name", "command", "root_dir", "pid",
+               "status", "exit_code", "start_time", "end_time", "created", "failure")
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(JobRegistry, cls).__new__(cls)
+            cls._instance._init_registry()
+            cls._instance.reconcile()
+        return cls._instance
+
+    def _init_registry(self):
+        cfg = load_global_config("registry")
+        self.db_path = cfg.get("db_path", "logs/jobs.db")
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                log_path TEXT PRIMARY KEY,
+                module TEXT,
+                task_name TEXT,
+                command TEXT,
+                root_dir TEXT,
+                pid INTEGER,
+                status TEXT,
+                exit_code INTEGER,
+                start_time TEXT,
+                end_time TEXT,
+                created REAL,
+                failure TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_module ON jobs (module, created);
+        """)
+        # 老版本建的表没有 failure 列
+        cols = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "failure" not in cols:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN failure TEXT")
+        self._conn.commit()
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now().isoformat(timespec="seconds")
+
+    # ================= 写入 =================
+    def upsert(self, log_path, **fields):
+        """按日志路径插入 / 更新一行，只改传进来的字段"""
+        fields = {k: v for k, v in fields.items() if k in self.COLUMNS and k != "log_path"}
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM jobs WHERE log_path = ?", (log_path,)).fetchone()
+            if exists:
+                if fields:
+                    sets = ", ".join(f"{k} = ?" for k in fields)
+                    self._conn.execute(f"UPDATE jobs SET {sets} WHERE log_path = ?",
+                                       (*fields.values(), log_path))
+            else:
+                fields.setdefault("created", time.time())
+                cols = ["log_path", *fields]
+                self._conn.execute(
+                    f"INSERT INTO jobs ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                    (log_path, *fields.values()))
+            self._conn.commit()
+
+    def record_job(self, job):
+        """JobSupervisor 里的 Job 状态变化时调用 (启动 / 结束)"""
+        self.upsert(job.log_path, task_name=job.task_name, command=job.command, root_dir=job.root_dir,
+                    pid=job.pid, status=job.status, exit_code=job.exit_code,
+                    start_time=job.start_time, end_time=job.end_time, failure=job.failure)
+
+    def attach(self, log_path, module):
+        """把任务归到某个模块名下 (模块记住 last_log_path 时顺便调用)"""
+        if log_path:
+            self.upsert(log_path, module=module)
+
+    # ================= 查询 =================
+    def _rows(self, sql, args=()):
+        with self._lock:
+            cur = self._conn.execute(sql, args)
+            names = [d[0] for d in cur.description]
+            return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    def get(self, log_path):
+        rows = self._rows("SELECT * FROM jobs WHERE log_path = ?", (log_path,))
+        return rows[0] if rows else None
+
+    def list(self, module=None, statuses=None, limit=200):
+        sql = "SELECT * FROM jobs"
+        conds, args = [], []
+        if module:
+            conds.append("module = ?")
+            args.append(module)
+        if statuses:
+            conds.append(f"status IN ({', '.join('?' * len(statuses))})")
+            args.extend(statuses)
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        sql += " ORDER BY created DESC LIMIT ?"
+        args.append(limit)
+        return self._rows(sql, args)
+
+    def latest(self, module):
+        rows = self.list(module=module, limit=1)
+        return rows[0] if rows else None
+
+    # ================= 启动对账 =================
+    @staticmethod
+    def _pid_alive(pid):
+        if not pid:
+            return False
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    @staticmethod
+    def list_screen_sessions():
+        """screen -ls 的结果：[(pid, 会话名), ...]；没装 screen 时返回空"""
+        try:
+            out = subprocess.run(["screen", "-ls"], capture_output=True, timeout=5).stdout
+        except Exception:
+            return []
+        sessions = []
+        for line in out.decode("utf-8", errors="ignore").splitlines():
+            m = re.match(r"\s*(\d+)\.(\S+)\s", line)
+            if m:
+                sessions.append((int(m.group(1)), m.group(2)))
+        return sessions
+
+    def _settle(self, row):
+        """
+        不归当前进程管的任务：还活着就记为 orphaned；已经结束的从 state.json 取退出码 / 失败原因，
+        任务宿主 (core/job_host.py) 在服务重启期间把任务跑完时会写好这个文件
+        """
+        if self._pid_alive(row["pid"]):
+            if row["status"] not in ("screen", "orphaned"):
+                self.upsert(row["log_path"], status="orphaned")
+            return
+        from .job_host import read_state
+        state = read_state(row["log_path"])
+        if state.get("end_time"):
+            code = state.get("exit_code")
+            self.upsert(row["log_path"], status="finished" if code == 0 and not state.get("failure") else "failed",
+                        exit_code=code, end_time=state["end_time"], failure=state.get("failure"))
+        else:
+            self.upsert(row["log_path"], status="lost", end_time=self._now())
+
+    def refresh(self, log_path):
+        """orphaned 的任务结束后没人回调，轮询状态时顺手对一次账，返回最新的一行"""
+        row = self.get(log_path)
+        if row and row["status"] == "orphaned":
+            self._settle(row)
+            row = self.get(log_path)
+        return row
+
+    def reconcile(self):
+        """服务启动时调用：表里还“活着”的任务都不归当前进程管了，逐个核对"""
+        from .process_mgr import ProcessManager
+        from .supervisor import JobSupervisor
+        managed = {j.log_path for j in JobSupervisor().list_jobs()}
+        for row in self.list(statuses=ACTIVE_STATUSES, limit=10000):
+            if row["log_path"] in managed:
+                continue
+            if row["status"] == "queued":
+                # GPU 队列在内存里，重启之后排队的任务已经没了
+                self.upsert(row["log_path"], status="lost", end_time=self._now())
+            else:
+                self._settle(row)
+
+        # 老版本 ProcessManager 用 screen -dmS <任务名_时间> 启动，日志是 logs/<同名>.log
+        for pid, name in self.list_screen_sessions():
+            log_path = os.path.abspath(os.path.join(ProcessManager.LOG_DIR, f"{name}.log"))
+            if not os.path.exists(log_path):
+                log_path = f"screen:{name}"
+            row = self.get(log_path)
+            if row and row["status"] not in ACTIVE_STATUSES + ("lost",):
+                continue
+            self.upsert(log_path, task_name=name, pid=pid, status="screen",
+                        command=f"screen -r {pid}.{name}", end_time=None)
+
+    # ================= 控制 =================
+    def stop(self, log_path):
+        """结束一个不归当前进程管的任务 (orphaned / screen)"""
+        row = self.get(log_path)
+        if not row or row["status"] not in ("orphaned", "screen") or not row["pid"]:
+            return False
+        try:
+            if row["status"] == "screen":
+                subprocess.run(["screen", "-S", str(row["pid"]), "-X", "quit"], timeout=5)
+            else:
+                os.killpg(row["pid"], signal.SIGTERM)
+        except (OSError, subprocess.SubprocessError):
+            return False
+        self.upsert(log_path, status="killed", end_time=self._now())
+        return True
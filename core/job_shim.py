@@ -0,0 +1,94 @@
+# core/job_shim.py
+"""
+任务参数注入垫片：不改共享源码，在内存里替换常量后再运行目标脚本。
+
+    python job_shim.py --params <job_dir>/params.json target.py [target 的参数...]
+
+params.json:
+    {
+      "assign": {"input_path": "/xx/a.pkl"},                                     # 目标脚本里的赋值
+      "patch": {"mld/models/modeltype/mld.py": {"DEFAULT_SCALAR_VAL": 3.0}}       # 被 import 的模块里的赋值
+    }
+- assign: 直接改目标脚本源码里 `NAME = 字面量` 的那一行，再以 __main__ 执行
+- patch: 装一个 import 钩子，对应文件被 import 时先替换源码再编译 (不读 / 不写 .pyc)
+每个任务一份 params.json，多个任务同时跑互不干扰，磁盘上的共享脚本始终不变。
+这个文件会被别的 conda 环境的 python 直接执行，所以只能依赖标准库。
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import importlib.machinery
+
+# NAME = "字符串" / 'xx' / 数字 / 标识符 (不会误伤 NAME == xx)
+LITERAL = r"(\"[^\"\n]*\"|'[^'\n]*'|[-+\w.]+)"
+
+
+def substitute(source, values, origin):
+    """把 source 里每个 NAME = 字面量 换成新值；某个名字一次都没匹配到时直接报错，免得参数悄悄没生效"""
+    for name, value in values.items():
+        pattern = re.compile(rf"\b{re.escape(name)}(\s*=\s*){LITERAL}")
+        source, n = pattern.subn(lambda m: f"{name}{m.group(1)}{value!r}", source)
+        if n == 0:
+            raise SystemExit(f"[job_shim] {origin} 里没有找到 {name} = ... ，参数无法注入")
+    return source
+
+
+class PatchedLoader(importlib.machinery.SourceFileLoader):
+    """import 时先替换源码；跳过 .pyc 缓存，否则会直接用到没替换过的字节码"""
+
+    def __init__(self, fullname, path, values):
+        super().__init__(fullname, path)
+        self.values = values
+
+    def get_code(self, fullname):
+        source = self.get_data(self.path).decode("utf-8")
+        source = substitute(source, self.values, self.path)
+        return compile(source, self.path, "exec", dont_inherit=True)
+
+
+class PatchFinder:
+    """sys.meta_path 上的钩子：命中要打补丁的文件时换成 PatchedLoader"""
+
+    def __init__(self, patches):
+        self.patches = {os.path.abspath(p): v for p, v in patches.items()}
+
+    def find_spec(self, fullname, path=None, target=None):
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+        if spec and spec.origin and os.path.abspath(spec.origin) in self.patches:
+            spec.loader = PatchedLoader(fullname, spec.origin, self.patches[os.path.abspath(spec.origin)])
+            return spec
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="per-job parameter shim")
+    parser.add_argument("--params", required=True)
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    opts = parser.parse_args()
+
+    with open(opts.params, "r", encoding="utf-8") as f:
+        params = json.load(f)
+
+    script = os.path.abspath(opts.script)
+    with open(script, "r", encoding="utf-8") as f:
+        source = f.read()
+    if params.get("assign"):
+        source = substitute(source, params["assign"], script)
+
+    # 补丁路径相对于当前工作目录 (即任务的 root_dir)
+    if params.get("patch"):
+        sys.meta_path.insert(0, PatchFinder(params["patch"]))
+    sys.dont_write_bytecode = True
+
+    # 伪装成直接执行 target.py：argv / sys.path[0] / __file__ 都和原来一致
+    sys.argv = [script] + opts.args
+    sys.path[0] = os.path.dirname(script)
+    globs = {"__name__": "__main__", "__file__": script, "__builtins__": __builtins__}
+    exec(compile(source, script, "exec", dont_inherit=True), globs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# core/log_compactor.py
+import re
+import time
+import codecs
+
+# 进度条的特征：45%| 或 9.8it/s 或 1.2s/it
+PROGRESS_RE = re.compile(r"\d+%\||\d[\d.]*\s*it/s|\d[\d.]*\s*s/it")
+# 进度条的“名字”，例如 "Epoch 3" / "Validation DataLoader 0"
+BAR_KEY_RE = re.compile(r"^\s*([^:|]{1,80}?)\s*:")
+ANSI_RE = re.compile(r"\x1b\[[\d;?]*[A-Za-z]")
+# 行分隔：换行 / 回车覆盖 / 光标上移 (tqdm 多进度条)
+SPLIT_RE = re.compile(r"(\r\n|\n|\r|\x1b\[\d*A)")
+# 会被直接丢掉的光标控制：擦除行、显示/隐藏光标
+CURSOR_RE = re.compile(r"\x1b\[\d*K|\x1b\[\?25[lh]")
+# 跨 chunk 被截断的控制序列，要留到下一次再处理
+INCOMPLETE_TAIL_RE = re.compile(r"(\r|\x1b(\[[\d;?]*)?)\Z")
+
+
+class LogCompactor:
+    """
+    写日志之前压缩进度条：
+    - 用 \\r 反复覆盖的帧只保留最后一帧
+    - 进度条帧按 interval 秒抽样写入，形成稀疏的历史记录
+    - 一个新的进度条出现时 (例如 Epoch 3 -> Epoch 4)，把上一个进度条的最后一帧补写进去
+    普通输出行原样保留。输入输出都是 bytes，可以直接串在 pty 读取和写文件之间。
+    """
+
+    def __init__(self, interval=5.0, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._carry = ""
+        self._cur = ""
+        self._pending_frame = None
+        # 进度条名字 -> [最后一帧, 是否已写入, 上次写入时间]
+        self._bars = {}
+        self._last_written = None
+        # 正处在进度条区域：tqdm 多进度条会用空的 \n 当“光标下移”
+        self._in_progress = False
+
+    # ================= 对外接口 =================
+    def feed(self, data):
+        text = self._carry + self._decoder.decode(data)
+        m = INCOMPLETE_TAIL_RE.search(text)
+        if m:
+            self._carry = m.group(0)
+            text = text[:m.start()]
+        else:
+            self._carry = ""
+
+        out = []
+        for i, piece in enumerate(SPLIT_RE.split(text)):
+            if i % 2 == 0:
+                self._cur += CURSOR_RE.sub("", piece)
+            elif piece in ("\r\n", "\n"):
+                self._end_line(self._cur, out)
+                self._cur = ""
+            else:
+                # \r 或光标上移：当前这一帧会被覆盖
+                self._end_frame(self._cur, out)
+                self._cur = ""
+        return "".join(out).encode("utf-8")
+
+    def close(self):
+        """任务结束时调用：把缓冲区里还没写出去的东西全部吐出来"""
+        out = []
+        tail = self._carry.rstrip("\r")
+        self._carry = ""
+        if self._cur or tail:
+            self._end_line(self._cur + tail, out)
+            self._cur = ""
+        elif self._pending_frame:
+            self._end_line("", out)
+        self._flush_bars(out)
+        return "".join(out).encode("utf-8")
+
+    # ================= 内部实现 =================
+    @staticmethod
+    def _is_progress(text):
+        return bool(PROGRESS_RE.search(ANSI_RE.sub("", text)))
+
+    @staticmethod
+    def _bar_key(text):
+        m = BAR_KEY_RE.match(ANSI_RE.sub("", text))
+        return m.group(1) if m else ""
+
+    def _write(self, line, out):
+        out.append(line + "\n")
+        self._last_written = line
+
+    def _end_frame(self, frame, out):
+        if not frame.strip():
+            return
+        if self._is_progress(frame):
+            self._progress(frame, out, final=False)
+        else:
+            self._pending_frame = frame
+
+    def _end_line(self, line, out):
+        if not line.strip() and self._pending_frame:
+            line = self._pending_frame
+        self._pending_frame = None
+        if self._is_progress(line):
+            self._progress(line, out, final=True)
+        elif not line.strip() and self._in_progress:
+            return
+        else:
+            self._in_progress = False
+            self._write(line, out)
+
+    def _progress(self, frame, out, final):
+        self._in_progress = True
+        key = self._bar_key(frame)
+        if key not in self._bars:
+            # 出现了新的进度条，之前的进度条都算结束了
+            self._flush_bars(out)
+        bar = self._bars.setdefault(key, [frame, False, None])
+        bar[0], bar[1] = frame, False
+
+        now = self.clock()
+        due = bar[2] is None or now - bar[2] >= self.interval
+        if (final or due) and frame != self._last_written:
+            self._write(frame, out)
+            bar[1], bar[2] = True, now
+
+    def _flush_bars(self, out):
+        for frame, written, _ in self._bars.values():
+            if not written and frame != self._last_written:
+                self._write(frame, out)
+        self._bars.clear()
@@ -0,0 +1,179 @@
+# core/log_stream.py
+import os
+import hmac
+import json
+import time
+import secrets
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from .utils import load_global_config
+from .ansi_render import AnsiHtmlCache
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    """GET /stream?path=<日志绝对路径>&lines=150&token=<令牌>  ->  text/event-stream"""
+
+    MAX_LINES = 2000
+
+    def log_message(self, format, *args):
+        # 不往 streamlit 的终端里刷访问日志
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/stream":
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        server = self.server.owner
+        if not server.check_token(query.get("token", [""])[0]):
+            self.send_error(403)
+            return
+        log_path = query.get("path", [""])[0]
+        try:
+            lines = min(max(int(query.get("lines", ["150"])[0]), 1), self.MAX_LINES)
+        except ValueError:
+            self.send_error(400, "lines must be an integer")
+            return
+        if not server.is_allowed(log_path):
+            self.send_error(403)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        # 不用通配符：只对同一台机器上的 Streamlit 页面 (或配置里列出的来源) 放行跨端口读取
+        origin = self.headers.get("Origin")
+        if origin and server.origin_allowed(origin, self.headers.get("Host", "")):
+            self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Vary", "Origin")
+        self.end_headers()
+        try:
+            server.stream(self.wfile, log_path, lines)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class LogStreamServer:
+    """
+    本地 SSE 推送服务：浏览器里的日志面板通过 EventSource 订阅，
+    有新行时服务端只推送新增 / 变化的 HTML 片段，页面其余部分完全不用 rerun。
+    - 推送频率受 max_push_hz 限制
+    - 只允许读取 ProcessManager 日志目录下的文件
+    - 默认只监听 127.0.0.1；每次启动生成一个随机令牌，URL 里不带对的令牌一律 403
+    """
+    _instance = None
+
+    HEARTBEAT_SEC = 15
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LogStreamServer, cls).__new__(cls)
+            cls._instance._init_server()
+        return cls._instance
+
+    def _init_server(self):
+        self.cfg = load_global_config("log_stream")
+        self.enabled = bool(self.cfg.get("enable", True))
+        self.host = self.cfg.get("host", "127.0.0.1")
+        self.port = int(self.cfg.get("port", 6007))
+        self.public_url = self.cfg.get("public_url") or ""
+        self.max_push_hz = float(self.cfg.get("max_push_hz", 4))
+        self.allowed_origins = [o.rstrip("/") for o in self.cfg.get("allowed_origins") or []]
+        self.token = secrets.token_urlsafe(24)
+        self._httpd = None
+        self._lock = threading.Lock()
+        self.error = None
+
+    @property
+    def running(self):
+        return self._httpd is not None
+
+    def ensure_started(self):
+        """懒启动：第一次用到日志面板时才起服务，端口被占用就返回 False 走老的轮询"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._httpd is not None:
+                return True
+            try:
+                httpd = ThreadingHTTPServer((self.host, self.port), _StreamHandler)
+            except OSError as e:
+                self.error = str(e)
+                self.enabled = False
+                print(f"⚠️ 日志推送服务启动失败 ({self.host}:{self.port}): {e}")
+                return False
+            httpd.daemon_threads = True
+            httpd.owner = self
+            threading.Thread(target=httpd.serve_forever, name="log-stream", daemon=True).start()
+            self._httpd = httpd
+            return True
+
+    def check_token(self, token):
+        return hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8"))
+
+    def origin_allowed(self, origin, host_header):
+        """配置里列出的来源，或者和推送服务同一个主机名 (只是端口不同) 的页面"""
+        if origin.rstrip("/") in self.allowed_origins:
+            return True
+        origin_host = urlparse(origin).hostname
+        return bool(origin_host) and origin_host == urlparse(f"//{host_header}").hostname
+
+    def is_allowed(self, log_path):
+        from .process_mgr import ProcessManager
+        if not log_path:
+            return False
+        log_root = os.path.realpath(ProcessManager.LOG_DIR)
+        real = os.path.realpath(log_path)
+        return real.startswith(log_root + os.sep) and os.path.isfile(real)
+
+    # ================= 推送循环 =================
+    @staticmethod
+    def _send(wfile, payload):
+        wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+        wfile.flush()
+
+    def _job_status(self, log_path):
+        from .process_mgr import ProcessManager
+        job = ProcessManager.get_job(log_path)
+        if not job:
+            return None
+        return {"pid": job.pid, "status": job.status, "exit_code": job.exit_code}
+
+    def stream(self, wfile, log_path, lines):
+        cache = AnsiHtmlCache()
+        period = 1.0 / max(self.max_push_hz, 0.1)
+        sent = {}
+        last_sig = None
+        last_status = None
+        last_push = 0.0
+
+        while True:
+            try:
+                st = os.stat(log_path)
+                sig = (st.st_ino, st.st_size, st.st_mtime_ns)
+            except OSError:
+                sig = None
+
+            status = self._job_status(log_path)
+            if sig != last_sig or status != last_status:
+                rows = cache.render_lines(log_path, lines) or []
+                changed = [(o, f) for o, f in rows if sent.get(o) != f]
+                # 出现了比已推送内容更早、又没见过的偏移：文件被截断/轮转，整体重发
+                max_sent = max(sent) if sent else -1
+                reset = any(o not in sent and o < max_sent for o, _ in changed)
+                if reset:
+                    changed = rows
+                if changed or reset or status != last_status:
+                    self._send(wfile, {"reset": reset, "lines": changed, "job": status})
+                    last_push = time.monotonic()
+                sent = dict(rows)
+                last_sig, last_status = sig, status
+            elif time.monotonic() - last_push > self.HEARTBEAT_SEC:
+                # SSE 注释行当心跳，顺便探测浏览器是否已经断开
+                wfile.write(b": ping\n\n")
+                wfile.flush()
+                last_push = time.monotonic()
+
+            time.sleep(period)
@@ -0,0 +1,144 @@
+# core/log_tailer.py
+import os
+import threading
+from collections import deque, OrderedDict
+
+
+class _TailState:
+    """单个日志文件的读取进度"""
+
+    def __init__(self, max_lines):
+        self.lock = threading.Lock()
+        self.inode = None
+        self.head = b""            # 文件开头的若干字节，用来识别 inode 被复用的轮转
+        self.offset = 0            # 已经读到的字节位置
+        self.partial = b""         # 末尾还没遇到换行的半行
+        self.partial_start = 0     # 半行在文件里的起始偏移
+        self.lines = deque(maxlen=max_lines)   # (行首偏移, 解码后的行)
+
+
+class LogTailer:
+    """
+    增量读取日志尾部，替代每次刷新都 fork 一个 `tail -n`：
+    - 每个日志路径记住字节偏移 + 最近若干行的环形缓冲
+    - 第一次打开时只从文件末尾往前读一段，之后只读新增的字节
+    - 文件被截断 (size < offset) 或被轮转 (inode 变了 / 文件头对不上) 时重建
+    - 进程内单例，多个会话 / 标签页共享同一份缓存
+    """
+    _instance = None
+
+    MAX_LINES = 1000
+    # 首次打开 / 落后太多时，只从末尾往前读这么多字节
+    INITIAL_BYTES = 256 * 1024
+    # 最多同时跟踪多少个日志文件 (LRU 淘汰)
+    MAX_FILES = 64
+    HEAD_BYTES = 64
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LogTailer, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._states = OrderedDict()
+        return cls._instance
+
+    def _get_state(self, path):
+        with self._lock:
+            state = self._states.get(path)
+            if state is None:
+                state = _TailState(self.MAX_LINES)
+                self._states[path] = state
+                while len(self._states) > self.MAX_FILES:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(path)
+            return state
+
+    def forget(self, path):
+        with self._lock:
+            self._states.pop(path, None)
+
+    # ================= 对外接口 =================
+    def read_lines(self, path, lines=150):
+        """
+        返回最近 lines 行的 [(行首偏移, 文本), ...]，最后一项可能是还没写完的半行。
+        文件不存在时返回 None。
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        state = self._get_state(path)
+        with state.lock:
+            self._sync(state, path, st)
+            result = list(state.lines)[-lines:]
+            if state.partial:
+                result = result[-(lines - 1):] if lines > 1 else []
+                result.append((state.partial_start, self._decode(state.partial)))
+            return result
+
+    def read_tail(self, path, lines=150):
+        result = self.read_lines(path, lines)
+        if result is None:
+            return None
+        return "\n".join(text for _, text in result)
+
+    # ================= 内部实现 =================
+    @staticmethod
+    def _decode(data):
+        return data.decode("utf-8", errors="ignore")
+
+    def _reset(self, state, st):
+        state.inode = st.st_ino
+        state.head = b""
+        state.offset = max(0, st.st_size - self.INITIAL_BYTES)
+        state.partial = b""
+        state.partial_start = state.offset
+        state.lines.clear()
+
+    def _sync(self, state, path, st):
+        if st.st_size == state.offset and state.inode == st.st_ino:
+            return
+
+        with open(path, "rb") as f:
+            head = f.read(self.HEAD_BYTES)
+            rotated = state.inode is not None and (
+                state.inode != st.st_ino or not head.startswith(state.head))
+            truncated = st.st_size < state.offset
+            # 一次性落后太多 (比如日志疯狂刷屏)，没必要把中间的都读一遍
+            too_far = st.st_size - state.offset > self.INITIAL_BYTES
+            if state.inode is None or rotated or truncated or too_far:
+                self._reset(state, st)
+                skip_first = state.offset > 0
+            else:
+                skip_first = False
+            state.head = head
+
+            f.seek(state.offset)
+            data = f.read(st.st_size - state.offset)
+        if not data:
+            return
+
+        base = state.partial_start
+        buf = state.partial + data
+        state.offset += len(data)
+
+        if skip_first:
+            # 从文件中间开始读，第一行大概率是残缺的，丢掉
+            nl = buf.find(b"\n")
+            if nl < 0:
+                state.partial = buf
+                return
+            base += nl + 1
+            buf = buf[nl + 1:]
+
+        pos = 0
+        while True:
+            nl = buf.find(b"\n", pos)
+            if nl < 0:
+                break
+            state.lines.append((base + pos, self._decode(buf[pos:nl])))
+            pos = nl + 1
+
+        state.partial = buf[pos:]
+        state.partial_start = base + pos
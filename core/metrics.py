@@ -0,0 +1,287 @@
+# core/metrics.py
+import os
+import re
+import time
+import sqlite3
+import threading
+import statistics
+from .utils import load_global_config
+
+ANSI_RE = re.compile(r"\x1b\[[\d;?]*[A-Za-z]")
+
+
+# ================= 日志解析器 (按任务类型可插拔) =================
+class LogScraper:
+    """把一行日志解析成若干条指标记录：[{"epoch", "step", "total", "metrics": {name: value}}]"""
+
+    def parse_line(self, line):
+        raise NotImplementedError
+
+
+class LightningScraper(LogScraper):
+    """
+    解析 PyTorch Lightning 的进度条行，例如:
+    Epoch 3:  45%|████▌     | 100/222 [00:10<00:12, 9.80it/s, loss=0.123, v_num=0]
+    """
+    EPOCH_RE = re.compile(r"Epoch\s+(\d+)\s*:")
+    STEP_RE = re.compile(r"\|\s*(\d+)/(\d+)\s*\[")
+    RATE_RE = re.compile(r"([\d.]+)\s*(it/s|s/it)")
+    KV_RE = re.compile(r"([A-Za-z_][\w/.\-]*)\s*=\s*(-?[\d.]+(?:e[-+]?\d+)?|nan|inf)", re.IGNORECASE)
+    IGNORED_KEYS = {"v_num"}
+
+    def parse_line(self, line):
+        line = ANSI_RE.sub("", line)
+        m_epoch = self.EPOCH_RE.search(line)
+        if not m_epoch:
+            return []
+        record = {"epoch": int(m_epoch.group(1)), "step": None, "total": None, "metrics": {}}
+
+        m_step = self.STEP_RE.search(line)
+        if m_step:
+            record["step"], record["total"] = int(m_step.group(1)), int(m_step.group(2))
+
+        m_rate = self.RATE_RE.search(line)
+        if m_rate:
+            rate = float(m_rate.group(1))
+            if m_rate.group(2) == "s/it" and rate > 0:
+                rate = 1.0 / rate
+            record["metrics"]["it_per_s"] = rate
+
+        # 进度条后缀里的 key=value (loss、学习率等)
+        postfix = line[m_rate.end():] if m_rate else line
+        for k, v in self.KV_RE.findall(postfix):
+            if k in self.IGNORED_KEYS:
+                continue
+            try:
+                record["metrics"][k] = float(v)
+            except ValueError:
+                pass
+        return [record]
+
+
+class EvalScraper(LogScraper):
+    """
+    解析评估日志里的最终指标 (Stage 1: FID / Diversity / R-precision，Stage 2: SCA)，兼容
+    `Metrics/FID: 0.52`、`'Metrics/FID': tensor(0.52)`、`│ Metrics/FID │ 0.52 │` 这几种写法。
+    DIRECTIONS 给出每个指标是越小越好 (min) 还是越大越好 (max)。
+    """
+    # 指标名后面必须紧跟分隔符 (: / │ / | / = / tensor()，"Evaluating FID for epoch 12" 这种进度行不算
+    VALUE = r"['\"]?\s*(?:[:│|=]\s*(?:tensor\(\s*)?|tensor\(\s*)(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"
+    PATTERNS = [
+        ("FID", re.compile(r"\bFID\b" + VALUE)),
+        ("Diversity", re.compile(r"\b(?:Diversity|DIV)\b" + VALUE)),
+        # 只认 top-1 (或者没写 top-k 的)，top-2 / top-3 不算
+        ("R_precision", re.compile(r"\bR[_ -]?precision(?:[_ (]*top[_ -]?1\)?)?(?![\w(]|[_ (]*top)" + VALUE,
+                                    re.IGNORECASE)),
+        ("SCA", re.compile(r"\bSCA\b" + VALUE)),
+    ]
+    DIRECTIONS = {"FID": "min", "Diversity": "max", "R_precision": "max", "SCA": "max"}
+
+    def parse_line(self, line):
+        line = ANSI_RE.sub("", line)
+        found = {}
+        for name, pattern in self.PATTERNS:
+            for m in pattern.finditer(line):
+                found[name] = float(m.group(1))
+        if not found:
+            return []
+        return [{"epoch": None, "step": None, "total": None, "metrics": found}]
+
+
+SCRAPERS = {
+    "train": LightningScraper,
+    "eval": EvalScraper,
+}
+
+
+def register_scraper(job_type, scraper_cls):
+    """其它任务类型 (评估、渲染...) 可以注册自己的解析器"""
+    SCRAPERS[job_type] = scraper_cls
+
+
+# ================= 本地时序库 =================
+class MetricsStore:
+    """
+    SQLite 时序库，按实验名存指标：
+    - sources: 被跟踪的日志 + 字节游标，旧数据永远不会被重复解析
+    - metrics: (实验, 日志, 序号, 入库时间, epoch, step, 指标名, 值)
+      序号 seq 是这一行在日志里的位置，采集是懒的 (看板 / 早停 / 评估用到时才扫)，
+      一次扫进来的一批行入库时间都一样，先后顺序只能看 (日志启动时间, seq)
+    """
+    _instance = None
+
+    READ_LIMIT = 8 * 1024 * 1024
+    # 同一个实验可能有好几次运行 (重新排队 / 续跑)：先按日志登记的先后，再按行在日志里的位置
+    ORDER = " ORDER BY (SELECT created FROM sources s WHERE s.log_path = metrics.log_path), seq, rowid"
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetricsStore, cls).__new__(cls)
+            cls._instance._init_store()
+        return cls._instance
+
+    def _init_store(self, db_path=None):
+        cfg = load_global_config("metrics")
+        self.db_path = db_path or cfg.get("db_path", "logs/metrics.db")
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (
+                log_path TEXT PRIMARY KEY,
+                exp TEXT NOT NULL,
+                job_type TEXT NOT NULL,
+                max_epochs INTEGER,
+                byte_offset INTEGER DEFAULT 0,
+                inode INTEGER,
+                created REAL
+            );
+            CREATE TABLE IF NOT EXISTS metrics (
+                exp TEXT NOT NULL,
+                log_path TEXT NOT NULL,
+                ts REAL,
+                seq INTEGER,
+                epoch INTEGER,
+                step INTEGER,
+                total INTEGER,
+                name TEXT NOT NULL,
+                value REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_metrics_exp ON metrics (exp, name, ts);
+        """)
+        # 老版本建的表没有 seq 列
+        cols = {row[1] for row in self._conn.execute("PRAGMA table_info(metrics)")}
+        if "seq" not in cols:
+            self._conn.execute("ALTER TABLE metrics ADD COLUMN seq INTEGER")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_metrics_seq ON metrics (exp, name, log_path, seq)")
+        self._conn.commit()
+
+
+    # ================= 登记 / 查询 =================
+    def track(self, log_path, exp, job_type="train", max_epochs=None):
+        """让某个日志参与指标采集 (启动训练时调用)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sources (log_path, exp, job_type, max_epochs, created) VALUES (?, ?, ?, ?, ?)",
+                (log_path, exp, job_type, max_epochs, time.time()))
+            self._conn.commit()
+
+    def experiments(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT exp, MAX(created) FROM sources GROUP BY exp ORDER BY MAX(created) DESC").fetchall()
+        return [r[0] for r in rows]
+
+    def sources(self, exp=None):
+        sql = "SELECT log_path, exp, job_type, max_epochs, byte_offset, inode FROM sources"
+        args = ()
+        if exp:
+            sql += " WHERE exp = ?"
+            args = (exp,)
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def series(self, exp, name, log_path=None):
+        """[(ts, epoch, step, total, value), ...]；给了 log_path 时只看这一次运行"""
+        sql = "SELECT ts, epoch, step, total, value FROM metrics WHERE exp = ? AND name = ?"
+        args = [exp, name]
+        if log_path:
+            sql += " AND log_path = ?"
+            args.append(log_path)
+        with self._lock:
+            return self._conn.execute(sql + self.ORDER, args).fetchall()
+
+    def latest_values(self, exp):
+        """每个指标最后一次出现的值 {name: value} (评估结果表用)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, value FROM metrics WHERE exp = ?" + self.ORDER, (exp,)).fetchall()
+        return dict(rows)
+
+    def metric_names(self, exp):
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT name FROM metrics WHERE exp = ?", (exp,)).fetchall()
+        return sorted(r[0] for r in rows)
+
+    # ================= 增量采集 =================
+    def scan(self, exp=None):
+        """把所有被跟踪日志里新增的部分解析入库，返回新增记录数"""
+        added = 0
+        for log_path, src_exp, job_type, _, offset, inode in self.sources(exp):
+            added += self._scan_one(log_path, src_exp, job_type, offset or 0, inode)
+        return added
+
+    def _scan_one(self, log_path, exp, job_type, offset, inode):
+        scraper_cls = SCRAPERS.get(job_type)
+        if scraper_cls is None:
+            return 0
+        try:
+            st = os.stat(log_path)
+        except OSError:
+            return 0
+        # 日志被截断 / 轮转：从头再来
+        if st.st_size < offset or (inode is not None and inode != st.st_ino):
+            offset = 0
+        if st.st_size == offset:
+            return 0
+
+        with open(log_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(min(st.st_size - offset, self.READ_LIMIT))
+        # 只处理完整的行，半行留到下次
+        end = max(data.rfind(b"\n"), data.rfind(b"\r"))
+        if end < 0:
+            return 0
+        chunk = data[:end + 1].decode("utf-8", errors="ignore")
+
+        scraper = scraper_cls()
+        now = time.time()
+        rows = []
+        for m in re.finditer(r"[^\r\n]+", chunk):
+            line = m.group(0)
+            if not line.strip():
+                continue
+            # offset 是字节、m.start() 是字符，字节数 >= 字符数，所以跨批次也单调递增
+            seq = offset + m.start()
+            for rec in scraper.parse_line(line):
+                for name, value in rec["metrics"].items():
+                    rows.append((exp, log_path, now, seq, rec["epoch"], rec["step"], rec["total"], name, value))
+
+        with self._lock:
+            if rows:
+                self._conn.executemany(
+                    "INSERT INTO metrics (exp, log_path, ts, seq, epoch, step, total, name, value) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows)
+            self._conn.execute("UPDATE sources SET byte_offset = ?, inode = ? WHERE log_path = ?",
+                               (offset + end + 1, st.st_ino, log_path))
+            self._conn.commit()
+        return len(rows)
+
+    # ================= 吞吐 / ETA =================
+    def progress(self, exp, window=20):
+        """
+        根据最新的进度记录估算吞吐和剩余时间:
+        {"epoch", "step", "total", "max_epochs", "it_per_s", "eta_sec"}
+        """
+        rates = self.series(exp, "it_per_s")
+        if not rates:
+            return None
+        _, epoch, step, total, _ = rates[-1]
+        recent = [r[4] for r in rates[-window:] if r[4] and r[4] > 0]
+        it_per_s = statistics.median(recent) if recent else None
+
+        max_epochs = None
+        for src in self.sources(exp):
+            if src[3]:
+                max_epochs = src[3]
+
+        eta = None
+        if it_per_s and total and step is not None:
+            remaining = total - step
+            if max_epochs:
+                remaining += max(0, max_epochs - epoch - 1) * total
+            eta = remaining / it_per_s
+        return {"epoch": epoch, "step": step, "total": total, "max_epochs": max_epochs,
+                "it_per_s": it_per_s, "eta_sec": eta}
@@ -0,0 +1,296 @@
+# core/pipeline.py
+import os
+import json
+import time
+import datetime
+import threading
+from .process_mgr import ProcessManager
+
+# 调度器眼里“还没结束”的任务状态
+ACTIVE_STATES = ("queued", "pending", "running", "orphaned")
+
+
+class Stage:
+    """
+    流水线里的一个阶段：
+    - build_cmd(item) -> 命令字符串 (用 core/commands.py 里的构造器拼)
+    - collect(item, started_at) -> 交给下一阶段的字段 (dict)；产物不对时抛异常，按失败处理
+    - concurrency: 这个阶段最多同时跑几个 item
+    - retries: 失败后最多重试几次
+    - use_gpu: True 走 GPU 队列，False 直接在本机起进程
+    - ready(item, started_at) -> dict / None：任务还在跑时就轮询，一旦返回 dict (例如产物文件已经写完)
+      item 立即进入下一阶段，不等进程退出；这个进程照样占着本阶段的并发名额直到真正结束
+    """
+
+    def __init__(self, name, build_cmd, root_dir, concurrency=1, retries=0, use_gpu=True, collect=None, ready=None):
+        self.name = name
+        self.build_cmd = build_cmd
+        self.root_dir = root_dir
+        self.concurrency = max(1, int(concurrency))
+        self.retries = max(0, int(retries))
+        self.use_gpu = use_gpu
+        self.collect = collect
+        self.ready = ready
+
+
+class PipelineItem:
+    """流过流水线的一个单位 (例如一个视频)，data 里放各阶段产出的路径"""
+
+    def __init__(self, key, data=None):
+        self.key = key
+        self.data = dict(data or {})
+        self.stage_idx = 0
+        # waiting -> running -> (下一阶段 waiting ...) -> done / failed / cancelled
+        self.status = "waiting"
+        self.attempts = 0
+        self.log_path = None
+        self.started_at = None
+        self.error = None
+        self.logs = {}      # 阶段名 -> [日志路径, ...]
+        self.timings = {}   # 阶段名 -> 耗时 (秒)
+        self.lingering = {} # 阶段序号 -> 提前交棒后还在收尾的日志路径
+        self.created = time.time()
+        self.finished = None
+
+
+class PipelineRun:
+    """
+    按 item 流式推进的流水线：某个 item 的上一阶段一结束就进下一阶段，
+    不用等整批都跑完，端到端耗时从“各阶段最慢的那个加起来”降到接近单个 item 的耗时。
+    """
+
+    POLL_SEC = 2
+
+    def __init__(self, run_id, stages, items, gpu="auto", record_dir=None, on_finish=None, priority="background"):
+        self.run_id = run_id
+        self.stages = stages
+        self.items = items
+        self.gpu = gpu
+        # 批量流水线默认是后台任务，页面上的单次推理 / 渲染先派发
+        self.priority = priority
+        self.record_dir = record_dir
+        # 所有 item 都结束后调用一次 on_finish(run)，返回值放进 run.result (例如拼接好的视频)
+        self.on_finish = on_finish
+        self.result = None
+        self.status = "pending"
+        self.error = None
+        self.started = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ================= 对外接口 =================
+    def start(self):
+        self.started = time.time()
+        self.status = "running"
+        self._thread = threading.Thread(target=self._loop, name=f"pipeline-{self.run_id}", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._stop.set()
+        for item in self.items:
+            if item.status == "running" and item.log_path:
+                ProcessManager.stop_job(item.log_path)
+            for log_path in item.lingering.values():
+                if ProcessManager.job_state(log_path) in ACTIVE_STATES:
+                    ProcessManager.stop_job(log_path)
+            if item.status in ("waiting", "running"):
+                item.status = "cancelled"
+
+    @property
+    def finished(self):
+        if not all(i.status in ("done", "failed", "cancelled") for i in self.items):
+            return False
+        # 提前交棒的任务也要等它们真正退出
+        return not any(ProcessManager.job_state(p) in ACTIVE_STATES
+                       for i in self.items for p in i.lingering.values())
+
+    # ================= 调度循环 =================
+    def _loop(self):
+        try:
+            while not self._stop.is_set():
+                self._poll_running()
+                self._launch_ready()
+                self._save_record()
+                if self.finished:
+                    break
+                self._stop.wait(self.POLL_SEC)
+            if not self._stop.is_set() and self.on_finish:
+                self.result = self.on_finish(self)
+            self.status = "cancelled" if self._stop.is_set() else "finished"
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            self._save_record()
+
+    def _poll_running(self):
+        for item in self.items:
+            if item.status != "running":
+                continue
+            state = ProcessManager.job_state(item.log_path)
+            stage = self.stages[item.stage_idx]
+            if state in ACTIVE_STATES:
+                self._check_ready(item, stage)
+                continue
+            if state == "finished":
+                try:
+                    if stage.collect:
+                        item.data.update(stage.collect(item, item.started_at) or {})
+                except Exception as e:
+                    self._fail(item, stage, f"{stage.name} 产物检查失败: {e}")
+                    continue
+                item.timings[stage.name] = time.time() - item.started_at
+                self._advance(item)
+            else:
+                self._fail(item, stage, f"{stage.name} 退出状态: {state}")
+
+    def _check_ready(self, item, stage):
+        """产物已经就绪就提前交棒给下一阶段 (例如 Stage 1 的 PKL 写完了，后面的指标计算不用等)"""
+        if not stage.ready:
+            return
+        try:
+            data = stage.ready(item, item.started_at)
+        except Exception:
+            return
+        if data is None:
+            return
+        item.data.update(data)
+        item.timings[stage.name] = time.time() - item.started_at
+        item.lingering[item.stage_idx] = item.log_path
+        self._advance(item)
+
+    def _busy(self, idx):
+        """第 idx 阶段占用的并发名额：正在跑的 + 提前交棒但进程还没退出的"""
+        running = sum(1 for i in self.items if i.stage_idx == idx and i.status == "running")
+        for item in self.items:
+            log_path = item.lingering.get(idx)
+            if log_path and ProcessManager.job_state(log_path) in ACTIVE_STATES:
+                running += 1
+        return running
+
+    def _advance(self, item):
+        item.stage_idx += 1
+        item.attempts = 0
+        item.log_path = None
+        item.error = None
+        if item.stage_idx >= len(self.stages):
+            item.status = "done"
+            item.finished = time.time()
+        else:
+            item.status = "waiting"
+
+    def _fail(self, item, stage, reason):
+        item.error = reason
+        if item.attempts <= stage.retries:
+            item.status = "waiting"     # 重新排进这个阶段
+        else:
+            item.status = "failed"
+            item.finished = time.time()
+
+    def _launch_ready(self):
+        for idx, stage in enumerate(self.stages):
+            running = self._busy(idx)
+            for item in self.items:
+                if running >= stage.concurrency:
+                    break
+                if item.stage_idx != idx or item.status != "waiting":
+                    continue
+                self._launch(item, stage)
+                if item.status == "running":
+                    running += 1
+
+    def _launch(self, item, stage):
+        item.attempts += 1
+        try:
+            cmd = stage.build_cmd(item)
+        except Exception as e:
+            self._fail(item, stage, f"{stage.name} 命令构造失败: {e}")
+            return
+        task_name = f"pipe_{stage.name}_{item.key}"[:40]
+        if stage.use_gpu:
+            success, msg = ProcessManager.submit(cmd, task_name, stage.root_dir, gpu=self.gpu, priority=self.priority)
+        else:
+            success, msg = ProcessManager.run_with_log(cmd, task_name, stage.root_dir)
+        if not success:
+            self._fail(item, stage, f"{stage.name} 启动失败: {msg}")
+            return
+        item.status = "running"
+        item.log_path = msg
+        item.started_at = time.time()
+        item.logs.setdefault(stage.name, []).append(msg)
+
+    # ================= 展示 / 记录 =================
+    def stage_summary(self):
+        """每个阶段：排队 / 运行 / 已通过 的 item 数"""
+        rows = []
+        for idx, stage in enumerate(self.stages):
+            rows.append({
+                "阶段": stage.name,
+                "并发": stage.concurrency,
+                "等待": sum(1 for i in self.items if i.stage_idx == idx and i.status == "waiting"),
+                "运行": sum(1 for i in self.items if i.stage_idx == idx and i.status == "running"),
+                "已通过": sum(1 for i in self.items if i.stage_idx > idx),
+                "失败": sum(1 for i in self.items if i.stage_idx == idx and i.status == "failed"),
+            })
+        return rows
+
+    def to_rows(self):
+        rows = []
+        for item in self.items:
+            stage = self.stages[item.stage_idx].name if item.stage_idx < len(self.stages) else "-"
+            elapsed = (item.finished or time.time()) - item.created
+            rows.append({
+                "item": item.key,
+                "阶段": stage,
+                "状态": item.status,
+                "尝试": item.attempts,
+                "耗时": str(datetime.timedelta(seconds=int(elapsed))),
+                "错误": item.error or "",
+            })
+        return rows
+
+    def _save_record(self):
+        if not self.record_dir:
+            return
+        os.makedirs(self.record_dir, exist_ok=True)
+        record = {
+            "run_id": self.run_id,
+            "status": self.status,
+            "error": self.error,
+            "stages": [s.name for s in self.stages],
+            "result": self.result,
+            "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+            "items": [{"key": i.key, "status": i.status, "stage": i.stage_idx, "data": i.data,
+                       "logs": i.logs, "timings": i.timings, "error": i.error} for i in self.items],
+        }
+        with open(os.path.join(self.record_dir, "pipeline.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+
+
+class PipelineManager:
+    """进程内所有流水线的登记表 (单例)，页面刷新后还能看到进度"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PipelineManager, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._runs = {}
+        return cls._instance
+
+    def start(self, run):
+        with self._lock:
+            old = self._runs.get(run.run_id)
+            if old and old.status == "running":
+                raise RuntimeError(f"{run.run_id} 还在跑")
+            self._runs[run.run_id] = run
+        run.start()
+        return run
+
+    def get(self, run_id):
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def list(self):
+        with self._lock:
+            return sorted(self._runs.values(), key=lambda r: r.started or 0, reverse=True)
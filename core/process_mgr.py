@@ -1,8 +1,12 @@
 # core/process_mgr.py
-import subprocess
 import os
 import datetime
-import time
+from .supervisor import JobSupervisor
+from .log_tailer import LogTailer
+from .telemetry import ResourceSampler
+from .job_registry import JobRegistry
+from .result_cache import ResultCache
+from .failure_watch import FailureRecovery
 
 class ProcessManager:
     LOG_DIR = "logs"
@@ -13,12 +17,47 @@ class ProcessManager:
             os.makedirs(ProcessManager.LOG_DIR)
 
     @staticmethod
-    def run_with_log(command, task_name, root_dir):
+    def new_log_path(task_name):
+        """按 任务名_时间戳.log 分配一个日志文件 (绝对路径)"""
         ProcessManager._ensure_log_dir()
         time_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_filename = f"{task_name}_{time_str}.log"
-        log_path = os.path.join(ProcessManager.LOG_DIR, log_filename)
-        abs_log_path = os.path.abspath(log_path)
+        log_path = os.path.abspath(os.path.join(ProcessManager.LOG_DIR, f"{task_name}_{time_str}.log"))
+        # 同一秒内批量提交同名任务时加序号，避免日志互相覆盖
+        idx = 1
+        while os.path.exists(log_path):
+            log_path = os.path.abspath(os.path.join(ProcessManager.LOG_DIR, f"{task_name}_{time_str}_{idx}.log"))
+            idx += 1
+        return log_path
+
+    @staticmethod
+    def _cache_probe(command, root_dir, cache):
+        """
+        cache = {"inputs": [...], "outputs": [...] 或 callable(since), "params": {...}, "force": False}
+        返回 (key, 命中的记录)；没声明 cache、缓存关闭或者哈希失败时返回 (None, None)
+        """
+        if not cache or not ResultCache().enabled:
+            return None, None
+        try:
+            key = ResultCache().make_key(command, root_dir, cache.get("params"), cache.get("inputs", ()))
+        except OSError:
+            return None, None
+        if cache.get("force"):
+            return key, None
+        return key, ResultCache().lookup(key)
+
+    @staticmethod
+    def run_with_log(command, task_name, root_dir, env=None, log_path=None, on_exit=None, cache=None, job_opts=None):
+        """
+        :param cache: 声明输入 / 产物后按内容缓存结果，同样的输入再提交时直接返回上次的日志路径
+                      (ResultCache().was_hit(log_path) 为 True)，格式见 _cache_probe
+        :param job_opts: 按任务覆盖日志 / 失败检测的设置，见 JobSupervisor.launch
+        """
+        key, hit = ProcessManager._cache_probe(command, root_dir, cache)
+        if hit:
+            return True, hit["log_path"]
+        abs_log_path = log_path or ProcessManager.new_log_path(task_name)
+        if key:
+            ResultCache().expect(abs_log_path, key, cache.get("outputs", []), task_name, command, cache.get("params"))
 
         # 1. 强制 Python 实时输出 (Unbuffered)
         if "python" in command and "python -u" not in command:
@@ -27,39 +66,136 @@ class ProcessManager:
             real_cmd = command
 
         # === 🔥 核心黑科技 🔥 ===
-        # 使用 script -q -c "command" /dev/null
-        # 这会创建一个伪终端 (PTV/TTY)，强制 PyTorch Lightning 认为自己在交互式终端里
-        # 从而吐出进度条和颜色代码。
-        # 然后用 | tee 同时输出到屏幕和文件。
-        
-        # 注意：这里对引号进行了转义处理
-        magic_cmd = f"script -q -c \"{real_cmd}\" /dev/null"
-
-        full_cmd = (
-            f"screen -dmS {task_name}_{time_str} bash -c "
-            f"'cd {root_dir}; "
-            f"echo \"--------------------------------\" | tee -a {abs_log_path}; "
-            f"echo \"[CMD] {real_cmd}\" | tee -a {abs_log_path}; "
-            f"echo \"--------------------------------\" | tee -a {abs_log_path}; "
-            f"{magic_cmd} | tee -a {abs_log_path}; "  # <--- 这里的 magic_cmd 是关键
-            f"echo \"\n=== Task Finished ===\" | tee -a {abs_log_path}; "
-            f"exec bash'"
-        )
+        # 以前是 screen + script -q -c + tee 四层套娃，每个任务多出 4 个进程，
+        # 而且拿不到 PID 和退出码。现在由 JobSupervisor 直接开伪终端 (pty)，
+        # PyTorch Lightning 依然认为自己在交互式终端里，进度条和颜色照常输出，
+        # 输出由后台线程直接写进日志文件。
+        # 任务表落盘：启动、结束各记一次，服务重启后还能找回来
+        registry = JobRegistry()
+
+        def _on_exit(job):
+            registry.record_job(job)
+            ResultCache().on_job_exit(job)
+            if on_exit:
+                on_exit(job)
+            # 放在 on_exit (GPU 队列释放卡槽) 之后：重新排队的任务能用上刚空出来的卡
+            FailureRecovery().on_job_exit(job)
 
         try:
-            subprocess.Popen(full_cmd, shell=True)
-            time.sleep(0.5) 
-            return True, abs_log_path
+            job = JobSupervisor().launch(real_cmd, task_name, root_dir, abs_log_path, env=env, on_exit=_on_exit,
+                                         job_opts=job_opts)
         except Exception as e:
+            ResultCache().forget(abs_log_path)
+            registry.upsert(abs_log_path, task_name=task_name, command=real_cmd, root_dir=root_dir,
+                            status="failed", end_time=datetime.datetime.now().isoformat(timespec="seconds"))
             return False, str(e)
 
+        # 任务已经在跑了：记账出错只打个警告，不能把它报成启动失败
+        try:
+            registry.record_job(job)
+            # 资源采样线程懒启动：有任务跑起来才开始遍历 /proc
+            ResourceSampler().ensure_started()
+        except Exception as e:
+            print(f"⚠️ 任务记账出错 ({task_name}): {e}")
+        return True, abs_log_path
+
+    @staticmethod
+    def submit(command, task_name, root_dir, gpu="auto", num_devices=1, env=None, group=None, group_limit=None,
+               cache=None, priority="normal", preemptible=False, job_opts=None):
+        """
+        需要 GPU 的任务走这里：先进 GPU 队列，等有空闲卡槽时再真正启动，
+        CUDA_VISIBLE_DEVICES 由队列自动填写。返回值和 run_with_log 一致。
+        :param gpu: "auto" 表示任意空闲卡，也可以指定 "0" / "1,2"
+        :param group / group_limit: 同组任务最多同时跑几个 (例如一次 sweep)
+        :param cache: 同 run_with_log，命中时连队列都不进
+        :param priority: interactive / normal / background，排队时高优先级先派发
+        :param preemptible: 能从 checkpoint 续跑的任务设 True，卡不够时会被高优先级任务抢占
+        """
+        from .gpu_queue import GPUJobQueue
+        key, hit = ProcessManager._cache_probe(command, root_dir, cache)
+        if hit:
+            return True, hit["log_path"]
+        # 先登记再进队列：有空卡时 submit 里就直接派发了，跑得快的任务可能等不到 expect 就退出；
+        # 产物的起算时间也要早于启动
+        log_path = ProcessManager.new_log_path(task_name)
+        if key:
+            ResultCache().expect(log_path, key, cache.get("outputs", []), task_name, command, cache.get("params"))
+        devices = None if gpu in (None, "", "auto") else [d.strip() for d in str(gpu).split(",") if d.strip()]
+        success, msg = GPUJobQueue().submit(command, task_name, root_dir,
+                                            devices=devices, num_devices=num_devices, env=env,
+                                            group=group, group_limit=group_limit,
+                                            priority=priority, preemptible=preemptible, job_opts=job_opts,
+                                            log_path=log_path)
+        if not success and key:
+            ResultCache().forget(log_path)
+        return success, msg
+
+    @staticmethod
+    def cache_hit(log_path):
+        """上一次 submit / run_with_log 是不是命中缓存直接返回的"""
+        return ResultCache().was_hit(log_path)
+
+    @staticmethod
+    def get_job(log_path):
+        """根据日志路径找回任务 (PID / 状态 / 退出码)"""
+        return JobSupervisor().find_by_log(log_path)
+
+    @staticmethod
+    def job_state(log_path):
+        """
+        任务当前所处的阶段，供调度器轮询：
+        queued / running / finished / failed / killed / preempted / cancelled / lost / None (查无此任务)
+        """
+        from .gpu_queue import GPUJobQueue
+        if GPUJobQueue().position(log_path):
+            return "queued"
+        job = JobSupervisor().find_by_log(log_path)
+        if job:
+            return "running" if job.is_alive else job.status
+        # 刚出队还没拉起来 (任务表里还是 queued)，或者上一次启动留下的任务 (结束了的顺手对账)
+        row = JobRegistry().refresh(log_path)
+        return row["status"] if row else None
+
+    @staticmethod
+    def list_jobs():
+        return JobSupervisor().list_jobs()
+
+    @staticmethod
+    def job_usage(log_path):
+        """任务最近一次的资源采样 (CPU% / RSS / IO / 线程 / 显存)，没有则返回 None"""
+        job = JobSupervisor().find_by_log(log_path)
+        return ResourceSampler().latest(job.job_id) if job else None
+
+    @staticmethod
+    def list_registered(module=None, statuses=None, limit=200):
+        """持久化任务表里的记录 (跨重启)，可以按模块 / 状态过滤"""
+        return JobRegistry().list(module=module, statuses=statuses, limit=limit)
+
+    @staticmethod
+    def stop_job(log_path):
+        job = JobSupervisor().find_by_log(log_path)
+        if not job:
+            # 还在 GPU 队列里排队的任务直接撤掉
+            from .gpu_queue import GPUJobQueue
+            if GPUJobQueue().cancel(log_path):
+                return True
+            # 上一次启动留下来的任务 (orphaned / screen)
+            return JobRegistry().stop(log_path)
+        return JobSupervisor().kill(job.job_id)
+
+    @staticmethod
+    def preempt(log_path, reason):
+        """被高优先级任务抢占：结束整棵进程树，状态记为 preempted"""
+        job = JobSupervisor().find_by_log(log_path)
+        return JobSupervisor().preempt(job.job_id, reason) if job else False
+
     @staticmethod
     def read_log_tail(log_path, lines=200):
         if not log_path or not os.path.exists(log_path):
             return "⏳ 等待任务启动..."
         try:
-            # 简单读取，交给前端去解析颜色
-            cmd = f"tail -n {lines} {log_path}"
-            return subprocess.check_output(cmd, shell=True).decode("utf-8", errors='ignore')
+            # 增量读取 (记住字节偏移，不再每次 fork tail)，颜色交给前端解析
+            content = LogTailer().read_tail(log_path, lines=lines)
+            return content if content is not None else "⏳ 等待任务启动..."
         except Exception as e:
-            return f"日志读取出错: {e}"
\ No newline at end of file
+            return f"日志读取出错: {e}"
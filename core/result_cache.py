@@ -0,0 +1,205 @@
+# core/result_cache.py
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from .utils import load_global_config
+
+
+def files_since(folder, since, suffixes=None):
+    """folder 下 (递归) 修改时间不早于 since 的文件，用来在任务结束后收集它新写出来的产物"""
+    found = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if suffixes and not name.lower().endswith(tuple(suffixes)):
+                continue
+            path = os.path.join(root, name)
+            if os.path.getmtime(path) >= since:
+                found.append(path)
+    return sorted(found)
+
+
+def dirs_since(folder, since):
+    """folder 下一层里修改时间不早于 since 的子目录 (推理脚本每次新建一个结果目录)"""
+    if not os.path.isdir(folder):
+        return []
+    return sorted(os.path.join(folder, d) for d in os.listdir(folder)
+                  if os.path.isdir(os.path.join(folder, d)) and os.path.getmtime(os.path.join(folder, d)) >= since)
+
+
+class ResultCache:
+    """
+    按内容寻址的任务结果缓存 (SQLite WAL)：
+    - key = sha256(命令 + 工作目录 + 参数 + 声明的输入文件/目录/checkpoint 的内容哈希)
+    - 任务成功退出后，把 key 和它的产物路径记下来
+    - 下次提交同一个 key 且产物都还在时，直接返回上次的日志，不再重跑 (force 时跳过)
+    大文件的内容哈希按 (大小, mtime, inode) 记住，只有文件变了才重新读一遍。
+    """
+    _instance = None
+
+    CHUNK = 4 * 1024 * 1024
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResultCache, cls).__new__(cls)
+            cls._instance._init_cache()
+        return cls._instance
+
+    def _init_cache(self):
+        cfg = load_global_config("cache")
+        self.enabled = bool(cfg.get("enable", True))
+        self.db_path = cfg.get("db_path", "logs/cache.db")
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = {}      # log_path -> (key, outputs, meta, 提交时间)
+        self._hits = set()      # 本进程里命中缓存返回的日志路径
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                task_name TEXT,
+                command TEXT,
+                params TEXT,
+                outputs TEXT,
+                log_path TEXT,
+                created REAL,
+                hits INTEGER DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                inode INTEGER,
+                digest TEXT
+            );
+        """)
+        self._conn.commit()
+
+    # ================= 内容哈希 =================
+    def file_digest(self, path):
+        """单个文件的 sha256，文件没变 (大小 / mtime / inode 一致) 时直接用记住的结果"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime, inode, digest FROM file_hashes WHERE path = ?",
+                                     (path,)).fetchone()
+        if row and row[:3] == (st.st_size, st.st_mtime, st.st_ino):
+            return row[3]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?, ?)",
+                               (path, st.st_size, st.st_mtime, st.st_ino, digest))
+            self._conn.commit()
+        return digest
+
+    def input_digest(self, path):
+        """文件取内容哈希；目录按相对路径排序后逐个文件哈希 (软链接跟着走)；不存在记为 missing"""
+        if os.path.isfile(path):
+            return self.file_digest(path)
+        if not os.path.isdir(path):
+            return "missing"
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(path, followlinks=True):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                if not os.path.isfile(full):
+                    continue
+                h.update(os.path.relpath(full, path).encode("utf-8"))
+                h.update(self.file_digest(full).encode("ascii"))
+        return h.hexdigest()
+
+    def make_key(self, command, root_dir="", params=None, inputs=()):
+        payload = {
+            "command": " ".join(command.split()),
+            "root_dir": os.path.abspath(root_dir) if root_dir else "",
+            "params": params or {},
+            "inputs": [[os.path.abspath(p), self.input_digest(p)] for p in inputs],
+        }
+        blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    # ================= 查询 / 记录 =================
+    @staticmethod
+    def _outputs_exist(outputs):
+        for p in outputs:
+            if os.path.isdir(p):
+                if not os.listdir(p):
+                    return False
+            elif not os.path.exists(p):
+                return False
+        return bool(outputs)
+
+    def lookup(self, key):
+        """命中且产物都还在时返回记录 (dict)；产物被删了的旧记录顺手清掉"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, task_name, command, params, outputs, log_path, created, hits FROM results WHERE key = ?",
+                (key,)).fetchone()
+        if not row:
+            return None
+        record = dict(zip(("key", "task_name", "command", "params", "outputs", "log_path", "created", "hits"), row))
+        record["outputs"] = json.loads(record["outputs"] or "[]")
+        if not self._outputs_exist(record["outputs"]):
+            self.invalidate(key)
+            return None
+        with self._lock:
+            self._conn.execute("UPDATE results SET hits = hits + 1 WHERE key = ?", (key,))
+            self._conn.commit()
+        self._hits.add(record["log_path"])
+        return record
+
+    def expect(self, log_path, key, outputs, task_name="", command="", params=None):
+        """
+        任务已提交，等它成功退出再登记产物。
+        outputs 可以是路径列表，也可以是 callable(since) -> 路径列表 (产物目录名要等跑完才知道时用)
+        """
+        with self._lock:
+            self._pending[log_path] = (key, outputs, {"task_name": task_name, "command": command,
+                                                      "params": params or {}}, time.time())
+
+    def forget(self, log_path):
+        """任务没能进队列 / 没能启动：撤掉 expect 登记的条目"""
+        with self._lock:
+            self._pending.pop(log_path, None)
+
+    def on_job_exit(self, job):
+        """ProcessManager 的退出回调：成功且产物都在才写缓存"""
+        with self._lock:
+            pending = self._pending.pop(job.log_path, None)
+        if not pending or job.status != "finished":
+            return
+        key, outputs, meta, since = pending
+        try:
+            paths = outputs(since) if callable(outputs) else list(outputs)
+        except Exception:
+            return
+        paths = [os.path.abspath(p) for p in paths or []]
+        if self._outputs_exist(paths):
+            self.record(key, paths, job.log_path, **meta)
+
+    def record(self, key, outputs, log_path, task_name="", command="", params=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, task_name, command, params, outputs, log_path, created, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, task_name, command, json.dumps(params or {}, ensure_ascii=False, default=str),
+                 json.dumps(outputs, ensure_ascii=False), log_path, time.time()))
+            self._conn.commit()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def was_hit(self, log_path):
+        """这个日志路径是不是命中缓存直接返回的 (页面上用来提示“没有重跑”)"""
+        return log_path in self._hits
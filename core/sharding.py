@@ -0,0 +1,111 @@
+# core/sharding.py
+import os
+import glob
+import shutil
+
+
+def split_shards(paths, n, weight=os.path.getsize):
+    """
+    把文件按大小均衡地分成 n 份 (贪心：大的先放，每次放进当前最轻的那份)，
+    视频时长和文件大小大致成正比，这样各分片差不多同时跑完。空分片会被去掉。
+    """
+    n = max(1, min(int(n), len(paths)))
+    shards = [[] for _ in range(n)]
+    loads = [0] * n
+    for path in sorted(paths, key=weight, reverse=True):
+        i = loads.index(min(loads))
+        shards[i].append(path)
+        loads[i] += weight(path)
+    return [sorted(s) for s in shards if s]
+
+
+def link_shard(shard_dir, files):
+    """用软链接把 files 放进 shard_dir (先清空旧链接)，不复制视频本身"""
+    os.makedirs(shard_dir, exist_ok=True)
+    for name in os.listdir(shard_dir):
+        path = os.path.join(shard_dir, name)
+        if os.path.islink(path):
+            os.remove(path)
+    for f in files:
+        os.symlink(os.path.abspath(f), os.path.join(shard_dir, os.path.basename(f)))
+
+
+def merge_outputs(shard_out, dest, names=None):
+    """
+    把分片输出目录下的每个子目录 (一个视频一个) 挪回 dest，已存在的会被覆盖。
+    names 不为空时只挪这些子目录。返回挪过去的名字。
+    """
+    if not os.path.isdir(shard_out):
+        return []
+    os.makedirs(dest, exist_ok=True)
+    moved = []
+    for name in sorted(os.listdir(shard_out)):
+        if names is not None and name not in names:
+            continue
+        src = os.path.join(shard_out, name)
+        target = os.path.join(dest, name)
+        if os.path.isdir(target) and not os.path.islink(target):
+            shutil.rmtree(target)
+        elif os.path.lexists(target):
+            os.remove(target)
+        shutil.move(src, target)
+        moved.append(name)
+    return moved
+
+
+def has_result(out_dir, stem, pattern="*.pt"):
+    """某个视频在 out_dir 下是否已经有结果 (GVHMR 每个视频一个子目录，里面是 .pt)"""
+    return bool(glob.glob(os.path.join(out_dir, stem, pattern)))
+
+
+# ================= 长序列按帧分段 =================
+def frame_ranges(n_frames, n_parts, min_len=1):
+    """把 [0, n_frames) 切成 n_parts 段连续区间，每段至少 min_len 帧，返回 [(start, end), ...]"""
+    n_parts = max(1, min(int(n_parts), n_frames // max(1, min_len)))
+    step, rest = divmod(n_frames, n_parts)
+    ranges, start = [], 0
+    for i in range(n_parts):
+        end = start + step + (1 if i < rest else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def split_motion(npy_path, ranges, out_root):
+    """
+    按帧区间把一个动作 .npy (第 0 维是帧) 切成多段，
+    每段放进 out_root/partK/ 下面 (文件名不变)，这样渲染脚本可以按文件夹单独渲染。返回各段目录。
+    """
+    import numpy as np
+    motion = np.load(npy_path, mmap_mode="r")
+    name = os.path.basename(npy_path)
+    part_dirs = []
+    for k, (start, end) in enumerate(ranges):
+        part_dir = os.path.join(out_root, f"part{k:03d}")
+        if os.path.isdir(part_dir):
+            shutil.rmtree(part_dir)
+        os.makedirs(part_dir)
+        np.save(os.path.join(part_dir, name), np.ascontiguousarray(motion[start:end]))
+        part_dirs.append(part_dir)
+    return part_dirs
+
+
+def motion_frames(npy_path):
+    """动作序列的帧数 (只读文件头，不把整个数组读进来)"""
+    import numpy as np
+    return int(np.load(npy_path, mmap_mode="r").shape[0])
+
+
+def newest_file(folder, pattern="*.mp4", since=0):
+    """folder 下修改时间晚于 since 的最新文件，没有就返回 None"""
+    files = [f for f in glob.glob(os.path.join(folder, pattern)) if os.path.getmtime(f) >= since]
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def write_concat_list(list_path, videos):
+    """ffmpeg concat demuxer 用的文件列表"""
+    with open(list_path, "w", encoding="utf-8") as f:
+        for v in videos:
+            escaped = os.path.abspath(v).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_path
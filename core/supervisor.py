@@ -0,0 +1,351 @@
+# core/supervisor.py
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+import threading
+import datetime
+import itertools
+from . import job_host
+from .utils import load_global_config
+from .failure_watch import active_patterns
+
+# 宿主进程用 python -m core.job_host 启动，工作目录要是仓库根目录
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Job:
+    """一个被托管任务的运行时记录 (PID / 起止时间 / 退出码)"""
+
+    def __init__(self, job_id, task_name, command, root_dir, log_path, env=None):
+        self.job_id = job_id
+        self.task_name = task_name
+        self.command = command
+        self.root_dir = root_dir
+        self.log_path = log_path
+        self.env = env or {}
+        self.opts = {}
+
+        self.pid = None
+        # 持有 pty、写日志的宿主进程 (core/job_host.py)；pid 是宿主拉起来的任务进程 (也是进程组号)
+        self.host_pid = None
+        # pending -> running -> finished / failed / killed / preempted
+        self.status = "pending"
+        self.exit_code = None
+        self.start_time = None
+        self.end_time = None
+        # FailureWatcher 命中并结束任务时的原因 ("cuda_oom: <那一行>")，任务记为 failed (只记警告的不算)；
+        # 被高优先级任务抢占时是 "preempted: ..."，记为 preempted
+        self.failure = None
+
+        # ready: 进程已拉起 + 日志头已落盘，前端可以立即开始读日志
+        self.ready = threading.Event()
+        self.done = threading.Event()
+        # 任务结束后的回调 (例如 GPU 队列释放槽位)，参数是 Job 本身
+        self.on_exit = []
+        self._host = None
+        self._waiter = None
+        self._kill_requested = False
+
+    @property
+    def is_alive(self):
+        return self.status in ("pending", "running")
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "task_name": self.task_name,
+            "command": self.command,
+            "root_dir": self.root_dir,
+            "log_path": self.log_path,
+            "pid": self.pid,
+            "host_pid": self.host_pid,
+            "status": self.status,
+            "exit_code": self.exit_code,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "failure": self.failure,
+        }
+
+
+class JobSupervisor:
+    """
+    任务托管器，替代原来的 screen + script + tee 链条：
+    - 每个任务由一个 setsid 出去的宿主进程 (core/job_host.py) 开伪终端 (pty) 跑命令，进度条和颜色照样会吐出来，
+      输出由宿主直接写进日志文件；Streamlit 重启 / 退出时任务不受影响
+    - 这里只盯着宿主进程，维护一张任务表 (PID / 起止时间 / 退出码)，可以随时发信号
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    # 伪终端尺寸，太窄的话 Lightning 的进度条会被挤成多行
+    TTY_ROWS = 50
+    TTY_COLS = 200
+
+    def __new__(cls):
+        if cls._instance is None:
+            # 任务线程和页面线程可能同时第一次取单例：初始化完再挂到 _instance 上，别人拿不到半成品
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super(JobSupervisor, cls).__new__(cls)
+                    instance._init_registry()
+                    cls._instance = instance
+        return cls._instance
+
+    def _init_registry(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._closed = False
+        self._counter = itertools.count(1)
+        self.log_cfg = load_global_config("logging")
+        self.watch_cfg = load_global_config("failure_watch")
+        # SIGTERM 之后等多久还没退出就 SIGKILL (给训练脚本留时间存 checkpoint)
+        self.kill_grace = float(load_global_config("scheduler").get("kill_grace_sec", 30))
+
+    # ================= 对外接口 =================
+    def launch(self, command, task_name, root_dir, log_path, env=None, on_exit=None, ready_timeout=5.0, job_opts=None):
+        """
+        拉起一个任务，等到就绪握手完成后返回 Job
+        :param job_opts: 按任务覆盖宿主的设置，例如 {"compact": False} (要逐帧读进度条的任务)、
+                         {"kill": True} (命中失败特征就结束，交给 FailureRecovery 重试的任务)
+        """
+        job_id = f"{task_name}_{next(self._counter)}"
+        job = Job(job_id, task_name, command, root_dir, log_path, env=env)
+        job.opts = dict(job_opts or {})
+        if on_exit:
+            job.on_exit.append(on_exit)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("任务托管器已关闭，不再接新任务")
+            self._jobs[job_id] = job
+
+        try:
+            self._start(job)
+        except Exception:
+            # 没拉起来的任务不留在任务表里，否则一直是 pending (is_alive)，job_state 会报 running
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            job.status = "failed"
+            job.end_time = datetime.datetime.now().isoformat(timespec="seconds")
+            job.ready.set()
+            job.done.set()
+            raise
+        job.ready.wait(ready_timeout)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find_by_log(self, log_path):
+        """前端只记得 log 路径，这里反查任务"""
+        if not log_path:
+            return None
+        with self._lock:
+            for job in self._jobs.values():
+                if job.log_path == log_path:
+                    return job
+        return None
+
+    def list_jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, timeout=10.0):
+        """
+        不再接新任务，SIGKILL 掉所有还在跑的任务，等宿主线程把 on_exit 回调跑完再返回 (退出前 / 测试用)。
+        返回是否全部收尾完成
+        """
+        with self._lock:
+            self._closed = True
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.is_alive:
+                job._kill_requested = True
+                self.terminate(job, signal.SIGKILL)
+        deadline = time.time() + timeout
+        for job in jobs:
+            if job._waiter:
+                job._waiter.join(max(0.0, deadline - time.time()))
+        return not any(job._waiter and job._waiter.is_alive() for job in jobs)
+
+    def send_signal(self, job_id, sig=signal.SIGTERM):
+        """给整个进程组发信号 (子进程是 session leader)"""
+        job = self.get(job_id)
+        if not job or not job.pid or not job.is_alive:
+            return False
+        try:
+            os.killpg(job.pid, sig)
+            return True
+        except ProcessLookupError:
+            return False
+
+    def kill(self, job_id, sig=signal.SIGTERM):
+        """主动结束任务 (整棵进程树)，最终状态记为 killed 而不是 failed"""
+        job = self.get(job_id)
+        if not job or not job.is_alive:
+            return False
+        job._kill_requested = True
+        return self.terminate(job, sig)
+
+    def preempt(self, job_id, reason):
+        """让位给高优先级任务：结束整棵进程树，状态记为 preempted (由 FailureRecovery 带 RESUME 重新排队)"""
+        job = self.get(job_id)
+        # 宿主进程还没拉起来时没有能发信号的对象，交给调用方稍后再试
+        if not job or not job.is_alive or job.failure or not (job.pid or job.host_pid):
+            return False
+        job.failure = f"preempted: {reason}"
+        with open(job.log_path, "a", encoding="utf-8") as f:
+            f.write(f"\n[PREEMPTED] {reason}\n")
+        return self.terminate(job)
+
+    def terminate(self, job, sig=signal.SIGTERM):
+        """
+        先给进程组和所有子孙进程发 sig (自己 setsid 出去的子进程也跑不掉)，
+        kill_grace 秒后还活着的统一 SIGKILL；pty 关掉后宿主进程收尾退出，on_exit 释放 GPU 卡槽
+        """
+        if not job.pid:
+            # 任务进程还没拉起来：交给宿主转发给进程组
+            return self._signal_all(job.host_pid, [], sig) if job.host_pid else False
+        pids = self._tree_pids(job.pid)
+        alive = self._signal_all(job.pid, pids, sig)
+        if alive and sig != signal.SIGKILL and self.kill_grace > 0:
+            timer = threading.Timer(self.kill_grace, self._force_kill, args=(job, pids))
+            timer.daemon = True
+            timer.start()
+        return alive
+
+    def _force_kill(self, job, pids):
+        if not job.is_alive:
+            return
+        # 期间新起的子进程也一起收掉
+        pids = set(pids) | set(self._tree_pids(job.pid))
+        if self._signal_all(job.pid, pids, signal.SIGKILL):
+            with open(job.log_path, "a", encoding="utf-8") as f:
+                f.write(f"\n[KILL] {self.kill_grace:.0f}s 内没有退出，已 SIGKILL\n")
+
+    @staticmethod
+    def _tree_pids(root_pid):
+        from .telemetry import scan_proc, process_tree
+        try:
+            return process_tree(root_pid, scan_proc())
+        except OSError:
+            return [root_pid]
+
+    @staticmethod
+    def _signal_all(pgid, pids, sig):
+        sent = False
+        try:
+            os.killpg(pgid, sig)
+            sent = True
+        except ProcessLookupError:
+            pass
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+                sent = True
+            except (ProcessLookupError, PermissionError):
+                pass
+        return sent
+
+    # ================= 内部实现 =================
+    def _start(self, job):
+        env = os.environ.copy()
+        env.update({k: str(v) for k, v in job.env.items()})
+        env.setdefault("TERM", "xterm-256color")
+        env["COLUMNS"] = str(self.TTY_COLS)
+        env["LINES"] = str(self.TTY_ROWS)
+
+        spec = {
+            "command": job.command,
+            "root_dir": job.root_dir,
+            "log_path": job.log_path,
+            "compact": self.log_cfg.get("compact", True),
+            "progress_interval": float(self.log_cfg.get("progress_interval", 5)),
+            "keep_raw": self.log_cfg.get("keep_raw", False),
+            "watch": self.watch_cfg.get("enable", True),
+            # 命中失败特征后要不要结束任务：默认只记警告，有重试策略的任务提交时用 job_opts={"kill": True} 打开
+            "kill": False,
+            "patterns": active_patterns(),
+            "kill_grace": self.kill_grace,
+            "rows": self.TTY_ROWS,
+            "cols": self.TTY_COLS,
+        }
+        spec.update(job.opts)
+        spec["kill"] = bool(spec["kill"]) and self.watch_cfg.get("kill", True)
+        spec_file = job_host.spec_path(job.log_path)
+        with open(spec_file, "w", encoding="utf-8") as f:
+            json.dump(spec, f, ensure_ascii=False)
+
+        # 宿主进程自己一个 session (setsid)：Streamlit 退出 / 重启时不会被带走，pty 和日志都归它管。
+        # 宿主自身的报错 (例如 import 失败) 直接追加进任务日志
+        with open(job.log_path, "ab") as err_f:
+            try:
+                host = subprocess.Popen(
+                    [sys.executable, "-m", "core.job_host", spec_file],
+                    cwd=APP_ROOT,
+                    env=env,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=err_f,
+                    start_new_session=True,
+                    close_fds=True,
+                )
+            except Exception as e:
+                err_f.write(f"[启动失败] {e}\n".encode("utf-8"))
+                raise
+        job._host = host
+        job.host_pid = host.pid
+        job.start_time = datetime.datetime.now().isoformat(timespec="seconds")
+        job.status = "running"
+
+        job._waiter = threading.Thread(target=self._wait_host, args=(job,), name=f"host-{job.job_id}", daemon=True)
+        job._waiter.start()
+        self._await_pid(job)
+        job.ready.set()
+
+    def _await_pid(self, job, timeout=10.0):
+        """就绪握手：等宿主把任务进程拉起来、PID 写进 state.json"""
+        deadline = time.time() + timeout
+        while time.time() < deadline and job.is_alive:
+            pid = job_host.read_state(job.log_path).get("pid")
+            if pid:
+                job.pid = pid
+                return
+            time.sleep(0.02)
+
+    @staticmethod
+    def raw_log_path(log_path):
+        return job_host.raw_log_path(log_path)
+
+    def _wait_host(self, job):
+        """宿主进程退出 = 任务结束 (pty 已关、日志已收尾)，从 state.json 取退出码和失败原因"""
+        job._host.wait()
+        state = job_host.read_state(job.log_path)
+        job.pid = job.pid or state.get("pid")
+        code = state.get("exit_code")
+        # 抢占原因是这边记下的，优先于宿主里的特征匹配
+        job.failure = job.failure or state.get("failure")
+        if job.failure and job.failure.startswith("preempted:"):
+            status = "preempted"
+        elif job.failure:
+            status = "failed"
+        elif job._kill_requested:
+            status = "killed"
+        else:
+            status = "finished" if code == 0 else "failed"
+        self._finish(job, status, code)
+
+    @staticmethod
+    def _finish(job, status, code):
+        job.exit_code = code
+        job.status = status
+        job.end_time = datetime.datetime.now().isoformat(timespec="seconds")
+        job.done.set()
+        for cb in job.on_exit:
+            try:
+                cb(job)
+            except Exception as e:
+                print(f"⚠️ on_exit 回调出错 ({job.job_id}): {e}")
@@ -0,0 +1,51 @@
+# core/sweep.py
+import re
+import itertools
+
+
+def expand_trials(axes, mode="grid"):
+    """
+    把参数轴展开成一组 trial (每个 trial 是一个 dict)：
+    - grid: 所有轴做笛卡尔积
+    - list: 各轴按位置一一配对，只有一个取值的轴自动广播
+    :param axes: {参数名: [取值, ...]}，顺序决定 trial 的顺序和命名顺序
+    """
+    names = list(axes.keys())
+    values = [list(v) for v in axes.values()]
+    if any(not v for v in values):
+        return []
+    if mode == "grid":
+        return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+    if mode == "list":
+        length = max(len(v) for v in values)
+        for name, v in zip(names, values):
+            if len(v) not in (1, length):
+                raise ValueError(f"list 模式下 {name} 的取值个数 ({len(v)}) 和其它轴 ({length}) 对不上")
+        return [{name: (v[i] if len(v) > 1 else v[0]) for name, v in zip(names, values)} for i in range(length)]
+    raise ValueError(f"未知的 sweep 模式: {mode}")
+
+
+def _fmt(value):
+    if isinstance(value, bool):
+        return "T" if value else "F"
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value)
+
+
+def trial_name(prefix, params, abbrev=None):
+    """
+    确定性的 trial 名：同样的参数永远得到同样的名字，重跑 / 续跑时能对上目录。
+    例如 trial_name("Sweep", {"lambda": 0.2, "lr": 2e-5}, {"lambda": "lam"}) -> "Sweep_lam0.2_lr2e-05"
+    """
+    abbrev = abbrev or {}
+    parts = [prefix] if prefix else []
+    for key, value in params.items():
+        tag = abbrev.get(key, key)
+        parts.append(f"{tag}{_fmt(value)}")
+    return re.sub(r"[^\w.\-+]", "", "_".join(parts))
+
+
+def parse_values(text, cast=str):
+    """把 "2e-5, 1e-4" 这样的逗号列表转成 [2e-05, 0.0001]"""
+    return [cast(v.strip()) for v in str(text).split(",") if v.strip()]
@@ -0,0 +1,275 @@
+# core/telemetry.py
+import os
+import time
+import subprocess
+import threading
+from collections import deque, OrderedDict
+from .utils import load_global_config
+from .supervisor import JobSupervisor
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+# ================= GPU 探测 (可插拔) =================
+class GpuUsageProbe:
+    """GPU 显存探测接口：返回 {pid: 显存MB}"""
+
+    def sample(self):
+        raise NotImplementedError
+
+
+class NvidiaSmiUsageProbe(GpuUsageProbe):
+    def sample(self):
+        try:
+            out = subprocess.check_output(
+                ["nvidia-smi", "--query-compute-apps=pid,used_memory", "--format=csv,noheader,nounits"],
+                stderr=subprocess.DEVNULL, timeout=5,
+            ).decode("utf-8", errors="ignore")
+        except Exception:
+            return {}
+        usage = {}
+        for line in out.splitlines():
+            parts = [p.strip() for p in line.split(",")]
+            if len(parts) == 2 and parts[0].isdigit():
+                try:
+                    usage[int(parts[0])] = usage.get(int(parts[0]), 0.0) + float(parts[1])
+                except ValueError:
+                    pass
+        return usage
+
+
+class FakeGpuUsageProbe(GpuUsageProbe):
+    """纯 CPU 机器 / 调试用：直接返回给定的 {pid: 显存MB}"""
+
+    def __init__(self, usage=None):
+        self.usage = dict(usage or {})
+
+    def sample(self):
+        return dict(self.usage)
+
+
+class NullGpuUsageProbe(GpuUsageProbe):
+    def sample(self):
+        return {}
+
+
+def make_gpu_probe(cfg):
+    kind = cfg.get("gpu_probe", "nvidia-smi")
+    if kind == "fake":
+        return FakeGpuUsageProbe()
+    if kind == "none":
+        return NullGpuUsageProbe()
+    return NvidiaSmiUsageProbe()
+
+
+# ================= /proc 读取 =================
+def _read_stat(pid):
+    """返回 (ppid, utime+stime 的 tick 数, 线程数, RSS 字节)"""
+    with open(f"/proc/{pid}/stat", "rb") as f:
+        data = f.read().decode("utf-8", errors="ignore")
+    # comm 里可能有空格和括号，从最后一个 ')' 之后开始切
+    fields = data[data.rfind(")") + 2:].split()
+    ppid = int(fields[1])
+    ticks = int(fields[11]) + int(fields[12])
+    threads = int(fields[17])
+    rss = int(fields[21]) * PAGE_SIZE
+    return ppid, ticks, threads, rss
+
+
+def _read_io(pid):
+    read_bytes = write_bytes = 0
+    try:
+        with open(f"/proc/{pid}/io", "rb") as f:
+            for line in f:
+                if line.startswith(b"read_bytes:"):
+                    read_bytes = int(line.split()[1])
+                elif line.startswith(b"write_bytes:"):
+                    write_bytes = int(line.split()[1])
+    except OSError:
+        pass
+    return read_bytes, write_bytes
+
+
+def scan_proc():
+    """遍历一次 /proc：{pid: (ppid, ticks, threads, rss)}"""
+    table = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            table[int(name)] = _read_stat(name)
+        except (OSError, ValueError, IndexError):
+            continue
+    return table
+
+
+def process_tree(root_pid, table):
+    """root_pid 以及它的所有子孙进程"""
+    children = {}
+    for pid, info in table.items():
+        children.setdefault(info[0], []).append(pid)
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid not in table:
+            continue
+        tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+class ResourceSampler:
+    """
+    后台资源采样：每一轮遍历一次 /proc，把每个托管任务整棵进程树的
+    CPU% / RSS / 读写字节 / 线程数 (+ GPU 显存) 写进固定长度的环形缓冲区。
+    - interval: 两轮之间的目标间隔 (默认 1 秒一轮，覆盖所有任务)
+    - max_overhead: 采样耗时占比上限，超了就自动拉长间隔
+    - gpu_every: 每隔几轮才问一次 GPU (nvidia-smi 比较贵)
+    """
+    _instance = None
+
+    MAX_JOBS = 64
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResourceSampler, cls).__new__(cls)
+            cls._instance._init_sampler()
+        return cls._instance
+
+    def _init_sampler(self):
+        self.cfg = load_global_config("telemetry")
+        self.enabled = bool(self.cfg.get("enable", True))
+        self.interval = float(self.cfg.get("interval", 1.0))
+        self.max_overhead = float(self.cfg.get("max_overhead", 0.05))
+        self.gpu_every = max(1, int(self.cfg.get("gpu_every", 5)))
+        self.history = int(self.cfg.get("history", 600))
+        self.gpu_probe = make_gpu_probe(self.cfg)
+
+        self._lock = threading.Lock()
+        self._buffers = OrderedDict()   # job_id -> deque(sample)
+        self._prev = {}                 # job_id -> (monotonic, ticks, read_bytes, write_bytes)
+        self._gpu_cache = {}
+        self._passes = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_pass_sec = 0.0
+
+    def set_gpu_probe(self, probe):
+        self.gpu_probe = probe
+
+    def ensure_started(self):
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="resource-sampler", daemon=True)
+                self._thread.start()
+        return True
+
+    def shutdown(self, timeout=5.0):
+        """停掉采样线程 (退出前 / 测试用)"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    # ================= 查询 =================
+    def samples(self, job_id):
+        with self._lock:
+            buf = self._buffers.get(job_id)
+            return list(buf) if buf else []
+
+    def latest(self, job_id):
+        with self._lock:
+            buf = self._buffers.get(job_id)
+            return buf[-1] if buf else None
+
+    def summary(self, job_id):
+        """峰值 / 均值，用来找吃内存、吃 CPU 的配置"""
+        rows = self.samples(job_id)
+        if not rows:
+            return None
+        return {
+            "samples": len(rows),
+            "cpu_pct_avg": sum(r["cpu_pct"] for r in rows) / len(rows),
+            "cpu_pct_max": max(r["cpu_pct"] for r in rows),
+            "rss_mb_max": max(r["rss_mb"] for r in rows),
+            "gpu_mem_mb_max": max(r["gpu_mem_mb"] for r in rows),
+            "read_mb": rows[-1]["read_bytes"] / 1024 ** 2,
+            "write_mb": rows[-1]["write_bytes"] / 1024 ** 2,
+            "threads_max": max(r["threads"] for r in rows),
+        }
+
+    # ================= 采样 =================
+    def _loop(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                self.sample_once()
+            except Exception as e:
+                print(f"⚠️ 资源采样失败: {e}")
+            cost = time.monotonic() - start
+            self.last_pass_sec = cost
+            self._stop.wait(self.next_wait(cost))
+
+    def next_wait(self, cost):
+        """开销预算：一轮耗时 cost 时，两轮开头之间至少隔 max(interval, cost / max_overhead)"""
+        wait = max(self.interval, cost / max(self.max_overhead, 1e-3)) - cost
+        return max(wait, 0.05)
+
+    def sample_once(self, jobs=None):
+        jobs = [j for j in (jobs if jobs is not None else JobSupervisor().list_jobs())
+                if j.pid and j.is_alive]
+        if not jobs:
+            return
+        table = scan_proc()
+        self._passes += 1
+        if self._passes % self.gpu_every == 1 or self.gpu_every == 1:
+            self._gpu_cache = self.gpu_probe.sample()
+        now = time.monotonic()
+
+        for job in jobs:
+            pids = process_tree(job.pid, table)
+            if not pids:
+                continue
+            ticks = sum(table[p][1] for p in pids)
+            threads = sum(table[p][2] for p in pids)
+            rss = sum(table[p][3] for p in pids)
+            read_bytes = write_bytes = 0
+            for p in pids:
+                r, w = _read_io(p)
+                read_bytes += r
+                write_bytes += w
+            gpu_mem = sum(self._gpu_cache.get(p, 0.0) for p in pids)
+
+            prev = self._prev.get(job.job_id)
+            cpu_pct = read_rate = write_rate = 0.0
+            if prev:
+                dt = max(now - prev[0], 1e-6)
+                # 子进程退出会让累计值变小，按 0 处理
+                cpu_pct = max(ticks - prev[1], 0) / CLK_TCK / dt * 100
+                read_rate = max(read_bytes - prev[2], 0) / dt
+                write_rate = max(write_bytes - prev[3], 0) / dt
+            self._prev[job.job_id] = (now, ticks, read_bytes, write_bytes)
+
+            sample = {
+                "ts": time.time(),
+                "nprocs": len(pids),
+                "cpu_pct": cpu_pct,
+                "rss_mb": rss / 1024 ** 2,
+                "threads": threads,
+                "read_bytes": read_bytes,
+                "write_bytes": write_bytes,
+                "read_bps": read_rate,
+                "write_bps": write_rate,
+                "gpu_mem_mb": gpu_mem,
+            }
+            with self._lock:
+                buf = self._buffers.get(job.job_id)
+                if buf is None:
+                    buf = deque(maxlen=self.history)
+                    self._buffers[job.job_id] = buf
+                    while len(self._buffers) > self.MAX_JOBS:
+                        old_id, _ = self._buffers.popitem(last=False)
+                        self._prev.pop(old_id, None)
+                buf.append(sample)
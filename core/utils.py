@@ -14,6 +14,17 @@ def save_yaml(data, path):
     with open(path, 'w', encoding='utf-8') as f:
         yaml.dump(data, f, default_flow_style=False, sort_keys=False)
 
+# 全局配置 (调度 / 日志等与具体模块无关的参数)
+GLOBAL_CONFIG_PATH = "configs/global_config.yaml"
+
+def load_global_config(section, default=None):
+    """读取 configs/global_config.yaml 里的某一节，缺失时返回 default"""
+    cfg = load_yaml(GLOBAL_CONFIG_PATH) or {}
+    value = cfg.get(section)
+    if value is None:
+        return {} if default is None else default
+    return value
+
 # 持久化状态管理 (替代原来的 alchemy_state.json)
 STATE_FILE = "alchemy_state.json"
 
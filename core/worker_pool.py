@@ -0,0 +1,287 @@
+# core/worker_pool.py
+import os
+import json
+import time
+import socket
+import hashlib
+import datetime
+import threading
+from .utils import load_global_config
+from .process_mgr import ProcessManager
+from .job_registry import JobRegistry
+from .commands import INFER_WORKER
+from .gpu_queue import GPUJobQueue
+
+
+def call_worker(sock_path, payload, timeout=None):
+    """发一行 JSON，收一行 JSON；连不上时抛 OSError"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        conn.connect(sock_path)
+        conn.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+        buf = b""
+        while not buf.endswith(b"\n"):
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    return json.loads(buf.decode("utf-8") or "{}")
+
+
+class WarmWorker:
+    def __init__(self, key, ckpt, gpu, root_dir, sock_path):
+        self.key = key
+        self.ckpt = ckpt
+        self.gpu = gpu
+        self.root_dir = root_dir
+        self.sock_path = sock_path
+        self.log_path = None
+        # starting -> ready -> stopping -> stopped / failed
+        self.status = "starting"
+        self.busy = 0
+        self.served = 0
+        self.last_used = time.time()
+        self.error = None
+        self._lock = threading.Lock()   # 一个 worker 同一时间只跑一个请求
+
+    @property
+    def alive(self):
+        if not self.log_path:
+            # 已经登记、还没交给 GPU 队列
+            return self.status == "starting"
+        return ProcessManager.job_state(self.log_path) in ("queued", "running")
+
+
+class WarmRequest:
+    def __init__(self, request_id, worker_key, log_path, payload):
+        self.request_id = request_id
+        self.worker_key = worker_key
+        self.log_path = log_path
+        self.payload = payload
+        # waiting -> running -> done / failed
+        self.status = "waiting"
+        self.outputs = []
+        self.seconds = None
+        self.error = None
+        self.created = time.time()
+
+
+class WarmWorkerPool:
+    """
+    常驻推理 worker 池 (单例)：每个 (checkpoint, GPU) 一个 worker 进程，模型常驻显存。
+    - worker 本身走 GPU 队列启动，占着一个卡槽，日志 / 任务表 / 资源采样和普通任务一样
+    - 最多 max_workers 个；满了再要新的就先停掉最久没用、当前空闲的那个 (LRU)，都在忙时拒绝 (RuntimeError)
+    - 空闲超过 idle_ttl 秒的 worker 自动停掉，把显存还回去；GPU 队列里有任务在等它占着的卡时，
+      空闲超过 yield_after 秒就提前停掉让出卡槽 (下次请求再重新拉起)
+    - 每个请求单独一个日志，登记进任务表，页面上和普通任务一样看
+    """
+    _instance = None
+
+    REAP_SEC = 5
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(WarmWorkerPool, cls).__new__(cls)
+            cls._instance._init_pool()
+        return cls._instance
+
+    def _init_pool(self):
+        cfg = load_global_config("warm_worker")
+        self.max_workers = int(cfg.get("max_workers", 2))
+        self.idle_ttl = float(cfg.get("idle_ttl", 1800))
+        self.yield_after = float(cfg.get("yield_after", 10))
+        self.start_timeout = float(cfg.get("start_timeout", 900))
+        self.memo_items = int(cfg.get("memo_items", 4))
+        self.python_exec = cfg.get("python", "python")
+        self.socket_dir = os.path.abspath(cfg.get("socket_dir", "logs/workers"))
+        self._lock = threading.Lock()
+        self._workers = {}
+        self._requests = {}
+        self._seq = 0
+        self._closed = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, name="warm-reaper", daemon=True)
+        self._reaper.start()
+
+    # ================= worker 生命周期 =================
+    @staticmethod
+    def worker_key(ckpt, gpu):
+        return f"{os.path.abspath(ckpt)}@{gpu or 'auto'}"
+
+    def _new_worker(self, ckpt, gpu, root_dir):
+        key = self.worker_key(ckpt, gpu)
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+        sock_path = os.path.join(self.socket_dir, f"{digest}.sock")
+        return WarmWorker(key, ckpt, gpu, root_dir, sock_path)
+
+    def _start_worker(self, worker):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        cmd = (f"{self.python_exec} -u {INFER_WORKER} --socket {worker.sock_path} --root {worker.root_dir} "
+               f"--preload {worker.ckpt} --memo-items {self.memo_items}")
+        task_name = f"warm_{os.path.splitext(os.path.basename(worker.ckpt))[0]}"[:30]
+        # 常驻 worker 服务的是页面上点的推理，按交互任务排队
+        success, msg = ProcessManager.submit(cmd, task_name, worker.root_dir, gpu=worker.gpu, priority="interactive")
+        if not success:
+            worker.status, worker.error = "failed", msg
+        else:
+            worker.log_path = msg
+
+    def _evict_for_room(self):
+        """
+        满了的时候挑出最久没用的空闲 worker 让位 (在锁里只挑、标成 stopping，由调用方在锁外停)；
+        都在忙就拒绝，不能超过 max_workers，每个 worker 都占着一个卡槽
+        """
+        alive = [w for w in self._workers.values() if w.status in ("starting", "ready")]
+        idle = sorted((w for w in alive if not w.busy), key=lambda w: w.last_used)
+        victims = []
+        while len(alive) >= self.max_workers and idle:
+            victim = idle.pop(0)
+            victims.append(victim)
+            alive.remove(victim)
+        if len(alive) >= self.max_workers:
+            raise RuntimeError(f"常驻 worker 已达上限 ({self.max_workers} 个) 且都在处理请求，"
+                               f"稍后再试，或者关掉常驻 worker 按普通任务提交")
+        for victim in victims:
+            victim.status = "stopping"
+        return victims
+
+    def ensure(self, ckpt, gpu, root_dir):
+        """拿到 (ckpt, gpu) 对应的 worker，没有就启动一个；池子满了且都在忙时抛 RuntimeError"""
+        key = self.worker_key(ckpt, gpu)
+        with self._lock:
+            worker = self._workers.get(key)
+            if worker and worker.status in ("starting", "ready") and worker.alive:
+                return worker
+            victims = self._evict_for_room()
+            worker = self._new_worker(ckpt, gpu, root_dir)
+            self._workers[key] = worker
+        # 停 worker 要走 socket (最多等 5 秒)，拉起新的要等 GPU 队列，都放在锁外面，不堵页面
+        for victim in victims:
+            self._stop(victim)
+        self._start_worker(worker)
+        return worker
+
+    def _wait_ready(self, worker):
+        deadline = time.time() + self.start_timeout
+        while time.time() < deadline:
+            if worker.status == "failed":
+                raise RuntimeError(worker.error)
+            if not worker.alive:
+                worker.status = "failed"
+                raise RuntimeError(f"worker 已退出，见日志 {worker.log_path}")
+            if os.path.exists(worker.sock_path):
+                try:
+                    call_worker(worker.sock_path, {"cmd": "ping"}, timeout=10)
+                    worker.status = "ready"
+                    return
+                except OSError:
+                    pass
+            time.sleep(1)
+        raise TimeoutError(f"worker 启动超过 {self.start_timeout:.0f}s")
+
+    def _stop(self, worker):
+        try:
+            call_worker(worker.sock_path, {"cmd": "shutdown"}, timeout=5)
+        except (OSError, ValueError):
+            if worker.log_path:
+                ProcessManager.stop_job(worker.log_path)
+        worker.status = "stopped"
+
+    def stop(self, key):
+        with self._lock:
+            worker = self._workers.get(key)
+        if worker and not worker.busy:
+            self._stop(worker)
+            return True
+        return False
+
+    def shutdown(self, timeout=5.0):
+        """停掉回收线程 (退出前 / 测试用)，worker 进程本身由 JobSupervisor.shutdown 收掉"""
+        self._closed.set()
+        self._reaper.join(timeout)
+
+    def _reap_loop(self):
+        while not self._closed.wait(self.REAP_SEC):
+            self._reap(time.time())
+
+    def _reap(self, now):
+        # 锁里只挑出要停的 worker，停 (socket 调用) 放在锁外，不堵 ensure / workers()
+        victims = []
+        with self._lock:
+            for w in list(self._workers.values()):
+                if w.status != "ready" or w.busy:
+                    continue
+                idle = now - w.last_used
+                if idle > self.idle_ttl:
+                    victims.append(w)
+                elif idle > self.yield_after and self._slot_wanted(w):
+                    print(f"♨️ 有任务在等 GPU，停掉空闲的 warm worker {w.key}")
+                    victims.append(w)
+            for w in victims:
+                w.status = "stopping"
+        for w in victims:
+            self._stop(w)
+
+    @staticmethod
+    def _slot_wanted(worker):
+        """GPU 队列里有没有任务在等这个 worker 占着的卡"""
+        gpu_queue = GPUJobQueue()
+        ticket = gpu_queue.find_by_log(worker.log_path) if worker.log_path else None
+        return bool(ticket and ticket.assigned and gpu_queue.has_waiting(ticket.assigned))
+
+    # ================= 请求 =================
+    def submit_request(self, ckpt, gpu, root_dir, script, argv, params_file=None, results_dir=None, task_name="warm_req"):
+        """非阻塞：请求在后台线程里排到对应 worker 上，返回这个请求的日志路径"""
+        worker = self.ensure(ckpt, gpu, root_dir)
+        log_path = ProcessManager.new_log_path(task_name)
+        # 先占住文件名，同一秒内连着提交的请求不会分到同一个日志
+        open(log_path, "a").close()
+        payload = {"cmd": "run", "script": script, "argv": list(argv), "params_file": params_file,
+                   "log_path": log_path, "results_dir": results_dir}
+        with self._lock:
+            self._seq += 1
+            req = WarmRequest(self._seq, worker.key, log_path, payload)
+            self._requests[log_path] = req
+            worker.busy += 1
+        JobRegistry().upsert(log_path, task_name=task_name, root_dir=root_dir, status="queued",
+                             command=f"[warm {os.path.basename(ckpt)}] {script} {' '.join(argv)}")
+        threading.Thread(target=self._run_request, args=(worker, req), daemon=True).start()
+        return log_path
+
+    def _run_request(self, worker, req):
+        registry = JobRegistry()
+        try:
+            if worker.status != "ready":
+                self._wait_ready(worker)
+            with worker._lock:
+                req.status = "running"
+                registry.upsert(req.log_path, status="running", pid=None,
+                                start_time=datetime.datetime.now().isoformat(timespec="seconds"))
+                reply = call_worker(worker.sock_path, req.payload)
+            req.outputs = reply.get("outputs") or []
+            req.seconds = reply.get("seconds")
+            req.error = reply.get("error")
+            req.status = "done" if reply.get("ok") else "failed"
+            worker.served += 1
+        except Exception as e:
+            req.status, req.error = "failed", str(e)
+            with open(req.log_path, "a", encoding="utf-8") as f:
+                f.write(f"\n❌ warm worker 请求失败: {e}\n")
+        finally:
+            worker.busy -= 1
+            worker.last_used = time.time()
+            registry.upsert(req.log_path, status="finished" if req.status == "done" else "failed",
+                            exit_code=0 if req.status == "done" else 1,
+                            end_time=datetime.datetime.now().isoformat(timespec="seconds"))
+
+    # ================= 展示 =================
+    def workers(self):
+        with self._lock:
+            return list(self._workers.values())
+
+    def get_request(self, log_path):
+        with self._lock:
+            return self._requests.get(log_path)
+
+    def requests(self, limit=20):
+        with self._lock:
+            return sorted(self._requests.values(), key=lambda r: r.created, reverse=True)[:limit]
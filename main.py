@@ -3,12 +3,14 @@ import streamlit as st
 from core.loader import load_config, load_active_modules
 from core.context import GlobalContext
 from core.live2d_helper import Live2DHelper 
+from core.job_registry import JobRegistry
 
 # 1. 初始化
 cfg = load_config()
 st.set_page_config(page_title=cfg['settings']['title'], layout="wide", page_icon=cfg['settings']['icon'])
 ctx = GlobalContext() # 初始化单例上下文
 l2d = Live2DHelper() # 🔥 初始化 helper
+JobRegistry() # 持久化任务表，服务启动时和真实进程 / 残留 screen 会话对账
 
 # 2. 动态加载
 modules_map = load_active_modules(cfg)
@@ -149,10 +149,18 @@
 # modules/gvhmr_module.py
 import streamlit as st
 import os
+import glob
 import time
 from datetime import datetime
 from core.base import BaseModule
 from core.process_mgr import ProcessManager
+from core.result_cache import files_since
+from core.commands import gvhmr_inference_cmd, gvhmr_convert_cmd
+from core.pipeline import Stage, PipelineItem, PipelineRun, PipelineManager
+from core.sharding import split_shards, link_shard, merge_outputs, has_result
+from core.gpu_queue import GPUJobQueue
+
+VIDEO_EXTS = (".mp4", ".mov", ".avi")
 
 class GVHMRRunner(BaseModule):
     def render_sidebar(self):
@@ -173,9 +181,10 @@ class GVHMRRunner(BaseModule):
         # 显卡和参数
         col1, col2 = st.columns(2)
         with col1:
-            self.gpu_id = st.text_input("GPU ID", "0")
+            self.gpu_id = self.render_gpu_selector("GPU ID")
         with col2:
             self.skip_visual_odometry = st.checkbox("跳过视觉里程计 (-s)", value=True)
+        self.force_rerun = self.render_cache_toggle()
 
     def render_main(self):
         # 定义基础目录
@@ -262,58 +271,69 @@ class GVHMRRunner(BaseModule):
         with col_out:
             st.text_input("输出路径 (自动)", value=output_rel_path, disabled=True)
 
-        # 构造推理命令
-        flag_s = "-s" if self.skip_visual_odometry else ""
-        
-        # 指定 GVHMR 环境 python (请根据实际情况修改路径)
-        python_exec = "/root/miniconda3/envs/gvhmr/bin/python"
-        
-        inference_cmd = (
-            f"CUDA_VISIBLE_DEVICES={self.gpu_id} "
-            f"PYTHONPATH=. "
-            f"{python_exec} tools/demo/demo_folder.py "
-            f"-f {input_rel_path} "
-            f"-d {output_rel_path} "
-            f"{flag_s}"
-        )
+        # 构造推理命令 (GVHMR 环境的 python 路径见 core/commands.py)
+        # CUDA_VISIBLE_DEVICES 由 GPU 队列在派发时自动填写
+        inference_cmd = gvhmr_inference_cmd(input_rel_path, output_rel_path, self.skip_visual_odometry)
         
         # 这里的 key=inference_cmd 确保命令变了按钮状态也会重置
         if st.button("🚀 开始批量推理 (GVHMR)", type="primary", key="btn_infer"):
             task_name = f"gvhmr_{selected_batch}"
-            success, msg = ProcessManager.run_with_log(
+            success, msg = ProcessManager.submit(
                 command=inference_cmd,
                 task_name=task_name,
-                root_dir=self.gvhmr_root
+                root_dir=self.gvhmr_root,
+                gpu=self.gpu_id,
+                # 同一批视频 (内容没变) 推理过且结果还在就不再重跑
+                cache={"inputs": [os.path.join(self.gvhmr_root, input_rel_path)],
+                       "outputs": [full_output_path], "force": self.force_rerun}
             )
             if success:
-                st.toast(f"GVHMR 推理已启动: {task_name}")
+                if not self.notify_cache_hit(msg):
+                    st.toast(f"GVHMR 推理已启动: {task_name}")
                 self.set_state("last_log_path", msg)
                 time.sleep(1)
                 st.rerun()
             else:
                 st.error(f"启动失败: {msg}")
 
+        # ==================== 2b. 分片推理 ====================
+        # 一个批次拆成 N 个分片 (软链接)，每个分片一个 worker，由 GPU 队列分到不同的卡上
+        with st.expander("⚡ 分片模式 (多卡 / 多 worker 并行)", expanded=False):
+            c1, c2 = st.columns(2)
+            num_shards = c1.number_input("分片数", 1, 64, max(1, len(GPUJobQueue().devices)),
+                                         key=self._get_key("num_shards"))
+            shard_parallel = c2.number_input("最多同时跑几个分片", 1, 64, int(num_shards),
+                                             key=self._get_key("shard_parallel"))
+            if st.button("🚀 分片推理", key=self._get_key("btn_shard")):
+                self._run_sharded(selected_batch, int(num_shards), int(shard_parallel))
+
+            run = PipelineManager().get(self.get_state("shard_run"))
+            if run and run.run_id.startswith(f"gvhmr_{selected_batch}_"):
+                self.live_region(self._render_shard_progress, run_every=self.LIVE_REFRESH_SEC)(
+                    run.run_id, full_output_path)
+
         st.divider()
 
         # ==================== 3. 批量转换为 NPY ====================
         st.subheader("3. 结果转换为 NPY")
         st.markdown(f"将 **`{output_rel_path}`** 下的所有结果转换为以视频命名的 `.npy` 文件。")
         
-        convert_cmd = (
-            f"{python_exec} tools/MY_convertTool/batch_convert_pt2npy.py "
-            f"--root_dir {full_output_path} "
-            f"--smpl_dir {self.smpl_path}"
-        )
+        convert_cmd = gvhmr_convert_cmd(full_output_path, self.smpl_path)
         
         if st.button("🔄 开始批量转换 (PT -> NPY)", key="btn_convert"):
             task_name = f"convert_{selected_batch}"
             success, msg = ProcessManager.run_with_log(
                 command=convert_cmd,
                 task_name=task_name,
-                root_dir=self.gvhmr_root
+                root_dir=self.gvhmr_root,
+                # 只哈希 .pt：转换出来的 .npy 也写在这个目录下，算进输入的话缓存永远对不上
+                cache={"inputs": sorted(glob.glob(os.path.join(full_output_path, "**", "*.pt"), recursive=True)),
+                       "outputs": lambda since: files_since(full_output_path, since, (".npy",)),
+                       "force": self.force_rerun}
             )
             if success:
-                st.toast(f"转换任务已启动: {task_name}")
+                if not self.notify_cache_hit(msg):
+                    st.toast(f"转换任务已启动: {task_name}")
                 self.set_state("last_log_path", msg)
                 time.sleep(1)
                 st.rerun()
@@ -321,4 +341,73 @@ class GVHMRRunner(BaseModule):
                 st.error(f"启动失败: {msg}")
 
         # 日志监控
-        self.render_log_monitor()
\ No newline at end of file
+        self.render_log_monitor()
+
+    def _run_sharded(self, batch, num_shards, parallel):
+        in_dir = os.path.join(self.gvhmr_root, "inputs/demo", batch)
+        videos = [os.path.join(in_dir, f) for f in sorted(os.listdir(in_dir)) if f.lower().endswith(VIDEO_EXTS)]
+        if not videos:
+            st.warning("⚠️ 这个批次里没有视频")
+            return
+
+        gvhmr_root, skip_vo = self.gvhmr_root, self.skip_visual_odometry
+        merged_dir = os.path.join(gvhmr_root, "outputs/demo", batch)
+        items = [PipelineItem(f"shard{i}", {"videos": files})
+                 for i, files in enumerate(split_shards(videos, num_shards))]
+
+        def shard_cmd(item):
+            in_rel = f"inputs/shards/{batch}/{item.key}"
+            out_rel = f"outputs/shards/{batch}/{item.key}"
+            # 重试时只链接还没出结果的视频
+            todo = [v for v in item.data["videos"]
+                    if not has_result(merged_dir, os.path.splitext(os.path.basename(v))[0])]
+            link_shard(os.path.join(gvhmr_root, in_rel), todo)
+            item.data["out_dir"] = os.path.join(gvhmr_root, out_rel)
+            return gvhmr_inference_cmd(in_rel, out_rel, skip_vo)
+
+        def shard_merge(item, started_at):
+            # 分片跑完：把每个视频的结果挪回 outputs/demo/<batch>
+            merge_outputs(item.data["out_dir"], merged_dir)
+            missing = [os.path.basename(v) for v in item.data["videos"]
+                       if not has_result(merged_dir, os.path.splitext(os.path.basename(v))[0])]
+            if missing:
+                raise FileNotFoundError(f"{len(missing)} 个视频没有结果: {', '.join(missing[:3])}")
+            return {}
+
+        stage = Stage("gvhmr", shard_cmd, gvhmr_root, concurrency=parallel, retries=1, collect=shard_merge)
+        run_id = f"gvhmr_{batch}_{datetime.now().strftime('%H%M%S')}"
+        record_dir = os.path.join(gvhmr_root, "outputs/shards", batch)
+        # 手动选了某张卡时所有分片都排在这张卡上，auto 时由队列挑最空闲的卡
+        PipelineManager().start(PipelineRun(run_id, [stage], items, gpu=self.gpu_id, record_dir=record_dir))
+        self.set_state("shard_run", run_id)
+        st.toast(f"已拆成 {len(items)} 个分片提交")
+
+    def _render_shard_progress(self, run_id, merged_dir):
+        """按视频汇报进度：已合并 / 分片里已出结果 / 排队 / 失败"""
+        run = PipelineManager().get(run_id)
+        rows = []
+        for item in run.items:
+            out_dir = item.data.get("out_dir")
+            for v in item.data["videos"]:
+                stem = os.path.splitext(os.path.basename(v))[0]
+                if has_result(merged_dir, stem):
+                    status = "✅ 完成"
+                elif out_dir and has_result(out_dir, stem):
+                    status = "📦 待合并"
+                elif item.status == "failed":
+                    status = "❌ 失败"
+                elif item.status == "running" and out_dir and os.path.isdir(os.path.join(out_dir, stem)):
+                    status = "⏳ 处理中"
+                elif item.status == "running":
+                    status = "🕒 分片运行中"
+                else:
+                    status = "排队"
+                rows.append({"视频": os.path.basename(v), "分片": item.key, "状态": status})
+        done = sum(1 for r in rows if r["状态"] == "✅ 完成")
+        st.caption(f"`{run_id}` · {run.status} · {done}/{len(rows)} 个视频完成")
+        st.progress(done / max(len(rows), 1))
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        logs = [p for item in run.items for p in item.logs.get("gvhmr", [])[-1:]]
+        if logs and st.button("👀 查看第一个分片日志", key=self._get_key("shard_log")):
+            self.set_state("last_log_path", logs[0])
+            st.rerun(scope="app")
@@ -0,0 +1,175 @@
+# modules/dashboard.py
+import streamlit as st
+import os
+import datetime
+from core.base import BaseModule
+from core.metrics import MetricsStore
+from core.process_mgr import ProcessManager
+from core.telemetry import ResourceSampler
+from core.job_registry import JobRegistry, ACTIVE_STATUSES
+from core.gpu_queue import GPUJobQueue
+
+
+class DashboardModule(BaseModule):
+    # 看板多久重新扫描一次日志 (秒)
+    DASHBOARD_REFRESH_SEC = 15
+
+    def __init__(self):
+        super().__init__()
+        self.name = "训练看板 (Dashboard)"
+        self.icon = "📈"
+        self.store = MetricsStore()
+
+    def render_sidebar(self):
+        st.subheader("📈 实验选择")
+        exps = self.store.experiments()
+        if not exps:
+            st.caption("还没有被跟踪的训练任务，去炼丹模式启动一个吧。")
+            self.selected = []
+            self.auto = False
+            return
+        self.selected = st.multiselect("实验", exps, default=exps[:1], key=self._get_key("exps"))
+        self.auto = st.toggle("⚡ 自动刷新", value=True, key=self._get_key("auto"))
+
+    def render_main(self):
+        run_every = self.DASHBOARD_REFRESH_SEC if self.selected and self.auto else None
+        if not self.selected:
+            st.info("👈 在侧边栏选择要对比的实验")
+        else:
+            self.live_region(self._render_board, run_every=run_every)(tuple(self.selected))
+        # 任务控制不依赖选了哪些实验，只有手动关掉自动刷新时才停
+        control_every = self.LIVE_REFRESH_SEC if self.auto or not self.selected else None
+        self.live_region(self._render_control, run_every=control_every)()
+        self.live_region(self._render_usage, run_every=run_every)()
+        self.live_region(self._render_jobs, run_every=run_every)()
+
+    def _render_jobs(self):
+        """持久化任务表：服务重启之后也知道哪些任务还在跑"""
+        jobs = JobRegistry().list(limit=500)
+        if not jobs:
+            return
+        st.divider()
+        st.markdown("#### 🗂️ 任务表")
+        c1, c2 = st.columns(2)
+        modules = sorted({j["module"] or "-" for j in jobs})
+        statuses = sorted({j["status"] or "-" for j in jobs})
+        mod_filter = c1.multiselect("模块", modules, key=self._get_key("job_modules"))
+        status_filter = c2.multiselect("状态", statuses, key=self._get_key("job_statuses"))
+        rows = [
+            {"任务": j["task_name"], "模块": j["module"] or "-", "状态": j["status"], "PID": j["pid"],
+             "退出码": j["exit_code"], "开始": j["start_time"], "结束": j["end_time"],
+             "日志": os.path.basename(j["log_path"])}
+            for j in jobs
+            if (not mod_filter or (j["module"] or "-") in mod_filter)
+            and (not status_filter or (j["status"] or "-") in status_filter)
+        ]
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+
+    def _render_control(self):
+        """任务控制：GPU 队列里的优先级 / 抢占情况，取消任意一个排队中或运行中的任务"""
+        active = JobRegistry().list(statuses=ACTIVE_STATUSES, limit=500)
+        snap = GPUJobQueue().snapshot()
+        if not active and not snap["jobs"]:
+            return
+        st.divider()
+        st.markdown("#### 🚦 任务控制")
+        if snap["jobs"]:
+            pos = {log: i + 1 for i, (_, log) in enumerate(snap["pending"])}
+            st.dataframe([
+                {"任务": j["task_name"], "优先级": j["priority"], "可抢占": "✅" if j["preemptible"] else "",
+                 "状态": f"排队 #{pos[j['log_path']]}" if j["log_path"] in pos else j["status"],
+                 "GPU": j["devices"] or "-", "提交": j["submit_time"], "说明": j["note"]}
+                for j in snap["jobs"]
+            ], use_container_width=True, hide_index=True)
+        if not active:
+            return
+        labels = {j["log_path"]: f"{j['task_name']} · {j['status']} · {os.path.basename(j['log_path'])}"
+                  for j in active}
+        c1, c2 = st.columns([4, 1])
+        target = c1.selectbox("任务", list(labels), format_func=labels.get, key=self._get_key("cancel_pick"),
+                              label_visibility="collapsed")
+        if c2.button("⏹️ 取消", key=self._get_key("cancel_btn"), use_container_width=True,
+                     help="排队中的直接撤掉；运行中的结束整棵进程树 (SIGTERM，超时后 SIGKILL) 并释放 GPU 卡槽"):
+            if ProcessManager.stop_job(target):
+                st.toast(f"⏹️ 已取消 {labels[target]}")
+            else:
+                st.warning("取消失败：任务可能已经结束，或者不归当前服务管理")
+
+    def _render_usage(self):
+        """所有托管任务的资源占用：找出被 dataloader 卡住 / 特别吃内存的配置"""
+        sampler = ResourceSampler()
+        rows = []
+        for job in ProcessManager.list_jobs():
+            summ = sampler.summary(job.job_id)
+            if not summ:
+                continue
+            rows.append({
+                "任务": job.task_name,
+                "状态": job.status,
+                "CPU% 均值": round(summ["cpu_pct_avg"], 1),
+                "CPU% 峰值": round(summ["cpu_pct_max"], 1),
+                "RSS 峰值 (MB)": round(summ["rss_mb_max"]),
+                "显存峰值 (MB)": round(summ["gpu_mem_mb_max"]),
+                "读 (MB)": round(summ["read_mb"], 1),
+                "写 (MB)": round(summ["write_mb"], 1),
+                "线程": summ["threads_max"],
+            })
+        if not rows:
+            return
+        st.divider()
+        st.markdown("#### 🖥️ 任务资源占用")
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+
+    @staticmethod
+    def _fmt_eta(sec):
+        if sec is None:
+            return "-"
+        return str(datetime.timedelta(seconds=int(sec)))
+
+    def _is_running(self, exp):
+        for src in self.store.sources(exp):
+            job = ProcessManager.get_job(src[0])
+            if job and job.is_alive:
+                return True
+        return False
+
+    def _render_board(self, exps):
+        # 增量采集：只解析上次游标之后新写入的日志
+        for exp in exps:
+            self.store.scan(exp)
+
+        # === 1. 进度卡片 ===
+        for exp in exps:
+            prog = self.store.progress(exp)
+            st.markdown(f"#### 🧪 `{exp}`")
+            if not prog:
+                st.caption("⏳ 暂时还没解析到进度信息")
+                continue
+            running = self._is_running(exp)
+            epoch_str = f"{prog['epoch']}" + (f" / {prog['max_epochs']}" if prog["max_epochs"] else "")
+            step_str = f"{prog['step']} / {prog['total']}" if prog["total"] else "-"
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Epoch", epoch_str)
+            c2.metric("Step", step_str)
+            c3.metric("吞吐 (it/s)", f"{prog['it_per_s']:.2f}" if prog["it_per_s"] else "-")
+            c4.metric("ETA", self._fmt_eta(prog["eta_sec"]) if running else "已结束")
+
+        # === 2. 指标曲线 ===
+        names = sorted({n for exp in exps for n in self.store.metric_names(exp)})
+        if not names:
+            return
+        st.divider()
+        default = [n for n in names if "loss" in n.lower()][:2] or names[:1]
+        chosen = st.multiselect("指标", names, default=default, key=self._get_key("metrics"))
+        for name in chosen:
+            st.markdown(f"**{name}**")
+            # 横轴用采样序号，不同实验的 step 数对不齐时也能一起看
+            data = {}
+            for exp in exps:
+                data[exp] = [row[4] for row in self.store.series(exp, name)]
+            longest = max((len(v) for v in data.values()), default=0)
+            if not longest:
+                st.caption("暂无数据")
+                continue
+            chart = {exp: vals + [None] * (longest - len(vals)) for exp, vals in data.items()}
+            st.line_chart(chart)
@@ -2,21 +2,44 @@
 import streamlit as st
 import os
 import glob
-import re
+import json
 import time
+import pandas as pd
+from datetime import datetime
 from core.base import BaseModule
-from core.utils import load_yaml, save_yaml
+from core.utils import load_yaml
 from core.process_mgr import ProcessManager
+from core.commands import JOB_SHIM
+from core.job_params import job_file, job_yaml, write_params, patched_script
+from core.file_watch import ReadyFile
+from core.pipeline import Stage, PipelineItem, PipelineRun, PipelineManager
+from core.halving import checkpoint_epoch
+from core.metrics import MetricsStore, EvalScraper
+
+def every_nth(ckpt_names, n):
+    """按 epoch 从小到大每隔 n 个取一个，最新的那个总是带上"""
+    ordered = sorted(ckpt_names, key=lambda x: (checkpoint_epoch(x), x))
+    picked = ordered[::n]
+    if ordered and ordered[-1] not in picked:
+        picked.append(ordered[-1])
+    return picked
+
 
 class EvaluationModule(BaseModule):
     def __init__(self):
         super().__init__()
         self.name = "评估模式 (Eval)"
         self.icon = "📊"
+        # Stage 1 产出的 PKL；连续这么多秒大小不变 (且没有进程开着写) 才算写完
+        self.PKL_PATTERN = "crafmd*.pkl"
+        self.PKL_SETTLE_SEC = 10
+        # 评估结果表多久重新解析一次日志 (秒)
+        self.TABLE_REFRESH_SEC = 15
 
     def render_sidebar(self):
         st.subheader("📊 评估资源配置")
         st.info("💡 评估分为两阶段：先生成 Motion (Stage 1)，再计算一致性 (Stage 2)。")
+        self.gpu = self.render_gpu_selector()
 
         # [NEW] 添加自定义 Checkbox
         self.use_custom_yaml = st.checkbox("使用自定义 YAML 配置", key="use_custom_yaml_cb")
@@ -45,9 +68,10 @@ class EvaluationModule(BaseModule):
             if os.path.exists(ckpt_dir):
                 ckpts = glob.glob(os.path.join(ckpt_dir, "*.ckpt"))
                 ckpt_names = [os.path.basename(c) for c in ckpts]
-                # 简单按长度排序（原版逻辑），你也可以改回正则排序
-                ckpt_names = sorted(ckpt_names, key=lambda x: len(x), reverse=True) 
+                # 按文件名里的 epoch=N 倒序 (最新的在最上面)，没有 epoch 的 (last.ckpt 等) 排最后
+                ckpt_names = sorted(ckpt_names, key=lambda x: (checkpoint_epoch(x), x), reverse=True)
             
+            self.ckpt_names = ckpt_names
             self.selected_ckpt_name = st.selectbox("选择 Checkpoint", ckpt_names, key="eval_ckpt_sb")
             self.selected_ckpt_path = os.path.join(ckpt_dir, self.selected_ckpt_name) if self.selected_ckpt_name else None
         else:
@@ -116,7 +140,7 @@ class EvaluationModule(BaseModule):
         pkl_files = []
         if target_res_dir:
             full_res_path = os.path.join(results_root, target_res_dir)
-            pkl_files = glob.glob(os.path.join(full_res_path, "crafmd*.pkl"))
+            pkl_files = glob.glob(os.path.join(full_res_path, self.PKL_PATTERN))
             pkl_files = [os.path.basename(p) for p in pkl_files]
             
         with c2_2:
@@ -132,68 +156,47 @@ class EvaluationModule(BaseModule):
         if st.button("🚀 运行 Stage 2 (SCA)", disabled=(not full_pkl_path)):
             self._run_stage_2(full_pkl_path)
 
+        # ================= 自动串联 =================
+        if not self.use_custom_yaml:
+            st.divider()
+            self._render_chain_panel()
+
         # ================= 日志监控 =================
         self.render_log_monitor()
 
     # ================= 核心逻辑：Stage 1 =================
     def _run_stage_1(self):
-        # 定义临时配置文件路径
-        temp_eval_yaml_path = os.path.join(self.ctx.config_dir, f"eval_temp_{self.selected_exp_name}.yaml")
-
+        # 临时配置文件写进这个任务私有的参数目录 (core/job_params.py)，同时跑多个评估也不会互相覆盖
         # [NEW] 分支逻辑
         if self.use_custom_yaml:
             # A. 自定义模式：直接将编辑框的内容写入临时文件，不修改任何字段
             try:
-                content = st.session_state.custom_yaml_content
-                with open(temp_eval_yaml_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
+                temp_eval_yaml_path = job_file("eval", f"eval_temp_{self.selected_exp_name}.yaml",
+                                               st.session_state.custom_yaml_content)
             except Exception as e:
                 st.error(f"❌ 保存自定义 YAML 失败: {e}")
                 return
         else:
             # B. 原有逻辑：加载实验配置 -> 覆盖 Checkpoint -> 保存
-            launcher_yaml = os.path.join(self.exp_path, "launcher_config.yaml")
-            if not os.path.exists(launcher_yaml):
-                yamls = glob.glob(os.path.join(self.exp_path, "*.yaml"))
-                launcher_yaml = yamls[0] if yamls else None
-            
-            if not launcher_yaml:
+            temp_eval_yaml_path = self._eval_yaml(self.exp_path, self.selected_exp_name, self.selected_ckpt_path)
+            if not temp_eval_yaml_path:
                 st.error("❌ 找不到 yaml 配置文件")
                 return
-
-            eval_cfg = load_yaml(launcher_yaml)
-            if 'TEST' not in eval_cfg: eval_cfg['TEST'] = {}
-            eval_cfg['TEST']['CHECKPOINTS'] = self.selected_ckpt_path
-            
-            save_yaml(eval_cfg, temp_eval_yaml_path)
         
-        # 2. 注入 run_evaluation.sh
+        # 2. 生成 run_evaluation.sh 的私有副本 (共享脚本本身不改)
         target_exp_name = f"{self.selected_exp_name}_Eval"
-        bash_script_path = os.path.join(self.ctx.root_dir, "run_evaluation.sh")
-        
         try:
-            with open(bash_script_path, 'r', encoding='utf-8') as f:
-                bash_content = f.read()
-            
-            # 正则替换 CONFIG_MLD="..."
-            bash_content = re.sub(r'CONFIG_MLD=".*?"', f'CONFIG_MLD="{temp_eval_yaml_path}"', bash_content)
-            # 正则替换 EXP_NAME="..."
-            bash_content = re.sub(r'EXP_NAME=".*?"', f'EXP_NAME="{target_exp_name}"', bash_content)
-            
-            with open(bash_script_path, 'w', encoding='utf-8') as f:
-                f.write(bash_content)
-            
-            st.toast(f"✅ Bash注入成功: Target={target_exp_name}")
+            cmd = self._stage1_cmd(temp_eval_yaml_path, target_exp_name)
+            st.toast(f"✅ Bash参数已写入任务副本: Target={target_exp_name}")
         except Exception as e:
-            st.error(f"❌ 修改 Bash 脚本失败: {e}")
+            st.error(f"❌ 生成 Bash 脚本副本失败: {e}")
             return
 
-        # 3. 运行
+        # 3. 运行 (工作目录仍是 MCM-LDM 根目录，脚本里的相对路径照常可用)
         # 结果将生成在 stage1_eval.log
-        cmd = f"bash run_evaluation.sh"
         session_name = "stage1_eval"
         
-        success, log_path = ProcessManager.run_with_log(cmd, session_name, self.ctx.root_dir)
+        success, log_path = ProcessManager.submit(cmd, session_name, self.ctx.root_dir, gpu=self.gpu)
         
         if success:
             self.set_state("last_log_path", log_path)
@@ -203,58 +206,225 @@ class EvaluationModule(BaseModule):
 
     # ================= 核心逻辑：Stage 2 =================
     def _run_stage_2(self, pkl_path):
-        # 1. 注入 evaluate_sca.py (Python Injection)
-        sca_script_path = os.path.join(self.ctx.root_dir, "evaluate_sca.py")
-        try:
-            with open(sca_script_path, 'r', encoding='utf-8') as f:
-                py_content = f.read()
-            
-            # 替换 input_path = "..."
-            new_line = f'input_path = "{pkl_path}"'
-            py_content = re.sub(r'input_path\s*=\s*".*?"', new_line, py_content)
-            
-            with open(sca_script_path, 'w', encoding='utf-8') as f:
-                f.write(py_content)
-            st.toast(f"✅ Python注入成功: Input={os.path.basename(pkl_path)}")
-        except Exception as e:
-            st.error(f"❌ 修改 Python 脚本失败: {e}")
-            return
-
-        # 2. 注入 run_evaluation_sca.sh (Bash Injection)
         # 需要找到 yaml 配置，这里我们复用 Stage 1 选中的实验的配置
         # 因为 SCA 评估也需要加载模型结构配置
-        launcher_yaml = os.path.join(self.exp_path, "launcher_config.yaml")
-        if not os.path.exists(launcher_yaml):
-            yamls = glob.glob(os.path.join(self.exp_path, "*.yaml"))
-            launcher_yaml = yamls[0] if yamls else ""
-            
+        launcher_yaml = self._find_launcher_yaml(self.exp_path)
         if not launcher_yaml:
             st.error("❌ 找不到对应的 yaml 配置文件，无法运行 Stage 2")
             return
 
-        sca_bash_path = os.path.join(self.ctx.root_dir, "run_evaluation_sca.sh")
         try:
-            with open(sca_bash_path, 'r', encoding='utf-8') as f:
-                bash_content = f.read()
-            
-            # 替换 CONFIG_FILE="..."
-            bash_content = re.sub(r'CONFIG_FILE=".*?"', f'CONFIG_FILE="{launcher_yaml}"', bash_content)
-            
-            with open(sca_bash_path, 'w', encoding='utf-8') as f:
-                f.write(bash_content)
-            st.toast(f"✅ Bash注入成功: Config={os.path.basename(launcher_yaml)}")
+            cmd = self._stage2_cmd(pkl_path, launcher_yaml)
+            st.toast(f"✅ 参数已写入任务副本: Config={os.path.basename(launcher_yaml)}, Input={os.path.basename(pkl_path)}")
         except Exception as e:
-            st.error(f"❌ 修改 Bash 脚本失败: {e}")
+            st.error(f"❌ 生成 Bash 脚本副本失败: {e}")
             return
 
         # 3. 运行
-        cmd = f"bash run_evaluation_sca.sh"
         session_name = "stage2_sca"
         
-        success, log_path = ProcessManager.run_with_log(cmd, session_name, self.ctx.root_dir)
+        success, log_path = ProcessManager.submit(cmd, session_name, self.ctx.root_dir, gpu=self.gpu)
         
         if success:
             self.set_state("last_log_path", log_path)
             st.success("🚀 Stage 2 (SCA) 任务已启动！请查看下方日志。")
             time.sleep(0.5)
-            st.rerun()
\ No newline at end of file
+            st.rerun()
+
+    # ================= 命令构造 (手动运行和自动串联共用，不碰 streamlit) =================
+    @staticmethod
+    def _find_launcher_yaml(exp_path):
+        launcher_yaml = os.path.join(exp_path, "launcher_config.yaml")
+        if os.path.exists(launcher_yaml):
+            return launcher_yaml
+        yamls = glob.glob(os.path.join(exp_path, "*.yaml"))
+        return yamls[0] if yamls else None
+
+    def _eval_yaml(self, exp_path, exp_name, ckpt_path):
+        """实验配置 -> 覆盖 Checkpoint -> 写成任务私有的 yaml；找不到配置时返回 None"""
+        launcher_yaml = self._find_launcher_yaml(exp_path)
+        if not launcher_yaml:
+            return None
+        eval_cfg = load_yaml(launcher_yaml)
+        if 'TEST' not in eval_cfg: eval_cfg['TEST'] = {}
+        eval_cfg['TEST']['CHECKPOINTS'] = ckpt_path
+        return job_yaml("eval", f"eval_temp_{exp_name}.yaml", eval_cfg)
+
+    def _stage1_cmd(self, eval_yaml_path, target_exp_name):
+        """run_evaluation.sh 的私有副本：结果写到 results/mld/<target_exp_name>/"""
+        job_script = patched_script(os.path.join(self.ctx.root_dir, "run_evaluation.sh"), "eval", [
+            (r'CONFIG_MLD=".*?"', f'CONFIG_MLD="{eval_yaml_path}"'),
+            (r'EXP_NAME=".*?"', f'EXP_NAME="{target_exp_name}"'),
+        ])
+        return f"bash {job_script}"
+
+    def _stage2_cmd(self, pkl_path, launcher_yaml):
+        """evaluate_sca.py 的 input_path 写进任务私有的 params.json，运行时由 job_shim 注入"""
+        params_file = write_params("sca", assign={"input_path": pkl_path})
+        job_script = patched_script(os.path.join(self.ctx.root_dir, "run_evaluation_sca.sh"), "sca", [
+            (r'CONFIG_FILE=".*?"', f'CONFIG_FILE="{launcher_yaml}"'),
+            # python evaluate_sca.py ... -> python job_shim.py --params xxx evaluate_sca.py ...
+            (r'(?<!\S)(?=\S*evaluate_sca\.py)', f"{JOB_SHIM} --params {params_file} "),
+        ])
+        return f"bash {job_script}"
+
+    # ================= 自动串联：Stage 1 出 PKL 就接 Stage 2 =================
+    def _render_chain_panel(self):
+        with st.expander("🔗 批量评估 (多个 Checkpoint 排队，PKL 写完立刻接 Stage 2)"):
+            st.caption("每个 checkpoint 的结果写到 `results/mld/<实验>_Eval_<ckpt>/`；"
+                       "Stage 1 的 PKL 一写完就提交它的 Stage 2，同时下一个 checkpoint 的 Stage 1 已经在跑了。")
+            pick = st.radio("选哪些 Checkpoint", ["手动选择", "全部", "每隔 N 个"], horizontal=True,
+                            key=self._get_key("chain_pick"))
+            if pick == "手动选择":
+                chosen = st.multiselect("要评估的 Checkpoint (按选择顺序排队)", self.ckpt_names,
+                                        default=self.ckpt_names[:1], key=self._get_key("chain_ckpts"))
+            elif pick == "全部":
+                chosen = list(self.ckpt_names)
+            else:
+                every = st.number_input("N", 1, 100, 5, key=self._get_key("chain_every"))
+                chosen = every_nth(self.ckpt_names, int(every))
+                st.caption(f"将评估: {', '.join(chosen)}")
+            c1, c2, c3, c4 = st.columns(4)
+            s1_par = c1.number_input("Stage 1 并发", 1, 16, 1, key=self._get_key("chain_s1"))
+            s2_par = c2.number_input("Stage 2 并发", 1, 16, 1, key=self._get_key("chain_s2"))
+            settle = c3.number_input("PKL 静止多少秒算写完", 1, 600, self.PKL_SETTLE_SEC, key=self._get_key("chain_settle"))
+            with_sca = c4.checkbox("同时跑 Stage 2 (SCA)", value=True, key=self._get_key("chain_sca"))
+            if st.button(f"🚀 排队评估 {len(chosen)} 个 Checkpoint", disabled=not chosen, key=self._get_key("chain_run")):
+                self._start_chain(chosen, int(s1_par), int(s2_par), float(settle), with_sca)
+
+            run = PipelineManager().get(self.get_state("chain_run"))
+            if run:
+                self.live_region(self._render_chain_progress, run_every=self.LIVE_REFRESH_SEC)(run.run_id)
+
+        # 结果表：所有批量评估记录里解析出来的指标，每个 checkpoint 一行
+        self.live_region(self._render_eval_table, run_every=self.TABLE_REFRESH_SEC)(
+            self.selected_exp_name, self.exp_path)
+
+    def _start_chain(self, ckpt_names, s1_par, s2_par, settle, with_sca=True):
+        exp_name, exp_path = self.selected_exp_name, self.exp_path
+        launcher_yaml = self._find_launcher_yaml(exp_path)
+        if not launcher_yaml:
+            st.error("❌ 找不到 yaml 配置文件")
+            return
+        results_root = os.path.join(self.ctx.root_dir, "results", "mld")
+        ckpt_dir = os.path.join(exp_path, "checkpoints")
+        items = []
+        for name in ckpt_names:
+            stem = os.path.splitext(name)[0]
+            items.append(PipelineItem(stem, {"ckpt": os.path.join(ckpt_dir, name),
+                                             "result_dir": os.path.join(results_root, f"{exp_name}_Eval_{stem}")}))
+        watchers = {}   # item.key -> ReadyFile
+
+        def stage1_cmd(item):
+            watchers.pop(item.key, None)
+            eval_yaml = self._eval_yaml(exp_path, exp_name, item.data["ckpt"])
+            return self._stage1_cmd(eval_yaml, os.path.basename(item.data["result_dir"]))
+
+        def pkl_ready(item, started_at):
+            # Stage 1 还在跑 (算指标 / 收尾) 但 PKL 已经写完：直接交棒
+            watcher = watchers.setdefault(item.key, ReadyFile(item.data["result_dir"], self.PKL_PATTERN,
+                                                              since=started_at, settle=settle))
+            job = ProcessManager.get_job(item.log_path)
+            path = watcher.poll(job.pid if job else None)
+            return {"pkl": path} if path else None
+
+        def pkl_collect(item, started_at):
+            # Stage 1 退出时还没交棒：这时 PKL 必须已经在了
+            pkls = [f for f in glob.glob(os.path.join(item.data["result_dir"], self.PKL_PATTERN))
+                    if os.path.getmtime(f) >= started_at]
+            if not pkls:
+                raise FileNotFoundError("Stage 1 结束了但没有新的 PKL")
+            return {"pkl": max(pkls, key=os.path.getmtime)}
+
+        stages = [Stage("stage1", stage1_cmd, self.ctx.root_dir, concurrency=s1_par, collect=pkl_collect,
+                        ready=pkl_ready if with_sca else None)]
+        if with_sca:
+            stages.append(Stage("stage2", lambda item: self._stage2_cmd(item.data["pkl"], launcher_yaml),
+                                self.ctx.root_dir, concurrency=s2_par))
+        run_id = f"eval_{exp_name}_{datetime.now().strftime('%H%M%S')}"
+        run = PipelineRun(run_id, stages, items, gpu=self.gpu,
+                          record_dir=os.path.join(exp_path, "eval_chains", run_id))
+        try:
+            PipelineManager().start(run)
+        except RuntimeError as e:
+            st.error(str(e))
+            return
+        self.set_state("chain_run", run_id)
+        st.toast(f"🔗 已排队 {len(items)} 个 Checkpoint")
+
+    def _render_chain_progress(self, run_id):
+        run = PipelineManager().get(run_id)
+        done = sum(1 for i in run.items if i.status == "done")
+        st.caption(f"`{run_id}` · {run.status} · {done}/{len(run.items)} 个 Checkpoint 评估完成")
+        st.dataframe(run.stage_summary(), use_container_width=True, hide_index=True)
+        st.dataframe(run.to_rows(), use_container_width=True, hide_index=True)
+        c1, c2 = st.columns(2)
+        with c1:
+            if run.status == "running" and st.button("🛑 取消串联", key=self._get_key("chain_cancel")):
+                run.cancel()
+                st.rerun(scope="app")
+        with c2:
+            logs = [p for i in run.items for paths in i.logs.values() for p in paths]
+            if logs and st.button("👀 查看最近一个任务的日志", key=self._get_key("chain_log")):
+                self.set_state("last_log_path", logs[-1])
+                st.rerun(scope="app")
+
+    # ================= 评估结果表 =================
+    def _eval_records(self, exp_path):
+        """所有批量评估记录里每个 checkpoint 最近一次的结果 {ckpt: item 记录}"""
+        latest = {}
+        records = glob.glob(os.path.join(exp_path, "eval_chains", "*", "pipeline.json"))
+        for path in sorted(records, key=os.path.getmtime):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for item in record.get("items", []):
+                latest[item["key"]] = item
+        return latest
+
+    def _render_eval_table(self, exp_name, exp_path):
+        records = self._eval_records(exp_path)
+        if not records:
+            return
+        st.markdown("#### 🏁 Checkpoint 评估结果")
+        store = MetricsStore()
+        rows = []
+        for ckpt, item in records.items():
+            # 指标按 <实验>_Eval_<ckpt> 存进时序库 (看板里也能看到)，日志只增量解析新写的部分
+            key = f"{exp_name}_Eval_{ckpt}"
+            for paths in item.get("logs", {}).values():
+                for log_path in paths:
+                    store.track(log_path, key, job_type="eval")
+            store.scan(key)
+            values = store.latest_values(key)
+            row = {"checkpoint": ckpt, "epoch": checkpoint_epoch(ckpt), "状态": item.get("status", "")}
+            row.update({name: values.get(name) for name in EvalScraper.DIRECTIONS})
+            rows.append(row)
+        rows.sort(key=lambda r: r["epoch"])
+
+        metrics = [m for m in EvalScraper.DIRECTIONS if any(r[m] is not None for r in rows)]
+        if not metrics:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+            st.caption("日志里还没有解析到指标")
+            return
+
+        primary = st.selectbox("按哪个指标挑最佳", metrics, key=self._get_key("best_metric"))
+        direction = EvalScraper.DIRECTIONS[primary]
+        scored = [r for r in rows if r[primary] is not None]
+        best = (min if direction == "min" else max)(scored, key=lambda r: r[primary])
+        st.success(f"🏆 最佳 Checkpoint: **{best['checkpoint']}** ({primary} = {best[primary]:.4f}，"
+                   f"{'越小越好' if direction == 'min' else '越大越好'})")
+
+        df = pd.DataFrame(rows)
+        styler = df.style.format({m: "{:.4f}" for m in metrics}, na_rep="-")
+        # 每一列的最优值标绿，最佳 checkpoint 整行加粗
+        for m in metrics:
+            if EvalScraper.DIRECTIONS[m] == "min":
+                styler = styler.highlight_min(subset=[m], color="#c8e6c9")
+            else:
+                styler = styler.highlight_max(subset=[m], color="#c8e6c9")
+        styler = styler.apply(lambda r: ["font-weight: bold" if r["checkpoint"] == best["checkpoint"] else ""] * len(r),
+                              axis=1)
+        st.dataframe(styler, use_container_width=True, hide_index=True)
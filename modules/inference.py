@@ -3,16 +3,29 @@ import streamlit as st
 import os
 import glob
 import re
+import json
 import time
+import shutil
+import hashlib
 from core.base import BaseModule
-from core.utils import load_yaml, save_yaml
+from core.utils import load_yaml
 from core.process_mgr import ProcessManager
+from core.commands import (build_inference_cfg, mld_inference_cmd, mld_inference_args, mld_batch_cmd,
+                           mld_results_dir, MLD_DEMO_SCRIPT)
+from core.result_cache import dirs_since
+from core.job_params import job_file, job_yaml, write_params
+from core.sweep import expand_trials, trial_name, parse_values
+from core.worker_pool import WarmWorkerPool
 
 class InferenceModule(BaseModule):
     def __init__(self):
         super().__init__()
         self.name = "推理模式 (Inference)"
         self.icon = "🔮"
+        # FiLM scalar 所在的源码 (相对 MCM-LDM 根目录)，由 job_shim 按任务注入
+        self.MLD_PY_REL = "mld/models/modeltype/mld.py"
+        # sweep 矩阵放在 results/mld/<exp>/_matrix/<ckpt>/ 下 (下划线开头，渲染页不会当成序列列出来)
+        self.MATRIX_DIR = "_matrix"
         
         # 场景预设
         self.SCENE_DESCRIPTIONS = {
@@ -88,7 +101,13 @@ class InferenceModule(BaseModule):
         self.scene_scalar = st.number_input(
             "🔥 FiLM Scalar (注入源码)", 
             value=3.0, step=0.1, 
-            help="此数值将直接注入到 mld.py 中，控制 FiLM 融合强度"
+            help="按任务注入 mld.py 的 DEFAULT_SCALAR_VAL (不改共享源码)，控制 FiLM 融合强度"
+        )
+        self.gpu = self.render_gpu_selector()
+        self.force_rerun = self.render_cache_toggle()
+        self.use_warm = st.toggle(
+            "♨️ 常驻推理 worker", value=False, key=self._get_key("use_warm"),
+            help="模型常驻显存，换 prompt / scalar 再跑不用重新加载权重 (第一次要等 worker 启动)"
         )
 
     def render_main(self):
@@ -137,49 +156,29 @@ class InferenceModule(BaseModule):
         if run_btn:
             self.run_inference()
 
+        # === Sweep 矩阵 ===
+        with st.expander("🧮 Sweep 矩阵 (场景 × Scalar × 数据，一个进程跑完)"):
+            self._render_sweep_matrix()
+
+        # === 常驻 worker 状态 ===
+        if WarmWorkerPool().workers():
+            with st.expander("♨️ 常驻推理 worker", expanded=self.use_warm):
+                self.live_region(self._render_warm_status, run_every=self.LIVE_REFRESH_SEC)()
+
         # === 日志组件 ===
         self.render_log_monitor()
 
     def run_inference(self):
-        # 1. 注入 Hack 代码 (FiLM Scalar)
-        # 这里对应你说的 “执行的时候会把这个film也改了”
-        if self._inject_hack_code(self.scene_scalar):
-            # 2. 准备配置与命令
-            self._execute_process()
-
-    def _inject_hack_code(self, scalar_value):
-        """修改 mld.py 源码，注入 scene_scalar"""
-        mld_py_path = os.path.join(self.ctx.root_dir, "mld/models/modeltype/mld.py")
-        
+        # FiLM Scalar 不再直接改 mld.py 源码：按任务写一份 params.json，
+        # 由 job_shim 在 import mld.py 时替换 DEFAULT_SCALAR_VAL，多个推理可以同时跑
+        mld_py_path = os.path.join(self.ctx.root_dir, self.MLD_PY_REL)
         if not os.path.exists(mld_py_path):
             st.error(f"❌ 找不到源码文件: {mld_py_path}")
-            return False
-            
-        try:
-            with open(mld_py_path, 'r', encoding='utf-8') as f:
-                code_content = f.read()
-            
-            # 正则替换 DEFAULT_SCALAR_VAL = ...
-            new_code = re.sub(
-                r"DEFAULT_SCALAR_VAL\s*=\s*[\d\.]+", 
-                f"DEFAULT_SCALAR_VAL = {scalar_value}", 
-                code_content
-            )
-            
-            with open(mld_py_path, 'w', encoding='utf-8') as f:
-                f.write(new_code)
-            
-            # 显式告诉用户改了哪里
-            st.toast(f"✅ 已修改 FiLM 参数: mld.py -> {scalar_value}", icon="💉")
-            st.warning(f"⚠️ 注意: mld.py 源码中的 DEFAULT_SCALAR_VAL 已被修改为 {scalar_value}")
-            return True
-
-        except Exception as e:
-            st.error(f"❌ 源码注入失败: {e}")
-            return False
+            return
+        self._execute_process()
 
-    def _execute_process(self):
-        self.set_live2d_state("running")
+    def _prepare_job(self):
+        """推理配置 + 参数快照 + 命令参数，单独起进程和常驻 worker 共用；找不到配置时返回 None"""
         # 寻找 yaml
         launcher_yaml = os.path.join(self.exp_path, "launcher_config.yaml")
         if not os.path.exists(launcher_yaml):
@@ -188,57 +187,249 @@ class InferenceModule(BaseModule):
         
         if not launcher_yaml:
             st.error("❌ 找不到 yaml 配置文件")
-            return
+            return None
 
-        # 修改 yaml
-        inf_config = load_yaml(launcher_yaml)
-        if 'TEST' not in inf_config: inf_config['TEST'] = {}
-        inf_config['TEST']['CHECKPOINTS'] = self.selected_ckpt_path
-        inf_config['TEST']['MULTI_MODAL_TYPE'] = 'text'
-        inf_config['TEST']['MULTI_MODAL_TEXT_PROMPT'] = self.prompt_text
-        
-        temp_inf_yaml = os.path.join(self.exp_path, f"inference_{self.scene_short_name}.yaml")
-        save_yaml(inf_config, temp_inf_yaml)
+        # 修改 yaml (写进这个任务私有的参数目录，不和别的推理抢同一个文件)
+        inf_config = build_inference_cfg(load_yaml(launcher_yaml), self.selected_ckpt_path, self.prompt_text)
+        temp_inf_yaml = job_yaml("inf", f"inference_{self.scene_short_name}.yaml", inf_config)
+        params_file = write_params("inf", patch={self.MLD_PY_REL: {"DEFAULT_SCALAR_VAL": float(self.scene_scalar)}})
+        return {
+            "cfg": temp_inf_yaml,
+            "params_file": params_file,
+            "content_dir": os.path.join("demo", self.content_dir_name),
+            "style_dir": os.path.join("demo", self.style_dir_name),
+            "session_name": f"inf_{self.scene_short_name}"[:20],
+            "result_expected": os.path.join(self.ctx.root_dir, "results", "mld", self.selected_exp),
+        }
+
+    def _execute_process(self):
+        self.set_live2d_state("running")
+        job = self._prepare_job()
+        if not job:
+            return
+        if self.use_warm:
+            self._execute_warm(job)
+            return
         
         # 构造命令
-        content_dir = os.path.join("demo", self.content_dir_name)
-        style_dir = os.path.join("demo", self.style_dir_name)
-        
-        script_name = "demo_transfer_with_scene.py"
-        cmd_parts = [
-            "python -u", script_name,
-            "--cfg", temp_inf_yaml,
-            "--cfg_assets", self.ctx.assets_file,
-            "--content_motion_dir", content_dir,
-            "--style_motion_dir", style_dir,
-            "--scale", "2.5"
-        ]
-
-        # 2. 根据条件添加可选参数
-        if self.render_video:
-            cmd_parts.append("--render_video")
-
-        # 3. 最后合并为字符串
-        cmd = " ".join(cmd_parts)
-        
-        session_name = f"inf_{self.scene_short_name}"[:20]
-        
+        content_dir, style_dir = job["content_dir"], job["style_dir"]
+        cmd = mld_inference_cmd(job["cfg"], self.ctx.assets_file, content_dir, style_dir,
+                                scale=2.5, render_video=self.render_video, params_file=job["params_file"])
+        result_expected = job["result_expected"]
+
         # 运行
-        success, msg = ProcessManager.run_with_log(
+        # 缓存 key 里带上 checkpoint / 推理配置 / 输入动作的内容 (scalar 在 params.json 的路径里)
+        success, msg = ProcessManager.submit(
             command=cmd,
-            task_name=session_name,
-            root_dir=self.ctx.root_dir
+            task_name=job["session_name"],
+            root_dir=self.ctx.root_dir,
+            gpu=self.gpu,
+            priority="interactive",
+            cache={"inputs": [self.selected_ckpt_path, job["cfg"], self.ctx.assets_file,
+                              os.path.join(self.ctx.root_dir, content_dir),
+                              os.path.join(self.ctx.root_dir, style_dir)],
+                   "outputs": lambda since: dirs_since(result_expected, since),
+                   "force": self.force_rerun}
         )
         
         if success:
             self.set_state("last_log_path", msg)
-            st.toast("🚀 任务已启动！")
+            if not self.notify_cache_hit(msg):
+                st.toast("🚀 任务已启动！")
             
             # 显示结果预期位置
-            result_expected = os.path.join(self.ctx.root_dir, "results", "mld", self.selected_exp)
             st.success(f"📂 任务结束后，结果将保存在: `{result_expected}`")
             
             time.sleep(1)
             st.rerun()
         else:
-            st.error(f"启动失败: {msg}")
\ No newline at end of file
+            st.error(f"启动失败: {msg}")
+
+    def _execute_warm(self, job):
+        """发给 (checkpoint, GPU) 对应的常驻 worker，没有就先起一个；日志 / 任务表和普通任务一样"""
+        args = mld_inference_args(job["cfg"], self.ctx.assets_file, job["content_dir"], job["style_dir"],
+                                  scale=2.5, render_video=self.render_video)
+        try:
+            log_path = WarmWorkerPool().submit_request(
+                self.selected_ckpt_path, self.gpu, self.ctx.root_dir, MLD_DEMO_SCRIPT, args,
+                params_file=job["params_file"], results_dir=job["result_expected"],
+                task_name=f"warm_{job['session_name']}")
+        except (OSError, RuntimeError) as e:
+            st.error(f"启动失败: {e}")
+            return
+        self.set_state("last_log_path", log_path)
+        st.toast("♨️ 已发给常驻 worker")
+        st.success(f"📂 任务结束后，结果将保存在: `{job['result_expected']}`")
+        time.sleep(1)
+        st.rerun()
+
+    def _render_warm_status(self):
+        """worker 一行一个 (状态 / 已处理请求 / 空闲时长)，下面是最近的请求和它们的产物"""
+        pool = WarmWorkerPool()
+        now = time.time()
+        for w in pool.workers():
+            if w.status in ("stopped", "failed") and not w.busy:
+                continue
+            c1, c2 = st.columns([5, 1])
+            with c1:
+                state = "忙碌" if w.busy else f"空闲 {int(now - w.last_used)}s"
+                st.caption(f"`{os.path.basename(w.ckpt)}` @ GPU {w.gpu or 'auto'} · {w.status} · "
+                           f"{state} · 已处理 {w.served} 个请求")
+            with c2:
+                if not w.busy and st.button("🛑 停止", key=self._get_key(f"warm_stop_{w.key}")):
+                    pool.stop(w.key)
+                    st.rerun(scope="app")
+        rows = [{"请求": r.request_id, "状态": r.status,
+                 "耗时(s)": r.seconds, "产物": ", ".join(os.path.basename(o) for o in r.outputs),
+                 "错误": r.error or ""} for r in pool.requests()]
+        if rows:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+
+
+    # ================= Sweep 矩阵 =================
+    def _matrix_root(self):
+        ckpt_stem = os.path.splitext(self.selected_ckpt_name)[0]
+        return os.path.join(mld_results_dir(self.ctx.root_dir, self.selected_exp), self.MATRIX_DIR, ckpt_stem)
+
+    @staticmethod
+    def _load_index(index_path):
+        if not os.path.exists(index_path):
+            return {}
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _matrix_cells(self, scenes, scalars, contents, styles, render_video=False):
+        """
+        笛卡尔积展开，每个格子的目录由参数决定：<scene>/<content>-<style>/scalar<v>_p<prompt 哈希>[_mp4]/
+        prompt 可以在侧边栏改，改过之后是新的格子，“跳过已有结果”不会拿旧 prompt 的结果顶上
+        """
+        cells = []
+        matrix_root = self._matrix_root()
+        for p in expand_trials({"scene": scenes, "data": [(c, s) for c in contents for s in styles],
+                                "scalar": scalars}):
+            scene_key = p["scene"]
+            short = scene_key.split(' ')[0]
+            # 当前侧边栏选中的场景用编辑过的 prompt，其它场景用预设描述
+            if scene_key == st.session_state.get("inf_scene_sb"):
+                prompt = self.prompt_text
+            else:
+                prompt = self.SCENE_DESCRIPTIONS[scene_key] or "Walking carefully."
+            content, style = p["data"]
+            prompt_hash = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+            leaf = trial_name("", {"scalar": p["scalar"], "p": prompt_hash}) + ("_mp4" if render_video else "")
+            parts = [trial_name(short, {}), trial_name(f"{content}-{style}", {}), leaf]
+            cells.append({"key": "/".join(parts), "cell_dir": os.path.join(matrix_root, *parts),
+                          "meta": {"scene": short, "prompt": prompt, "scalar": p["scalar"],
+                                   "content": content, "style": style, "render_video": render_video,
+                                   "ckpt": self.selected_ckpt_path}})
+        return cells
+
+    def _render_sweep_matrix(self):
+        st.caption("所有组合交给一个批量任务顺序执行，checkpoint 只加载一次；"
+                   "结果按格子放进固定目录，`index.json` 记录每格的参数和产物。")
+        demo_root = os.path.join(self.ctx.root_dir, "demo")
+        demo_subdirs = sorted(d for d in os.listdir(demo_root) if os.path.isdir(os.path.join(demo_root, d))) \
+            if os.path.exists(demo_root) else []
+        scene_keys = list(self.SCENE_DESCRIPTIONS.keys())
+        c1, c2 = st.columns(2)
+        with c1:
+            scenes = st.multiselect("场景", scene_keys, default=[st.session_state.get("inf_scene_sb", scene_keys[0])],
+                                    key=self._get_key("mx_scenes"))
+            scalar_text = st.text_input("FiLM Scalar (逗号分隔)", str(self.scene_scalar), key=self._get_key("mx_scalars"))
+        with c2:
+            contents = st.multiselect("Content Source", demo_subdirs,
+                                      default=[d for d in [self.content_dir_name] if d in demo_subdirs],
+                                      key=self._get_key("mx_contents"))
+            styles = st.multiselect("Style Source", demo_subdirs,
+                                    default=[d for d in [self.style_dir_name] if d in demo_subdirs],
+                                    key=self._get_key("mx_styles"))
+        o1, o2 = st.columns(2)
+        skip_done = o1.checkbox("跳过已有结果的格子", value=True, key=self._get_key("mx_skip"))
+        render_video = o2.checkbox("渲染 mp4", value=False, key=self._get_key("mx_video"))
+
+        try:
+            scalars = parse_values(scalar_text, float)
+        except ValueError as e:
+            st.error(f"Scalar 解析失败: {e}")
+            return
+        cells = self._matrix_cells(scenes, scalars, contents, styles, render_video)
+        if not cells:
+            st.info("场景 / Scalar / Content / Style 每项至少选一个")
+            return
+
+        index_path = os.path.join(self._matrix_root(), "index.json")
+        index = self._load_index(index_path)
+        done = {c["key"] for c in cells
+                if index.get(c["key"], {}).get("status") == "done" and os.path.isdir(c["cell_dir"])}
+        todo = [c for c in cells if not (skip_done and c["key"] in done)]
+        st.caption(f"共 {len(cells)} 格，已有结果 {len(done)} 格，本次要跑 {len(todo)} 格 · `{self._matrix_root()}`")
+
+        if st.button(f"🧮 提交 {len(todo)} 格", type="primary", disabled=not todo, key=self._get_key("mx_run")):
+            self._run_sweep_matrix(todo, index_path, render_video)
+
+        sweep = self.get_state("matrix_sweep")
+        if sweep and sweep["index"] == index_path:
+            self.live_region(self._render_matrix_status, run_every=self.LIVE_REFRESH_SEC)(
+                sweep["index"], sweep["log_path"], tuple(sweep["keys"]))
+
+    def _run_sweep_matrix(self, cells, index_path, render_video):
+        self.set_live2d_state("running")
+        job = self._prepare_job()
+        if not job:
+            return
+        # 在当前这份推理配置上只换 prompt
+        launcher_cfg = load_yaml(job["cfg"])
+        manifest_cells = []
+        for cell in cells:
+            meta = cell["meta"]
+            # 每个格子各自的推理配置 (prompt + 独占的 NAME) 和参数快照 (scalar)；
+            # NAME 不同 demo 脚本就写到各自的 results/mld/<NAME>/，并行的其它推理任务的产物不会被认领过来
+            cell_name = f"{self.selected_exp}_mx_{hashlib.sha1(cell['cell_dir'].encode('utf-8')).hexdigest()[:10]}"
+            cfg = job_yaml("inf", f"inference_{meta['scene']}.yaml",
+                           build_inference_cfg(launcher_cfg, self.selected_ckpt_path, meta["prompt"], name=cell_name))
+            params_file = write_params("inf", patch={self.MLD_PY_REL: {"DEFAULT_SCALAR_VAL": float(meta["scalar"])}})
+            args = mld_inference_args(cfg, self.ctx.assets_file, os.path.join("demo", meta["content"]),
+                                      os.path.join("demo", meta["style"]), scale=2.5, render_video=render_video)
+            # 不跳过时重跑的格子先清空，免得新旧产物混在一起
+            if os.path.isdir(cell["cell_dir"]):
+                shutil.rmtree(cell["cell_dir"])
+            manifest_cells.append({"key": cell["key"], "cell_dir": cell["cell_dir"], "script": MLD_DEMO_SCRIPT,
+                                   "argv": args, "params_file": params_file, "meta": meta,
+                                   "results_dir": mld_results_dir(self.ctx.root_dir, cell_name)})
+
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        manifest = {"index": index_path, "cells": manifest_cells}
+        manifest_path = job_file("infsweep", "manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        success, msg = ProcessManager.submit(mld_batch_cmd(manifest_path, self.ctx.root_dir),
+                                             task_name=f"infsweep_{len(cells)}", root_dir=self.ctx.root_dir,
+                                             gpu=self.gpu, priority="background")
+        if success:
+            self.set_state("last_log_path", msg)
+            self.set_state("matrix_sweep", {"index": index_path, "log_path": msg,
+                                            "keys": [c["key"] for c in cells]})
+            st.toast(f"🧮 已提交 {len(cells)} 格的批量推理")
+        else:
+            st.error(f"启动失败: {msg}")
+
+    def _render_matrix_status(self, index_path, log_path, keys):
+        """按 场景 / 数据 一行、scalar 一列铺开，格子里是状态和耗时"""
+        index = self._load_index(index_path)
+        state = ProcessManager.job_state(log_path)
+        table = {}
+        for key in keys:
+            row_key, col = key.rsplit("/", 1)
+            entry = index.get(key)
+            if entry and entry.get("status") == "done":
+                mark = f"✅ {entry.get('seconds') or 0:.0f}s"
+            elif entry:
+                mark = "❌"
+            else:
+                mark = "⏳" if state in ("queued", "running") else "-"
+            table.setdefault(row_key, {"场景 / 数据": row_key})[col] = mark
+        finished = sum(1 for k in keys if k in index and index[k].get("status") == "done")
+        st.caption(f"批量任务: {state or '-'} · {finished}/{len(keys)} 格完成 · 索引 `{index_path}`")
+        st.progress(finished / max(len(keys), 1))
+        st.dataframe(list(table.values()), use_container_width=True, hide_index=True)
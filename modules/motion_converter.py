@@ -2,6 +2,8 @@ import streamlit as st
 import os
 from core.base import BaseModule
 from core.process_mgr import ProcessManager
+from core.commands import motion_convert_cmd
+from core.result_cache import files_since
 import time
 
 class MotionConverter(BaseModule):
@@ -117,15 +119,11 @@ class MotionConverter(BaseModule):
             value=False, 
             key="b_render_mp4"
         )
+        force_rerun = self.render_cache_toggle()
         # 构造命令
         script_path = os.path.join(self.ctx.root_dir, "tool_HumanMLConverter.py")
-        if target_type == "dir":
-            show_cmd = f"python {script_path} --start_stage {start_node} --end_stage {end_node} --input_dir '{target_path}' --output_dir '{output_dir}'"
-        else:
-            show_cmd = f"python {script_path} --start_stage {start_node} --end_stage {end_node} --input_file '{target_path}' --output_dir '{output_dir}'"
-        
-        if render_mp4_video:
-            show_cmd += " --render_mp4"
+        show_cmd = motion_convert_cmd(script_path, start_node, end_node, target_path, output_dir,
+                                      is_dir=(target_type == "dir"), render_mp4=render_mp4_video)
         
         st.code(show_cmd, language="bash")
 
@@ -137,12 +135,16 @@ class MotionConverter(BaseModule):
             success, msg = ProcessManager.run_with_log(
                 command=cmd,
                 task_name="motion_convert",
-                root_dir=self.ctx.root_dir
+                root_dir=self.ctx.root_dir,
+                # 产物按“这次新写出来的文件”记，输出目录里别的批次的结果不算
+                cache={"inputs": [target_path], "force": force_rerun,
+                       "outputs": lambda since: files_since(output_dir, since)}
             )
             
             if success:
                 self.set_state("last_log_path", msg)
-                st.success("任务已启动！请查看下方日志。")
+                if not self.notify_cache_hit(msg):
+                    st.success("任务已启动！请查看下方日志。")
                 st.rerun() # 刷新以显示日志框
             else:
                 st.error(f"启动失败: {msg}")
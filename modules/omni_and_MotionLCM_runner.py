@@ -14,7 +14,7 @@ class OmniControlAndMotionLCMRunner(BaseModule):
             value="./save/omnicontrol_ckpt/model_humanml3d.pt"
         )
         self.num_reps = st.number_input("Num Repetitions", value=1, min_value=1)
-        self.gpu_id = st.text_input("GPU ID", "0")
+        self.gpu_id = self.render_gpu_selector("GPU ID")
 
         st.subheader("MotionLCM 运行参数")
         self.motionlcm_yaml_path = st.text_input(
@@ -37,9 +37,8 @@ class OmniControlAndMotionLCMRunner(BaseModule):
         st.info(f"📍 OmniControl 工作目录: `{OMNI_WORK_DIR}`")
         st.info(f"📍 MotionLCM 工作目录: `{LCM_WORK_DIR}`")
         
-        # 构造命令
+        # 构造命令 (CUDA_VISIBLE_DEVICES 由 GPU 队列在派发时自动填写)
         cmd = (
-            f"CUDA_VISIBLE_DEVICES={self.gpu_id} "
             f"python -m sample.generate "
             f"--model_path {self.model_path} "
             f"--num_repetitions {self.num_reps}"
@@ -49,7 +48,7 @@ class OmniControlAndMotionLCMRunner(BaseModule):
         st.code(f"cd {OMNI_WORK_DIR}\n{cmd}", language="bash")
 
         st.markdown("### 🖥️ MotionLCM 待执行命令")
-        st.code(f"cd {LCM_WORK_DIR}\nCUDA_VISIBLE_DEVICES={self.gpu_id} python demo.py --cfg {self.motionlcm_yaml_path}", language="bash")
+        st.code(f"cd {LCM_WORK_DIR}\npython demo.py --cfg {self.motionlcm_yaml_path}", language="bash")
         
         st.divider()
         
@@ -64,11 +63,12 @@ class OmniControlAndMotionLCMRunner(BaseModule):
                 session_name = "omni_gen_task"
                 
                 # 调用核心层的 ProcessManager
-                # 注意：run_in_screen 内部封装了 screen -dmS ...
-                success, msg = ProcessManager.run_with_log(
+                # 注意：submit 会先进 GPU 队列，有空闲卡槽时才启动
+                success, msg = ProcessManager.submit(
                     command=cmd, 
                     task_name=session_name, 
-                    root_dir=OMNI_WORK_DIR
+                    root_dir=OMNI_WORK_DIR,
+                    gpu=self.gpu_id
                 )
                 
                 if success:
@@ -93,7 +93,6 @@ class OmniControlAndMotionLCMRunner(BaseModule):
                 session_name_lcm = "motionlcm_gen_task"
 
                 motionlcm_cmd = (
-                    f"CUDA_VISIBLE_DEVICES={self.gpu_id} "
                     f"python demo.py "
                     f"--cfg {self.motionlcm_yaml_path} "
                     f"--user_define_hint {self.user_define_hint}"
@@ -102,11 +101,12 @@ class OmniControlAndMotionLCMRunner(BaseModule):
                 
                 
                 # 调用核心层的 ProcessManager
-                # 注意：run_in_screen 内部封装了 screen -dmS ...
-                success, msg = ProcessManager.run_with_log(
+                # 注意：submit 会先进 GPU 队列，有空闲卡槽时才启动
+                success, msg = ProcessManager.submit(
                     command=motionlcm_cmd, 
                     task_name=session_name_lcm, 
-                    root_dir=LCM_WORK_DIR
+                    root_dir=LCM_WORK_DIR,
+                    gpu=self.gpu_id
                 )
                 
                 if success:
@@ -126,13 +126,13 @@ class OmniControlAndMotionLCMRunner(BaseModule):
             st.markdown(f"""
             任务正在后台运行。
             1. 点击左侧导航栏的 **"💻 后台进程"** 查看状态。
-            2. 或者在终端运行: `screen -r omni_gen_task`
+            2. 或者在终端运行: `tail -f logs/omni_gen_task_*.log`
             """)
         with st.expander("查看如何监控MotionLCM运行进度"):
             st.markdown(f"""
             任务正在后台运行。
             1. 点击左侧导航栏的 **"💻 后台进程"** 查看状态。
-            2. 或者在终端运行: `screen -r motionlcm_gen_task`
+            2. 或者在终端运行: `tail -f logs/motionlcm_gen_task_*.log`
             """)
         self.render_log_monitor()
        
\ No newline at end of file
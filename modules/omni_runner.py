@@ -13,7 +13,7 @@ class OmniControlRunner(BaseModule):
             value="./save/omnicontrol_ckpt/model_humanml3d.pt"
         )
         self.num_reps = st.number_input("Num Repetitions", value=1, min_value=1)
-        self.gpu_id = st.text_input("GPU ID", "0")
+        self.gpu_id = self.render_gpu_selector("GPU ID")
 
     def render_main(self):
         # 固定工作目录
@@ -21,9 +21,8 @@ class OmniControlRunner(BaseModule):
         
         st.info(f"📍 工作目录: `{WORK_DIR}`")
         
-        # 构造命令
+        # 构造命令 (CUDA_VISIBLE_DEVICES 由 GPU 队列在派发时自动填写)
         cmd = (
-            f"CUDA_VISIBLE_DEVICES={self.gpu_id} "
             f"python -m sample.generate "
             f"--model_path {self.model_path} "
             f"--num_repetitions {self.num_reps}"
@@ -44,12 +43,12 @@ class OmniControlRunner(BaseModule):
                 # 这里的 Session Name 可以加时间戳防止重复
                 session_name = "omni_gen_task"
                 
-                # 调用核心层的 ProcessManager
-                # 注意：run_in_screen 内部封装了 screen -dmS ...
-                success, msg = ProcessManager.run_in_screen(
+                # 调用核心层的 ProcessManager (进 GPU 队列排队)
+                success, msg = ProcessManager.submit(
                     command=cmd, 
-                    session_name=session_name, 
-                    root_dir=WORK_DIR
+                    task_name=session_name, 
+                    root_dir=WORK_DIR,
+                    gpu=self.gpu_id
                 )
                 
                 if success:
@@ -63,5 +62,5 @@ class OmniControlRunner(BaseModule):
             st.markdown(f"""
             任务正在后台运行。
             1. 点击左侧导航栏的 **"💻 后台进程"** 查看状态。
-            2. 或者在终端运行: `screen -r omni_gen_task`
+            2. 或者在终端运行: `tail -f logs/omni_gen_task_*.log`
             """)
\ No newline at end of file
@@ -0,0 +1,246 @@
+# modules/pipeline.py
+import streamlit as st
+import os
+import glob
+import re
+import datetime
+from core.base import BaseModule
+from core.utils import load_yaml, save_yaml
+from core.pipeline import Stage, PipelineItem, PipelineRun, PipelineManager
+from core.commands import (gvhmr_inference_cmd, gvhmr_convert_cmd, motion_convert_cmd,
+                           build_inference_cfg, mld_inference_cmd, mld_results_dir, render_cmd)
+
+VIDEO_EXTS = (".mp4", ".mov", ".avi")
+
+
+def _newest(paths):
+    paths = list(paths)
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+class PipelineModule(BaseModule):
+    """视频 -> GVHMR -> NPY -> HumanML3D 特征 -> 推理 -> 渲染，每个视频单独往下流"""
+
+    STAGE_NAMES = ["gvhmr", "npy", "hml3d", "infer", "render"]
+    STAGE_LABELS = {
+        "gvhmr": "1. GVHMR 动作提取",
+        "npy": "2. PT -> NPY",
+        "hml3d": "3. HumanML3D 特征",
+        "infer": "4. 推理",
+        "render": "5. 渲染",
+    }
+    # 每个阶段默认并发 (GPU 阶段还会受 GPU 队列槽位限制)
+    DEFAULT_CONCURRENCY = {"gvhmr": 2, "npy": 4, "hml3d": 4, "infer": 2, "render": 2}
+
+    def __init__(self):
+        super().__init__()
+        self.name = "流水线 (Pipeline)"
+        self.icon = "🧵"
+        self.RENDER_WORK_DIR = "/root/autodl-tmp/MyRepository/MCM-LDM/"
+        self.RENDER_SCRIPT = "render_result.sh"
+
+    def render_sidebar(self):
+        st.subheader("🧵 流水线配置")
+        self.gvhmr_root = st.text_input("GVHMR 项目根路径", value="/root/autodl-tmp/GVHMR",
+                                        key=self._get_key("gvhmr_root"))
+        self.smpl_path = st.text_input("SMPL 模型路径",
+                                       value="/root/autodl-tmp/GVHMR/inputs/checkpoints/body_models/smpl",
+                                       key=self._get_key("smpl"))
+        self.skip_vo = st.checkbox("跳过视觉里程计 (-s)", value=True, key=self._get_key("skip_vo"))
+        self.gpu = self.render_gpu_selector()
+
+        st.divider()
+        st.markdown("#### 推理模型")
+        exp_root = os.path.join(self.ctx.root_dir, "experiments", "mld")
+        exps = sorted(os.listdir(exp_root), key=lambda x: os.path.getmtime(os.path.join(exp_root, x)),
+                      reverse=True) if os.path.exists(exp_root) else []
+        self.exp = st.selectbox("实验", exps, key=self._get_key("exp"))
+        self.ckpt = None
+        if self.exp:
+            ckpts = glob.glob(os.path.join(exp_root, self.exp, "checkpoints", "*.ckpt"))
+            ckpt_num = lambda x: re.search(r'\d+', os.path.basename(x))
+            ckpts = sorted(ckpts, key=lambda x: int(ckpt_num(x).group()) if ckpt_num(x) else 0, reverse=True)
+            self.ckpt = st.selectbox("Checkpoint", ckpts, format_func=os.path.basename, key=self._get_key("ckpt"))
+        self.prompt = st.text_area("Prompt", "Walking carefully.", height=70, key=self._get_key("prompt"))
+        demo_root = os.path.join(self.ctx.root_dir, "demo")
+        demo_subdirs = [d for d in os.listdir(demo_root) if os.path.isdir(os.path.join(demo_root, d))] \
+            if os.path.exists(demo_root) else ["Final_figure_content"]
+        self.style_dir_name = st.selectbox("Style Source", demo_subdirs, key=self._get_key("style"))
+
+        st.divider()
+        st.markdown("#### 渲染")
+        self.render_mode = st.selectbox("模式", ["video", "sequence"], key=self._get_key("r_mode"))
+        self.scene_name = st.selectbox("场景", ["Dumuqiao", "DiAiTianhuaban", "BaoFengYu", "Dark"],
+                                       key=self._get_key("r_scene"))
+
+    def render_main(self):
+        base_input_dir = os.path.join(self.gvhmr_root, "inputs/demo")
+        batches = sorted([d for d in os.listdir(base_input_dir) if os.path.isdir(os.path.join(base_input_dir, d))],
+                         reverse=True) if os.path.exists(base_input_dir) else []
+        st.info("💡 每个视频的上一阶段一结束就进入下一阶段，不用等整批跑完。视频先在 GVHMR 页面上传成批次。")
+
+        c1, c2 = st.columns(2)
+        batch = c1.selectbox("📂 输入批次", batches, key=self._get_key("batch"))
+        last_label = c2.selectbox("终点阶段", [self.STAGE_LABELS[s] for s in self.STAGE_NAMES],
+                                  index=len(self.STAGE_NAMES) - 1, key=self._get_key("last_stage"))
+        last_idx = [self.STAGE_LABELS[s] for s in self.STAGE_NAMES].index(last_label)
+
+        with st.expander("⚙️ 各阶段并发 / 重试", expanded=False):
+            cols = st.columns(len(self.STAGE_NAMES))
+            concurrency = {}
+            for col, name in zip(cols, self.STAGE_NAMES):
+                concurrency[name] = col.number_input(self.STAGE_LABELS[name], 1, 32, self.DEFAULT_CONCURRENCY[name],
+                                                     key=self._get_key(f"conc_{name}"))
+            retries = st.number_input("失败重试次数", 0, 5, 1, key=self._get_key("retries"))
+
+        videos = []
+        if batch:
+            batch_dir = os.path.join(base_input_dir, batch)
+            videos = sorted(f for f in os.listdir(batch_dir) if f.lower().endswith(VIDEO_EXTS))
+            st.caption(f"共 {len(videos)} 个视频")
+
+        need_model = last_idx >= self.STAGE_NAMES.index("infer")
+        disabled = not videos or (need_model and not self.ckpt)
+        if st.button("🚀 启动流水线", type="primary", use_container_width=True, disabled=disabled,
+                     key=self._get_key("run")):
+            self._start(batch, videos, last_idx, concurrency, int(retries))
+
+        runs = PipelineManager().list()
+        if runs:
+            st.divider()
+            run_ids = [r.run_id for r in runs]
+            current = self.get_state("run_id")
+            idx = run_ids.index(current) if current in run_ids else 0
+            run_id = st.selectbox("流水线记录", run_ids, index=idx, key=self._get_key("run_pick"))
+            self.live_region(self._render_run, run_every=self.LIVE_REFRESH_SEC)(run_id)
+
+        self.render_log_monitor()
+
+    # ================= 流水线定义 =================
+    def _start(self, batch, videos, last_idx, concurrency, retries):
+        run_id = f"{batch}_{datetime.datetime.now().strftime('%H%M%S')}"
+        work_root = os.path.join(self.ctx.root_dir, "pipeline_runs", run_id)
+        stages = self._build_stages(run_id, batch, work_root, concurrency, retries)[:last_idx + 1]
+        items = [PipelineItem(os.path.splitext(v)[0], {"video": v}) for v in videos]
+        try:
+            PipelineManager().start(PipelineRun(run_id, stages, items, gpu=self.gpu, record_dir=work_root))
+        except RuntimeError as e:
+            st.error(str(e))
+            return
+        self.set_state("run_id", run_id)
+        st.toast(f"流水线已启动: {len(items)} 个视频，{len(stages)} 个阶段")
+
+    def _build_stages(self, run_id, batch, work_root, concurrency, retries):
+        # 参数在启动时定格，后台线程里不再读 streamlit 的组件
+        gvhmr_root, smpl_path, skip_vo = self.gvhmr_root, self.smpl_path, self.skip_vo
+        root_dir, assets_file = self.ctx.root_dir, self.ctx.assets_file
+        exp, ckpt, prompt = self.exp, self.ckpt, self.prompt
+        style_dir = os.path.join("demo", self.style_dir_name) if self.style_dir_name else ""
+        render_mode, scene_name = self.render_mode, self.scene_name
+        render_work_dir, render_script = self.RENDER_WORK_DIR, self.RENDER_SCRIPT
+        render_extra = "--fps 20" if render_mode == "video" else "--num 4"
+        convert_script = os.path.join(root_dir, "tool_HumanMLConverter.py")
+
+        def item_dir(item):
+            path = os.path.join(work_root, item.key)
+            os.makedirs(path, exist_ok=True)
+            return path
+
+        # 1. GVHMR：每个视频单独一个输入目录 (软链接)，复用文件夹推理脚本
+        def gvhmr_cmd(item):
+            in_rel = f"inputs/pipeline/{run_id}/{item.key}"
+            out_rel = f"outputs/pipeline/{run_id}/{item.key}"
+            in_abs = os.path.join(gvhmr_root, in_rel)
+            os.makedirs(in_abs, exist_ok=True)
+            link = os.path.join(in_abs, item.data["video"])
+            if not os.path.lexists(link):
+                os.symlink(os.path.join(gvhmr_root, "inputs/demo", batch, item.data["video"]), link)
+            item.data["gvhmr_out"] = os.path.join(gvhmr_root, out_rel)
+            return gvhmr_inference_cmd(in_rel, out_rel, skip_vo)
+
+        def gvhmr_collect(item, started_at):
+            if not glob.glob(os.path.join(item.data["gvhmr_out"], "**", "*.pt"), recursive=True):
+                raise FileNotFoundError("没有生成 .pt 结果")
+            return {}
+
+        # 2. PT -> NPY
+        def npy_collect(item, started_at):
+            npy = _newest(glob.glob(os.path.join(item.data["gvhmr_out"], "**", "*.npy"), recursive=True))
+            if not npy:
+                raise FileNotFoundError("没有生成 .npy")
+            return {"npy_dir": os.path.dirname(npy)}
+
+        # 3. HumanML3D 特征 (step1 -> step3)
+        def hml_cmd(item):
+            item.data["hml_dir"] = os.path.join(item_dir(item), "hml3d")
+            return motion_convert_cmd(convert_script, "step1", "step3", item.data["npy_dir"], item.data["hml_dir"])
+
+        def hml_collect(item, started_at):
+            npy = _newest(glob.glob(os.path.join(item.data["hml_dir"], "**", "*.npy"), recursive=True))
+            if not npy:
+                raise FileNotFoundError("没有生成特征文件")
+            return {"content_dir": os.path.dirname(npy)}
+
+        # 4. 推理：每个视频单独一个 NAME，结果目录互不干扰
+        def infer_cmd(item):
+            exp_path = os.path.join(root_dir, "experiments", "mld", exp)
+            launcher = os.path.join(exp_path, "launcher_config.yaml")
+            if not os.path.exists(launcher):
+                launcher = _newest(glob.glob(os.path.join(exp_path, "*.yaml")))
+            name = f"{exp}_{run_id}_{item.key}"
+            cfg_path = os.path.join(item_dir(item), "inference.yaml")
+            save_yaml(build_inference_cfg(load_yaml(launcher), ckpt, prompt, name=name), cfg_path)
+            item.data["infer_name"] = name
+            return mld_inference_cmd(cfg_path, assets_file, item.data["content_dir"], style_dir)
+
+        def infer_collect(item, started_at):
+            res_root = mld_results_dir(root_dir, item.data["infer_name"])
+            dirs = [d for d in glob.glob(os.path.join(res_root, "*")) if os.path.isdir(d)]
+            result = _newest(dirs)
+            if not result:
+                raise FileNotFoundError(f"{res_root} 下没有结果")
+            return {"result_dir": result}
+
+        # 5. 渲染
+        def render_stage_cmd(item):
+            return render_cmd(render_script, item.data["result_dir"], 50, render_mode, "high",
+                              render_extra, scene_name=scene_name)
+
+        def render_collect(item, started_at):
+            if render_mode == "video" and not glob.glob(os.path.join(item.data["result_dir"], "*.mp4")):
+                raise FileNotFoundError("没有渲染出视频")
+            return {}
+
+        return [
+            Stage("gvhmr", gvhmr_cmd, gvhmr_root, concurrency["gvhmr"], retries, collect=gvhmr_collect),
+            Stage("npy", lambda item: gvhmr_convert_cmd(item.data["gvhmr_out"], smpl_path), gvhmr_root,
+                  concurrency["npy"], retries, use_gpu=False, collect=npy_collect),
+            Stage("hml3d", hml_cmd, root_dir, concurrency["hml3d"], retries, use_gpu=False, collect=hml_collect),
+            Stage("infer", infer_cmd, root_dir, concurrency["infer"], retries, collect=infer_collect),
+            Stage("render", render_stage_cmd, render_work_dir, concurrency["render"], retries,
+                  collect=render_collect),
+        ]
+
+    # ================= 进度 =================
+    def _render_run(self, run_id):
+        run = PipelineManager().get(run_id)
+        if not run:
+            return
+        done = sum(1 for i in run.items if i.status == "done")
+        st.markdown(f"#### 🧵 `{run.run_id}` · {run.status} · 完成 {done}/{len(run.items)}")
+        if run.error:
+            st.error(run.error)
+        st.progress(done / max(len(run.items), 1))
+        st.dataframe(run.stage_summary(), use_container_width=True, hide_index=True)
+        st.dataframe(run.to_rows(), use_container_width=True, hide_index=True)
+
+        c1, c2 = st.columns(2)
+        logs = {f"{i.key} · {stage}": path for i in run.items for stage, paths in i.logs.items() for path in paths[-1:]}
+        if logs:
+            picked = c1.selectbox("查看日志", list(logs.keys()), key=self._get_key("log_pick"))
+            if c1.button("👀 在下方终端里查看", key=self._get_key("log_attach")):
+                self.set_state("last_log_path", logs[picked])
+                st.rerun(scope="app")
+        if run.status == "running" and c2.button("⏹️ 取消流水线", key=self._get_key("cancel")):
+            run.cancel()
+            st.toast("已取消，正在结束还在跑的阶段")
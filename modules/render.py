@@ -166,8 +166,14 @@ import streamlit as st
 import os
 import glob
 import time
+import subprocess
+from datetime import datetime
 from core.base import BaseModule
 from core.process_mgr import ProcessManager
+from core.commands import render_cmd, stitch_videos_cmd
+from core.pipeline import Stage, PipelineItem, PipelineRun, PipelineManager
+from core.sharding import frame_ranges, split_motion, motion_frames, newest_file, write_concat_list
+from core.result_cache import files_since
 
 class RenderModule(BaseModule):
     def __init__(self):
@@ -179,10 +185,16 @@ class RenderModule(BaseModule):
         # 原代码中渲染脚本在另一个仓库 MotionLCM 下，这里保持原样
         self.RENDER_WORK_DIR = "/root/autodl-tmp/MyRepository/MCM-LDM/"
         self.RENDER_SCRIPT = "render_result.sh"
+        # 预览区多久扫描一次新视频 (秒)
+        self.PREVIEW_REFRESH_SEC = 10
+        # 渲染农场：分段渲染时每段最少多少帧 (太短的段 SMPLify 拟合不稳)
+        self.FARM_MIN_FRAMES = 30
 
     def render_sidebar(self):
         # st.info("💡 渲染模块运行在 MotionLCM 环境下，但读取的是 MCM-LDM 的结果。")
         st.caption(f"渲染引擎路径:\n{self.RENDER_WORK_DIR}")
+        self.gpu = self.render_gpu_selector()
+        self.force_rerun = self.render_cache_toggle()
 
     def render_main(self):
         st.markdown("## 🎬 智能渲染工厂")
@@ -211,7 +223,9 @@ class RenderModule(BaseModule):
             # 1.2 选择具体序列 (Subdir)
             subdirs = []
             if os.path.exists(selected_exp_path):
-                subdirs = [d for d in os.listdir(selected_exp_path) if os.path.isdir(os.path.join(selected_exp_path, d))]
+                # "_" 开头的是渲染农场的工作目录，不算序列
+                subdirs = [d for d in os.listdir(selected_exp_path)
+                           if os.path.isdir(os.path.join(selected_exp_path, d)) and not d.startswith("_")]
                 # 按修改时间排序
                 subdirs = sorted(subdirs, key=lambda x: os.path.getmtime(os.path.join(selected_exp_path, x)), reverse=True)
             
@@ -278,65 +292,194 @@ class RenderModule(BaseModule):
                     target_subdir_path, smplify_iters, render_mode, res_quality, param_arg, is_gt, selected_subdir_name, scene_ctx
                 )
 
+            # 1.5 渲染农场：一次把整个实验 / 一条长序列的多个分段并行渲染
+            render_args = (smplify_iters, render_mode, res_quality, param_arg, is_gt, scene_ctx)
+            self._render_farm_panel(selected_exp_name, selected_exp_path, subdirs, target_subdir_path, render_args)
+
         # ================= 右侧：预览区 =================
+        # 局部刷新：新渲染出来的视频会自己出现，不用 rerun 整个页面
         with col_preview:
-            st.subheader("📺 结果预览")
-            st.caption(f"正在监视: {selected_subdir_name}")
-            
-            if target_subdir_path and os.path.exists(target_subdir_path):
-                # 扫描 MP4
-                mp4_files = glob.glob(os.path.join(target_subdir_path, "*.mp4"))
-                # 按时间倒序，让最新的显示在最上面
-                mp4_files = sorted(mp4_files, key=os.path.getmtime, reverse=True)
-                
-                if mp4_files:
-                    st.success(f"发现 {len(mp4_files)} 个视频")
-                    for mp4 in mp4_files[:3]: # 只显示前3个
-                        st.video(mp4)
-                        st.caption(os.path.basename(mp4))
-                    
-                    if len(mp4_files) > 3:
-                        st.info(f"...还有 {len(mp4_files)-3} 个")
-                else:
-                    st.warning("暂无视频")
-                    st.caption("请先点击左侧开始渲染，或检查是否只生成了图片")
-            else:
-                st.error("路径无效")
+            self.live_region(self._render_preview, run_every=self.PREVIEW_REFRESH_SEC)(
+                selected_subdir_name, target_subdir_path
+            )
 
         # ================= 下方：日志 =================
         self.render_log_monitor()
 
+    def _render_preview(self, selected_subdir_name, target_subdir_path):
+        st.subheader("📺 结果预览")
+        st.caption(f"正在监视: {selected_subdir_name}")
+        
+        if target_subdir_path and os.path.exists(target_subdir_path):
+            # 扫描 MP4
+            mp4_files = glob.glob(os.path.join(target_subdir_path, "*.mp4"))
+            # 按时间倒序，让最新的显示在最上面
+            mp4_files = sorted(mp4_files, key=os.path.getmtime, reverse=True)
+            
+            if mp4_files:
+                st.success(f"发现 {len(mp4_files)} 个视频")
+                for mp4 in mp4_files[:3]: # 只显示前3个
+                    st.video(mp4)
+                    st.caption(os.path.basename(mp4))
+                
+                if len(mp4_files) > 3:
+                    st.info(f"...还有 {len(mp4_files)-3} 个")
+            else:
+                st.warning("暂无视频")
+                st.caption("请先点击左侧开始渲染，或检查是否只生成了图片")
+        else:
+            st.error("路径无效")
+
     def _run_render_pipeline(self, input_path, iters, mode, res, extra_arg, is_gt, session_suffix, scene_ctx):
         # 构造命令
         # 注意：这里 input_path 可能包含空格，建议用引号包起来，虽然 autodl 路径通常没有空格
-        cmd = f"bash {self.RENDER_SCRIPT} --input_folder '{input_path}' --iters {iters} --mode {mode} --res {res} {extra_arg}"
-        
-        if is_gt:
-            cmd += " --gt"
-        
-        cmd += f" --scene_name {scene_ctx.get('scene_name', 'default_scene')}"
-        # st.warning(scene_ctx["render_hint"])
-        # st.warning(type(scene_ctx["render_hint"]))
-        if scene_ctx["render_hint"] == True:
-            cmd += " --use_guide_hint"
-        
+        cmd = render_cmd(self.RENDER_SCRIPT, input_path, iters, mode, res, extra_arg, is_gt,
+                         scene_name=scene_ctx.get('scene_name', 'default_scene'),
+                         use_guide_hint=scene_ctx["render_hint"] == True)
+
 
         # Session Name
         session_name = f"render_{session_suffix}"[:20]
 
         # 提交任务
         # 注意：这里 root_dir 必须切换到 MotionLCM 的目录
-        success, log_path = ProcessManager.run_with_log(
+        # 渲染结果和 .npy 在同一个目录里，所以输入只哈希 .npy，产物记这次新写出来的其它文件
+        success, log_path = ProcessManager.submit(
             command=cmd,
             task_name=session_name,
-            root_dir=self.RENDER_WORK_DIR
+            root_dir=self.RENDER_WORK_DIR,
+            gpu=self.gpu,
+            priority="interactive",
+            cache={"inputs": sorted(glob.glob(os.path.join(input_path, "*.npy"))),
+                   "outputs": lambda since: [f for f in files_since(input_path, since) if not f.endswith(".npy")],
+                   "force": self.force_rerun}
         )
 
         if success:
             self.set_state("last_log_path", log_path)
-            st.toast("🎨 渲染任务已启动！")
+            if not self.notify_cache_hit(log_path):
+                st.toast("🎨 渲染任务已启动！")
             self.set_live2d_state('success')
             time.sleep(0.5)
             st.rerun()
         else:
-            st.error(f"启动失败: {log_path}")
\ No newline at end of file
+            st.error(f"启动失败: {log_path}")
+    # ================= 渲染农场 =================
+    def _farm_cmd(self, input_path, render_args, mode=None, extra_arg=None):
+        iters, r_mode, res, param_arg, is_gt, scene_ctx = render_args
+        return render_cmd(self.RENDER_SCRIPT, input_path, iters, mode or r_mode, res,
+                          param_arg if extra_arg is None else extra_arg, is_gt,
+                          scene_name=scene_ctx.get('scene_name', 'default_scene'),
+                          use_guide_hint=scene_ctx["render_hint"] == True)
+
+    def _render_farm_panel(self, exp_name, exp_path, subdirs, target_subdir_path, render_args):
+        with st.expander("🏭 渲染农场 (多序列 / 长序列分段 并行渲染)"):
+            farm_mode = st.radio("拆分方式", ["多个序列", "长序列按帧分段"], horizontal=True,
+                                 key=self._get_key("farm_mode"))
+            pool_size = st.number_input("并行数 (进程池大小)", 1, 32, 4, key=self._get_key("farm_pool"),
+                                        help="同时最多跑几个渲染进程；每张卡的并发仍受 GPU 队列槽位限制")
+
+            if farm_mode == "多个序列":
+                chosen = st.multiselect("要渲染的序列 (默认全部)", subdirs, default=subdirs,
+                                        key=self._get_key("farm_subdirs"))
+                skip_done = st.checkbox("跳过已经有 mp4 的序列", value=False, key=self._get_key("farm_skip"))
+                if st.button(f"🚀 并行渲染 {len(chosen)} 个序列", key=self._get_key("farm_run_seq"),
+                             disabled=not chosen):
+                    self._run_farm_sequences(exp_name, exp_path, chosen, int(pool_size), skip_done, render_args)
+            else:
+                npys = sorted(f for f in os.listdir(target_subdir_path) if f.endswith(".npy"))
+                if not npys:
+                    st.info("当前序列目录下没有 .npy 动作文件")
+                else:
+                    npy_name = st.selectbox("长序列动作文件", npys, key=self._get_key("farm_npy"))
+                    n_parts = st.number_input("分段数", 2, 64, 4, key=self._get_key("farm_parts"))
+                    fps = st.number_input("帧率 (FPS)", value=20, key=self._get_key("farm_fps"))
+                    st.caption("按帧切成几段分别以 video 模式渲染，全部完成后用 ffmpeg 拼回一个 mp4")
+                    if st.button("🚀 分段并行渲染", key=self._get_key("farm_run_range")):
+                        self._run_farm_ranges(os.path.join(target_subdir_path, npy_name), int(n_parts),
+                                              int(pool_size), int(fps), render_args)
+
+            run = PipelineManager().get(self.get_state("farm_run"))
+            if run and run.run_id.startswith("render_"):
+                self.live_region(self._render_farm_progress, run_every=self.LIVE_REFRESH_SEC)(run.run_id)
+
+    def _run_farm_sequences(self, exp_name, exp_path, subdirs, pool_size, skip_done, render_args):
+        if skip_done:
+            subdirs = [d for d in subdirs if not glob.glob(os.path.join(exp_path, d, "*.mp4"))]
+        if not subdirs:
+            st.info("没有需要渲染的序列")
+            return
+        items = [PipelineItem(d, {"input": os.path.join(exp_path, d)}) for d in subdirs]
+        stage = Stage("render", lambda item: self._farm_cmd(item.data["input"], render_args),
+                      self.RENDER_WORK_DIR, concurrency=pool_size, retries=1)
+        run_id = f"render_{exp_name}_{datetime.now().strftime('%H%M%S')}"
+        self._start_farm(PipelineRun(run_id, [stage], items, gpu=self.gpu,
+                                     record_dir=os.path.join(exp_path, "_farm", run_id)))
+
+    def _run_farm_ranges(self, npy_path, n_parts, pool_size, fps, render_args):
+        n_frames = motion_frames(npy_path)
+        ranges = frame_ranges(n_frames, n_parts, min_len=self.FARM_MIN_FRAMES)
+        stem = os.path.splitext(os.path.basename(npy_path))[0]
+        seq_dir = os.path.dirname(npy_path)
+        run_id = f"render_{stem}_{datetime.now().strftime('%H%M%S')}"
+        work_dir = os.path.join(os.path.dirname(seq_dir), "_farm", run_id)
+        part_dirs = split_motion(npy_path, ranges, work_dir)
+        items = [PipelineItem(f"{stem}[{a}:{b}]", {"input": d, "range": (a, b)})
+                 for d, (a, b) in zip(part_dirs, ranges)]
+
+        def collect(item, started_at):
+            mp4 = newest_file(item.data["input"], "*.mp4", since=started_at)
+            if not mp4:
+                raise FileNotFoundError("这一段没有渲染出 mp4")
+            return {"mp4": mp4}
+
+        def stitch(run):
+            parts = [i.data.get("mp4") for i in run.items]
+            if not all(parts):
+                return {"error": "有分段没有渲染成功，跳过拼接"}
+            output = os.path.join(seq_dir, f"{stem}_farm.mp4")
+            list_file = write_concat_list(os.path.join(work_dir, "concat.txt"), parts)
+            proc = subprocess.run(stitch_videos_cmd(list_file, output), shell=True,
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                return {"error": proc.stderr.strip()[-500:] or f"ffmpeg 退出码 {proc.returncode}"}
+            return {"output": output}
+
+        stage = Stage("render", lambda item: self._farm_cmd(item.data["input"], render_args, "video", f"--fps {fps}"),
+                      self.RENDER_WORK_DIR, concurrency=pool_size, retries=1, collect=collect)
+        self._start_farm(PipelineRun(run_id, [stage], items, gpu=self.gpu, record_dir=work_dir, on_finish=stitch))
+        st.caption(f"{n_frames} 帧 → {len(ranges)} 段")
+
+    def _start_farm(self, run):
+        try:
+            PipelineManager().start(run)
+        except RuntimeError as e:
+            st.error(str(e))
+            return
+        self.set_state("farm_run", run.run_id)
+        st.toast(f"🏭 已提交 {len(run.items)} 个渲染分片")
+
+    def _render_farm_progress(self, run_id):
+        """每个分片一行：状态 / 尝试次数 / 耗时；分段模式结束后给出拼接好的视频"""
+        run = PipelineManager().get(run_id)
+        done = sum(1 for i in run.items if i.status == "done")
+        st.caption(f"`{run_id}` · {run.status} · {done}/{len(run.items)} 个分片完成")
+        st.progress(done / max(len(run.items), 1))
+        st.dataframe(run.to_rows(), use_container_width=True, hide_index=True)
+
+        c1, c2 = st.columns(2)
+        with c1:
+            if run.status == "running" and st.button("🛑 取消农场任务", key=self._get_key("farm_cancel")):
+                run.cancel()
+                st.rerun(scope="app")
+        with c2:
+            logs = [i.logs["render"][-1] for i in run.items if i.logs.get("render")]
+            if logs and st.button("👀 查看最近分片日志", key=self._get_key("farm_log")):
+                self.set_state("last_log_path", logs[-1])
+                st.rerun(scope="app")
+
+        if run.result and run.result.get("output"):
+            st.success(f"🎞️ 已拼接: {os.path.basename(run.result['output'])}")
+            st.video(run.result["output"])
+        elif run.result and run.result.get("error"):
+            st.error(f"拼接失败: {run.result['error']}")
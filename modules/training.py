@@ -7,6 +7,16 @@ import datetime
 from core.base import BaseModule
 from core.utils import load_yaml, save_yaml, load_persistent_state, save_persistent_state
 from core.process_mgr import ProcessManager
+from core.metrics import MetricsStore
+from core.gpu_queue import GPUJobQueue
+from core.sweep import expand_trials, trial_name, parse_values
+from core.halving import HalvingScheduler, HalvingStudy, Trial, rung_budgets
+from core.autotune import ProbeScheduler, ProbeStudy, Probe
+from core.job_registry import JobRegistry
+from core.failure_watch import FailureRecovery
+from core.commands import mld_train_cmd
+from core.distributed import (SCALE_RULES, scale_hparams, apply_world_size, rank_log_dir,
+                              latest_rank_log_dir, rank_logs)
 
 class TrainingModule(BaseModule):
     def __init__(self):
@@ -26,6 +36,8 @@ class TrainingModule(BaseModule):
             "4. Only Baseline": {"FUSION": "mlp", "LOSS": False, "JUST_BASE": True, "LAMBDA": 0.0, "DESC": "基线", "SUFFIX": "Base"},
             "5. Custom": {"FUSION": "film", "LOSS": True, "JUST_BASE": False, "LAMBDA": 0.2, "DESC": "自定义", "SUFFIX": "Custom"}
         }
+        # sweep trial 命名用的缩写
+        self.SWEEP_ABBREV = {"preset": "", "lambda": "lam", "lr": "lr", "bs": "bs"}
 
     def render_sidebar(self):
         st.subheader("⚙️ 参数配置")
@@ -72,9 +84,18 @@ class TrainingModule(BaseModule):
         self.lam = st.number_input("Lambda", 0.0, 10.0, 0.2, step=0.1, key="w_lambda")
         
         st.divider()
+        applied = self.get_state("apply_probe")
+        if applied:
+            st.session_state[self._get_key("num_workers")], st.session_state[self._get_key("bs")] = applied
+            self.set_state("apply_probe", None)
         self.lr = st.text_input("LR", load_persistent_state("last_lr", "2e-5"))
-        self.bs = st.number_input("Batch Size", 1, 128, 32)
+        self.bs = st.number_input("Batch Size", 1, 128, 32, key=self._get_key("bs"))
+        self.num_workers = st.number_input("NUM_WORKERS", 0, 64, 4, key=self._get_key("num_workers"),
+                                           help="DataLoader 的 worker 数，可以用主页面的吞吐探测挑")
         self.epoch = st.number_input("Epochs", 1, 1000, 100)
+        self._render_device_selector()
+        self.sweep_mode = st.toggle("🧪 Sweep 模式", value=False, key=self._get_key("sweep_toggle"),
+                                    help="一次提交一组 (预设 × LAMBDA × LR × BS) 的 trial")
         
         # 🔥 关键：绑定 key="w_exp_name"
         # 这样 on_preset_change 修改 session_state.w_exp_name 时，这里会自动更新显示
@@ -89,70 +110,408 @@ class TrainingModule(BaseModule):
             
         # === 1. 准备配置 ===
         cfg = load_yaml(self.BASE_YAML_PATH)
-        new_cfg = copy.deepcopy(cfg)
-        
-        new_cfg['NAME'] = self.exp_name
-        new_cfg.setdefault('SCENE_MODIFF_ABLATION', {})
-        new_cfg['SCENE_MODIFF_ABLATION'].update({
-            'FUSION_MODE': self.fusion,
-            'USE_SCENE_CLS': self.loss,
-            'LAMBDA_SCENE': self.lam,
-            'JUST_FINETUNE_BASELINE': self.base
-        })
-        new_cfg['TRAIN']['BATCH_SIZE'] = int(self.bs)
-        new_cfg['TRAIN']['END_EPOCH'] = int(self.epoch)
-        new_cfg['TRAIN']['OPTIM']['LR'] = float(self.lr)
+
+        if self.sweep_mode:
+            self._render_sweep(cfg)
+            self.render_log_monitor()
+            return
+
+        eff = self._scaled(self.lr, self.bs)
+        new_cfg = self._build_cfg(cfg, self.exp_name, self.fusion, self.loss, self.base,
+                                  self.lam, eff["bs"], self.epoch, eff["lr"], num_workers=self.num_workers)
 
         # 路径计算
-        exp_dir = os.path.join(self.ctx.root_dir, "experiments", "mld", self.exp_name)
-        target_yaml_path = os.path.join(exp_dir, "launcher_config.yaml")
+        exp_dir, target_yaml_path = self._exp_paths(self.exp_name)
         ckpt_dir = os.path.join(exp_dir, "checkpoints")
 
         # === 2. 信息展示区 (你要的路径提示) ===
         st.info(f"📂 **配置文件**: `{target_yaml_path}`")
         st.success(f"💾 **结果/权重 (Checkpoints) 将保存在**: \n`{ckpt_dir}`")
+        if self.n_gpus > 1:
+            st.info(f"🧩 **DDP × {self.n_gpus}**: 每卡 BS {eff['bs']} · 全局 BS {eff['global_bs']} · "
+                    f"LR {eff['lr']:.3g} ({SCALE_RULES[self.scale_rule]})")
 
         # === 3. YAML 预览 ===
         with st.expander("👀 预览生成的 YAML 内容"):
             st.code(yaml.dump(new_cfg, default_flow_style=False), language='yaml')
 
-        # === 4. 启动按钮 ===
+        # === 4. DataLoader 吞吐探测 ===
+        with st.expander("🔬 DataLoader 吞吐探测 (NUM_WORKERS × BATCH_SIZE)"):
+            self._render_autotune(new_cfg, exp_dir, target_yaml_path)
+
+        # === 5. 启动按钮 ===
         if st.button("🚀 立即启动 (Run)", type="primary", use_container_width=True):
             self._run(new_cfg, exp_dir, target_yaml_path)
 
-        # === 5. 日志监控 ===
+        # === 6. 日志监控 ===
         self.render_log_monitor()
+        self._render_rank_logs(exp_dir)
 
-    def _run(self, cfg_data, exp_dir, yaml_path):
+    @staticmethod
+    def _build_cfg(base_cfg, exp_name, fusion, loss, just_base, lam, bs, epoch, lr, num_workers=None):
+        """在 Base YAML 上覆盖消融参数，返回新的配置 (不改动 base_cfg)；num_workers 为 None 时沿用 Base YAML"""
+        new_cfg = copy.deepcopy(base_cfg)
+        new_cfg['NAME'] = exp_name
+        new_cfg.setdefault('SCENE_MODIFF_ABLATION', {})
+        new_cfg['SCENE_MODIFF_ABLATION'].update({
+            'FUSION_MODE': fusion,
+            'USE_SCENE_CLS': loss,
+            'LAMBDA_SCENE': lam,
+            'JUST_FINETUNE_BASELINE': just_base
+        })
+        new_cfg['TRAIN']['BATCH_SIZE'] = int(bs)
+        new_cfg['TRAIN']['END_EPOCH'] = int(epoch)
+        new_cfg['TRAIN']['OPTIM']['LR'] = float(lr)
+        if num_workers is not None:
+            new_cfg['TRAIN']['NUM_WORKERS'] = int(num_workers)
+        return new_cfg
+
+    # ================= 多卡 (DDP) =================
+    def _render_device_selector(self):
+        """单卡沿用 GPU 选择；多卡时选几张卡 (或交给队列自动分配) 和 LR / BS 的缩放规则"""
+        devices = GPUJobQueue().devices
+        self.n_gpus = int(st.number_input("GPU 数 (多卡 DDP)", 1, max(1, len(devices)), 1,
+                                          key=self._get_key("n_gpus"),
+                                          help="大于 1 时用 torchrun 启动，DEVICE 列表按卡数写进 launcher_config.yaml"))
+        self.scale_rule = "none"
+        if self.n_gpus <= 1:
+            self.gpu = self.render_gpu_selector()
+            return
+        picked = st.multiselect("训练用的卡 (留空 = 队列自动分配)", devices, key=self._get_key("ddp_devices"))
+        if picked and len(picked) != self.n_gpus:
+            st.warning(f"选了 {len(picked)} 张卡，按 {len(picked)} 卡启动")
+            self.n_gpus = len(picked)
+        self.gpu = ",".join(picked) if picked else "auto"
+        self.scale_rule = st.selectbox("LR / BS 缩放规则", list(SCALE_RULES.keys()), index=1,
+                                       format_func=SCALE_RULES.get, key=self._get_key("scale_rule"),
+                                       help="侧边栏的 LR / Batch Size 视为单卡上的取值")
+
+    def _scaled(self, lr, bs):
+        return scale_hparams(lr, bs, self.n_gpus, self.scale_rule)
+
+    def _render_rank_logs(self, exp_dir):
+        """多卡任务的各 rank 日志 (主日志里是带 [defaultN]: 前缀的合并输出)"""
+        log_dir = latest_rank_log_dir(exp_dir)
+        logs = rank_logs(log_dir) if log_dir else {}
+        if not logs:
+            return
+        with st.expander(f"🧩 各 rank 日志 ({len(logs)} 个 rank · `{os.path.basename(log_dir)}`)"):
+            rank = st.radio("Rank", list(logs.keys()), horizontal=True, key=self._get_key("rank_pick"))
+            st.code(ProcessManager.read_log_tail(logs[rank], lines=80), language="text")
+
+    def _exp_paths(self, exp_name):
+        exp_dir = os.path.join(self.ctx.root_dir, "experiments", "mld", exp_name)
+        return exp_dir, os.path.join(exp_dir, "launcher_config.yaml")
+
+    def _launch(self, cfg_data, exp_dir, yaml_path, exp_name, bs, epoch, group=None, group_limit=None, track=True):
+        """
+        写 launcher_config.yaml 并提交到 GPU 队列，返回 (success, log_path / 错误信息)；bs 是每卡的 BS。
+        track=False 时不交给训练看板、失败也不自动重试 (吞吐探测这种跑几百步就停的任务)。
+        单次训练是 normal，成组提交的 (sweep / 早停 / 探测) 是 background；能自动续跑的才允许被抢占
+        """
         os.makedirs(exp_dir, exist_ok=True)
+        cfg_data = apply_world_size(cfg_data, self.n_gpus)
         save_yaml(cfg_data, yaml_path)
+
+        # 构造真实命令 (多卡时每个 rank 的日志放在实验目录下)
+        rank_dir = None
+        if self.n_gpus > 1:
+            rank_dir = rank_log_dir(exp_dir, datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
+        cmd = mld_train_cmd(self.TRAIN_SCRIPT, yaml_path, self.ctx.assets_file, bs,
+                            n_procs=self.n_gpus, rank_log_dir=rank_dir)
+
+        screen_id = f"train_{exp_name}"[:30]
+        success, log = ProcessManager.submit(cmd, screen_id, self.ctx.root_dir, gpu=self.gpu,
+                                             num_devices=self.n_gpus, group=group, group_limit=group_limit,
+                                             priority="background" if group else "normal", preemptible=track,
+                                             # 正式训练命中 OOM / NaN 就结束、按策略重试；吞吐探测要逐帧读 it/s，日志不压缩进度条
+                                             job_opts={"kill": True} if track else {"compact": False})
+        if success and track:
+            # 交给训练看板做指标采集
+            MetricsStore().track(log, exp_name, "train", max_epochs=int(epoch))
+            # NaN / OOM / dataloader 崩溃时按策略带 RESUME (或减小 BS) 重新排队，见 core/failure_watch.py
+            FailureRecovery().watch(
+                log, lambda cfg, new_bs: self._launch(cfg, exp_dir, yaml_path, exp_name, new_bs, epoch,
+                                                      group=group, group_limit=group_limit),
+                cfg_data, exp_dir, bs)
+        return success, log
+
+    def _run(self, cfg_data, exp_dir, yaml_path):
         save_persistent_state("last_lr", self.lr)
         
-        # 构造真实命令
-        cmd = (
-            f"python -u {self.TRAIN_SCRIPT} "
-            f"--cfg {yaml_path} "
-            f"--cfg_assets {self.ctx.assets_file} "
-            f"--batch_size {self.bs} "
-            f"--nodebug"
-        )
-        
-        screen_id = f"train_{self.exp_name}"[:30]
-        
         # 执行
-        success, log = ProcessManager.run_with_log(cmd, screen_id, self.ctx.root_dir)
+        success, log = self._launch(cfg_data, exp_dir, yaml_path, self.exp_name,
+                                    cfg_data["TRAIN"]["BATCH_SIZE"], self.epoch)
         
         if success:
             self.set_state("last_log_path", log)
             
             # 显示 VSCode 连接提示
+            job = ProcessManager.get_job(log)
             st.markdown("### 🔍 VSCode 监控指令")
-            st.code(f"screen -D -r {screen_id}", language="bash")
-            st.caption("👆 复制上面这行命令到 VSCode 终端，即可看到带进度条的实时界面！")
+            st.code(f"tail -f {log}", language="bash")
+            st.caption(f"👆 复制上面这行命令到 VSCode 终端，即可看到带进度条的实时界面！(PID: {job.pid if job else '?'})")
             
             st.toast("任务启动成功！")
             import time
             time.sleep(0.5)
             st.rerun()
         else:
-            st.error(f"启动失败: {log}")
\ No newline at end of file
+            st.error(f"启动失败: {log}")
+
+    # ================= Sweep 模式 =================
+    def _sweep_trials(self, presets, lambdas, lrs, bss, mode, prefix):
+        """展开成 [(trial 名, 参数 dict), ...]；LAMBDA 留空时用各预设自己的值"""
+        axes = {"preset": presets}
+        if lambdas:
+            axes["lambda"] = lambdas
+        axes["lr"] = lrs
+        axes["bs"] = bss
+        trials = []
+        for params in expand_trials(axes, mode):
+            p = self.PRESETS[params["preset"]]
+            named = {"preset": p["SUFFIX"], **{k: v for k, v in params.items() if k != "preset"}}
+            name = trial_name(prefix, named, self.SWEEP_ABBREV)
+            trials.append((name, {**params, "lambda": params.get("lambda", p["LAMBDA"])}))
+        return trials
+
+    def _render_sweep(self, base_cfg):
+        st.markdown("### 🧪 超参 Sweep")
+        st.caption("每个 trial 单独生成一份 launcher_config.yaml，按并发上限排队提交，名字由参数决定，重复提交会落到同一个目录。")
+
+        keys = list(self.PRESETS.keys())
+        c1, c2 = st.columns(2)
+        with c1:
+            presets = st.multiselect("预设", keys, default=[st.session_state.get("train_preset", keys[0])],
+                                     key=self._get_key("sweep_presets"))
+            lambda_text = st.text_input("LAMBDA_SCENE (逗号分隔，留空 = 预设默认)", "",
+                                        key=self._get_key("sweep_lambdas"))
+            lr_text = st.text_input("LR (逗号分隔)", str(self.lr), key=self._get_key("sweep_lrs"))
+            bs_text = st.text_input("Batch Size (逗号分隔)", str(self.bs), key=self._get_key("sweep_bss"))
+        with c2:
+            mode = st.radio("组合方式", ["grid", "list"], horizontal=True, key=self._get_key("sweep_mode_kind"),
+                            help="grid: 全组合；list: 各轴按位置一一配对")
+            prefix = st.text_input("Sweep 前缀", f"Sweep_{datetime.datetime.now().strftime('%m%d')}",
+                                   key=self._get_key("sweep_prefix"))
+            parallel = st.number_input("最多同时跑几个", 1, 32, 2, key=self._get_key("sweep_parallel"))
+            skip_existing = st.checkbox("跳过已有 launcher_config 的 trial", value=True,
+                                        key=self._get_key("sweep_skip"))
+
+        # Successive Halving：先短跑，再只让排名靠前的 trial 续跑
+        halving = None
+        if st.toggle("✂️ Successive Halving 早停", value=False, key=self._get_key("sweep_halving"),
+                     help="所有 trial 先跑 min_epochs，按指标排名只保留前 1/eta，带 TRAIN.RESUME 续跑，直到跑满 Epochs"):
+            h1, h2, h3, h4 = st.columns(4)
+            halving = {
+                "min_epochs": h1.number_input("首轮 epochs", 1, int(self.epoch), min(10, int(self.epoch)),
+                                              key=self._get_key("halving_min")),
+                "eta": h2.number_input("淘汰系数 eta", 2, 8, 3, key=self._get_key("halving_eta")),
+                "metric": h3.text_input("排名指标", "loss", key=self._get_key("halving_metric")),
+                "mode": h4.selectbox("方向", ["min", "max"], key=self._get_key("halving_mode")),
+            }
+            st.caption(f"轮次预算 (epochs): {rung_budgets(halving['min_epochs'], int(self.epoch), halving['eta'])}")
+
+        try:
+            trials = self._sweep_trials(presets, parse_values(lambda_text, float), parse_values(lr_text, float),
+                                        parse_values(bs_text, int), mode, prefix)
+        except ValueError as e:
+            st.error(f"参数解析失败: {e}")
+            return
+        if not trials:
+            st.info("至少选一个预设，并填好 LR / Batch Size")
+            return
+
+        preview = []
+        for name, params in trials:
+            exp_dir, yaml_path = self._exp_paths(name)
+            preview.append({"trial": name, "preset": params["preset"], "lambda": params["lambda"],
+                            "lr": params["lr"], "bs": params["bs"],
+                            "已存在": "✅" if os.path.exists(yaml_path) else ""})
+        st.dataframe(preview, use_container_width=True, hide_index=True)
+
+        if st.button(f"🚀 提交 {len(trials)} 个 trial", type="primary", use_container_width=True,
+                     key=self._get_key("sweep_run")):
+            self._run_sweep(base_cfg, trials, prefix, int(parallel), skip_existing, halving)
+
+        study = HalvingScheduler().get(self.get_state("halving_study"))
+        if study:
+            self.live_region(self._render_halving_status, run_every=self.LIVE_REFRESH_SEC)(study.study_id)
+            return
+        sweep_logs = self.get_state("sweep_logs", [])
+        if sweep_logs:
+            self.live_region(self._render_sweep_status, run_every=self.LIVE_REFRESH_SEC)(tuple(sweep_logs))
+
+    def _run_sweep(self, base_cfg, trials, prefix, parallel, skip_existing, halving=None):
+        group = f"sweep_{prefix}"
+        launched, skipped, failed = [], 0, []
+        halving_trials = []
+        for name, params in trials:
+            exp_dir, yaml_path = self._exp_paths(name)
+            if skip_existing and os.path.exists(yaml_path):
+                skipped += 1
+                continue
+            p = self.PRESETS[params["preset"]]
+            # Custom 预设用侧边栏里的结构参数
+            if p["SUFFIX"] == "Custom":
+                fusion, loss, just_base = self.fusion, self.loss, self.base
+            else:
+                fusion, loss, just_base = p["FUSION"], p["LOSS"], p["JUST_BASE"]
+            eff = self._scaled(params["lr"], params["bs"])
+            cfg_data = self._build_cfg(base_cfg, name, fusion, loss, just_base,
+                                       params["lambda"], eff["bs"], self.epoch, eff["lr"],
+                                       num_workers=self.num_workers)
+            if halving:
+                halving_trials.append(Trial(name, cfg_data, exp_dir, yaml_path, eff["bs"]))
+                continue
+            success, log = self._launch(cfg_data, exp_dir, yaml_path, name, eff["bs"], self.epoch,
+                                        group=group, group_limit=parallel)
+            if success:
+                launched.append((name, log))
+            else:
+                failed.append(f"{name}: {log}")
+
+        if halving_trials:
+            self._start_halving(prefix, halving_trials, group, parallel, halving)
+        if launched:
+            self.set_state("halving_study", None)
+            self.set_state("sweep_logs", launched)
+            self.set_state("last_log_path", launched[0][1])
+            st.toast(f"已提交 {len(launched)} 个 trial (最多同时 {parallel} 个)")
+        if skipped:
+            st.info(f"跳过了 {skipped} 个已存在的 trial")
+        for msg in failed:
+            st.error(f"启动失败: {msg}")
+
+    def _start_halving(self, prefix, trials, group, parallel, halving):
+        def launch_fn(trial, cfg_data):
+            return self._launch(cfg_data, trial.exp_dir, trial.yaml_path, trial.name, trial.bs,
+                                cfg_data["TRAIN"]["END_EPOCH"], group=group, group_limit=parallel)
+
+        study = HalvingStudy(prefix, trials, launch_fn,
+                             min_epochs=int(halving["min_epochs"]), max_epochs=int(self.epoch),
+                             eta=int(halving["eta"]), metric=halving["metric"], mode=halving["mode"],
+                             record_dir=os.path.join(self.ctx.root_dir, "experiments", "mld"))
+        try:
+            HalvingScheduler().start(study)
+        except RuntimeError as e:
+            st.error(str(e))
+            return
+        self.set_state("halving_study", study.study_id)
+        st.toast(f"Successive Halving 已开始：{len(trials)} 个 trial，预算 {study.budgets}")
+
+    def _render_halving_status(self, study_id):
+        study = HalvingScheduler().get(study_id)
+        st.markdown(f"#### ✂️ Successive Halving · `{study_id}` · {study.status}"
+                    f" · 第 {study.rung + 1}/{len(study.budgets)} 轮")
+        if study.error:
+            st.error(study.error)
+        st.dataframe(study.to_rows(), use_container_width=True, hide_index=True)
+        if study.status == "running" and st.button("⏹️ 取消早停调度", key=self._get_key("halving_cancel")):
+            study.cancel()
+            st.toast("已取消，正在结束还在跑的 trial")
+
+    def _render_sweep_status(self, sweep_logs):
+        rows = []
+        for name, log in sweep_logs:
+            job = ProcessManager.get_job(log)
+            pos = GPUJobQueue().position(log)
+            if pos:
+                status = f"⏳ 排队 #{pos}"
+            elif job:
+                status = job.status + (f" (exit {job.exit_code})" if job.exit_code is not None else "")
+            else:
+                status = "-"
+            rows.append({"trial": name, "状态": status, "日志": os.path.basename(log)})
+        st.markdown("#### 📋 本次 Sweep")
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+
+    # ================= DataLoader 吞吐探测 =================
+    def _render_autotune(self, new_cfg, exp_dir, yaml_path):
+        st.caption("每个组合跑一个只有几百步的短训练，按日志里的 it/s 换算 samples/s，挑最快且稳定的一组。"
+                   "BATCH_SIZE 指每张卡的 BS；探测用的临时实验目录结束后自动删除。")
+        c1, c2, c3 = st.columns(3)
+        workers_text = c1.text_input("NUM_WORKERS (逗号分隔)", "2, 4, 8", key=self._get_key("at_workers"))
+        bs_text = c2.text_input("BATCH_SIZE (逗号分隔)", f"{self.bs}, {self.bs * 2}", key=self._get_key("at_bss"))
+        max_steps = c3.number_input("每个探测跑几步", 20, 5000, 200, step=20, key=self._get_key("at_steps"))
+        d1, d2, d3 = st.columns(3)
+        timeout = d1.number_input("单个探测超时 (秒)", 30, 3600, 600, step=30, key=self._get_key("at_timeout"))
+        parallel = d2.number_input("最多同时探测几个", 1, 32, max(1, len(GPUJobQueue().devices) // self.n_gpus),
+                                   key=self._get_key("at_parallel"), help="同时在跑的探测 worker 总数还受 CPU 核数限制")
+        auto_launch = d3.checkbox("探测完直接用最佳设置启动", value=False, key=self._get_key("at_auto"))
+
+        try:
+            grid = expand_trials({"w": parse_values(workers_text, int), "bs": parse_values(bs_text, int)})
+        except ValueError as e:
+            st.error(f"参数解析失败: {e}")
+            return
+        if st.button(f"🔬 开始探测 ({len(grid)} 个组合)", disabled=not grid, key=self._get_key("at_run")):
+            self._start_autotune(new_cfg, exp_dir, yaml_path, grid, max_steps, timeout, parallel, auto_launch)
+
+        study = ProbeScheduler().get(self.get_state("autotune_study"))
+        if study:
+            self.live_region(self._render_autotune_status, run_every=self.LIVE_REFRESH_SEC)(study.study_id)
+
+    def _start_autotune(self, new_cfg, exp_dir, yaml_path, grid, max_steps, timeout, parallel, auto_launch):
+        study_id = f"autotune_{datetime.datetime.now().strftime('%m%d_%H%M%S')}"
+        probes, dirs = [], {}
+        for params in grid:
+            probe = Probe(trial_name("", params), params["w"], params["bs"], world=self.n_gpus)
+            probes.append(probe)
+            dirs[probe.name] = self._exp_paths(f"_probe_{study_id}_{probe.name}")
+
+        def launch_fn(probe):
+            probe_dir, probe_yaml = dirs[probe.name]
+            cfg = copy.deepcopy(new_cfg)
+            cfg["NAME"] = os.path.basename(probe_dir)
+            cfg["TRAIN"]["BATCH_SIZE"] = probe.batch_size
+            cfg["TRAIN"]["NUM_WORKERS"] = probe.num_workers
+            cfg["TRAIN"]["END_EPOCH"] = 1
+            return self._launch(cfg, probe_dir, probe_yaml, cfg["NAME"], probe.batch_size, 1,
+                                group=study_id, track=False)
+
+        on_finish = None
+        if auto_launch:
+            exp_name = self.exp_name
+
+            def on_finish(study):
+                if not study.best:
+                    return
+                cfg = copy.deepcopy(new_cfg)
+                cfg["TRAIN"]["BATCH_SIZE"] = study.best.batch_size
+                cfg["TRAIN"]["NUM_WORKERS"] = study.best.num_workers
+                success, log = self._launch(cfg, exp_dir, yaml_path, exp_name, study.best.batch_size, self.epoch)
+                if success:
+                    # 后台线程里拿不到 session，直接登记到本模块名下，任务列表里能找到
+                    JobRegistry().attach(log, self._key_prefix)
+
+        study = ProbeStudy(study_id, probes, launch_fn, max_steps=max_steps, timeout=timeout, parallel=parallel,
+                           cleanup_dirs=[d for d, _ in dirs.values()],
+                           record_dir=os.path.join(self.ctx.root_dir, "experiments", "mld"), on_finish=on_finish)
+        try:
+            ProbeScheduler().start(study)
+        except RuntimeError as e:
+            st.error(str(e))
+            return
+        self.set_state("autotune_study", study_id)
+        st.toast(f"🔬 吞吐探测已开始：{len(probes)} 个组合")
+
+    def _render_autotune_status(self, study_id):
+        study = ProbeScheduler().get(study_id)
+        done = sum(1 for p in study.probes if p.status not in ("waiting", "running"))
+        st.markdown(f"#### 🔬 `{study_id}` · {study.status} · {done}/{len(study.probes)}")
+        if study.error:
+            st.error(study.error)
+        st.dataframe(study.to_rows(), use_container_width=True, hide_index=True)
+        if study.status == "running" and st.button("⏹️ 取消探测", key=self._get_key("at_cancel")):
+            study.cancel()
+            st.toast("已取消，正在结束还在跑的探测")
+        best = study.best
+        if study.status == "finished" and not best:
+            st.warning("没有一组探测稳定跑完，看看各探测的日志 (OOM / dataloader 崩溃？)")
+        if best:
+            st.success(f"🏆 NUM_WORKERS={best.num_workers} · BATCH_SIZE={best.batch_size} · "
+                       f"{best.result['samples_per_s']:.1f} samples/s")
+            if st.button("✅ 采用这组设置", key=self._get_key("at_apply")):
+                # 侧边栏组件已经渲染过了，记下来整页重跑，由 render_sidebar 在组件创建之前填进去
+                self.set_state("apply_probe", (best.num_workers, best.batch_size))
+                st.rerun(scope="app")
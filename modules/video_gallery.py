@@ -5,6 +5,9 @@ import math
 from core.base import BaseModule
 
 class VideoGalleryModule(BaseModule):
+    # 画廊多久重新扫描一次目录 (秒)
+    GALLERY_REFRESH_SEC = 30
+
     def render_sidebar(self):
         st.subheader("📂 目录导航器")
         
@@ -68,6 +71,10 @@ class VideoGalleryModule(BaseModule):
             st.error(f"路径不存在: {current_path}")
             return
 
+        # 画廊整体是一个局部刷新区域：翻页只重跑这一块，新视频也会定时出现
+        self.live_region(self._render_gallery, run_every=self.GALLERY_REFRESH_SEC)(current_path)
+
+    def _render_gallery(self, current_path):
         st.subheader(f"🎬 视频画廊")
         
         # 1. 扫描文件
@@ -93,10 +100,9 @@ class VideoGalleryModule(BaseModule):
                 f"第几页 (共 {total_pages} 页, {total_files} 个视频)", 
                 min_value=1, max_value=total_pages, value=current_page, key=self._get_key("gallery_pager")
             )
-            # 保存页码状态，防止刷新重置
+            # 保存页码状态，防止刷新重置 (本轮直接用新页码，不用再整页 rerun)
             if current_page != self.get_state("gallery_page"):
                 self.set_state("gallery_page", current_page)
-                st.rerun()
 
         st.divider()
 
@@ -0,0 +1,52 @@
+# tests/conftest.py
+import os
+import sys
+import shutil
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def _shutdown_singletons():
+    """
+    上一个用例留下的后台线程 (宿主线程 host-*、采样、回收) 要先收干净，否则它们会碰到下一个用例的半成品单例：
+    先停常驻 worker 的回收和 GPU 队列 (不再派发)，再结束所有任务并等宿主线程跑完 on_exit，最后停采样
+    """
+    from core.worker_pool import WarmWorkerPool
+    from core.gpu_queue import GPUJobQueue
+    from core.supervisor import JobSupervisor
+    from core.telemetry import ResourceSampler
+    for cls in (WarmWorkerPool, GPUJobQueue, JobSupervisor, ResourceSampler):
+        if cls._instance is not None:
+            cls._instance.shutdown()
+
+
+def _reset_singletons():
+    """core 里的单例都挂在 _instance 上，每个用例重新建一份"""
+    import core
+    import pkgutil
+    for info in pkgutil.iter_modules(core.__path__):
+        module = sys.modules.get(f"core.{info.name}")
+        if module is None:
+            continue
+        for obj in vars(module).values():
+            if isinstance(obj, type) and "_instance" in vars(obj):
+                obj._instance = None
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """
+    临时工作目录：配置从仓库复制一份 (logs/ 和任务表都落在这里)，
+    用假 GPU 顶替 nvidia-smi，退出时清掉单例
+    """
+    os.makedirs(tmp_path / "configs")
+    shutil.copy(os.path.join(REPO_ROOT, "configs", "global_config.yaml"), tmp_path / "configs")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PYTHONPATH", REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    _reset_singletons()
+    yield tmp_path
+    _shutdown_singletons()
+    _reset_singletons()
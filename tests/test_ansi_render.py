@@ -0,0 +1,54 @@
+# tests/test_ansi_render.py
+"""ANSI -> HTML 缓存：颜色状态跨行延续，缓存命中时也不能丢"""
+from core.ansi_render import AnsiHtmlCache, advance_sgr_state
+from core.log_tailer import LogTailer
+
+RED = '<span style="color: #cd0000">'
+
+
+def _write(path, data):
+    with open(path, "ab") as f:
+        f.write(data.encode("utf-8"))
+
+
+def test_advance_sgr_state():
+    assert advance_sgr_state([], "\x1b[1m\x1b[31mx") == ["1", "31"]
+    assert advance_sgr_state(["31"], "a\x1b[0mb") == []
+    assert advance_sgr_state(["31"], "a\x1b[mb") == []
+    assert advance_sgr_state(["31"], "plain") == ["31"]
+
+
+def test_color_carries_into_following_lines_and_appends(tmp_path):
+    log = str(tmp_path / "c.log")
+    _write(log, "\x1b[31mred starts\nstill red\n")
+    cache = AnsiHtmlCache()
+    rows = cache.render_lines(log)
+    assert rows[1][1].startswith(RED) and "still red" in rows[1][1]
+
+    _write(log, "more red\x1b[0m\nplain\n")
+    rows = cache.render_lines(log)
+    assert [offset for offset, _ in rows] == [0, 16, 26, 39]
+    assert rows[2][1].startswith(RED)
+    assert rows[3][1] == "plain"
+
+
+def test_cached_line_is_reconverted_when_incoming_color_changes(tmp_path):
+    log = str(tmp_path / "w.log")
+    _write(log, "\x1b[31mred\nsecond\n")
+    cache = AnsiHtmlCache()
+    # 先只看最后一行：窗口里没有前一行，按无色转换并缓存
+    assert cache.render_lines(log, lines=1)[0][1] == "second"
+    # 窗口扩大后前一行把颜色带进来，缓存里的无色版本不能再用
+    assert cache.render_lines(log, lines=2)[1][1].startswith(RED)
+    assert cache.render_lines(log, lines=1)[0][1] == "second"
+
+
+def test_rewritten_line_at_same_offset_is_reconverted(tmp_path):
+    log = str(tmp_path / "p.log")
+    _write(log, "step 1")
+    cache = AnsiHtmlCache()
+    assert cache.render(log) == "step 1"
+    _write(log, "0\n")
+    assert cache.render(log) == "step 10"
+    assert cache.render(str(tmp_path / "missing.log")) is None
+    LogTailer().forget(log)
@@ -0,0 +1,36 @@
+# tests/test_autotune.py
+"""吞吐探测：读数要来自没压缩过的进度条，读数不够和进程挂掉要分开"""
+import time
+import pytest
+import core.autotune as autotune
+from core.autotune import Probe, ProbeStudy, read_rates
+from core.log_compactor import LogCompactor
+
+FRAMES = "".join(f"\rEpoch 0:  {i // 2}%|#   | {i}/200 [00:01<00:09, 20.{i % 10}it/s, loss=1.2]"
+                 for i in range(1, 201)) + "\n"
+
+
+def test_read_rates_sees_every_frame_of_an_uncompressed_log(tmp_path):
+    log = tmp_path / "probe.log"
+    log.write_text(FRAMES)
+    assert len(read_rates(str(log))) == 200
+
+
+def test_read_rates_prefers_raw_log(tmp_path):
+    compactor = LogCompactor(interval=5)
+    (tmp_path / "probe.log").write_bytes(compactor.feed(FRAMES.encode()) + compactor.close())
+    assert len(read_rates(str(tmp_path / "probe.log"))) < 3
+    (tmp_path / "probe.raw.log").write_text(FRAMES)
+    assert len(read_rates(str(tmp_path / "probe.log"))) == 200
+
+
+@pytest.mark.parametrize("state, expected", [("running", "too_few"), ("finished", "too_few"), ("failed", "failed")])
+def test_too_few_readings_is_not_a_failure(tmp_path, monkeypatch, state, expected):
+    log = tmp_path / "probe.log"
+    log.write_text("\rEpoch 0:  1%|#   | 200/200 [00:01<00:09, 20.0it/s]\n")
+    monkeypatch.setattr(autotune.ProcessManager, "job_state", staticmethod(lambda p: state))
+    monkeypatch.setattr(autotune.ProcessManager, "stop_job", staticmethod(lambda p: True))
+    probe = Probe("p", 2, 8)
+    probe.log_path, probe.started = str(log), time.time()
+    assert ProbeStudy("s", [probe], None, max_steps=200)._poll(probe)
+    assert probe.status == expected
@@ -0,0 +1,63 @@
+# tests/test_distributed.py
+"""多卡训练的命令 / 配置生成，不需要 GPU"""
+import math
+import pytest
+from core.commands import mld_train_cmd
+from core.distributed import apply_world_size, scale_hparams, rank_logs
+
+
+def test_single_gpu_runs_plain_python():
+    cmd = mld_train_cmd("train.py", "cfg.yaml", "assets.yaml", 32)
+    assert cmd == "python -u train.py --cfg cfg.yaml --cfg_assets assets.yaml --batch_size 32 --nodebug"
+
+
+def test_multi_gpu_uses_torchrun_with_rank_logs():
+    cmd = mld_train_cmd("train.py", "cfg.yaml", "assets.yaml", 16, n_procs=4, rank_log_dir="/exp/rank_logs/x")
+    assert cmd.startswith("python -u -m torch.distributed.run --standalone --nnodes 1 --nproc_per_node 4 ")
+    assert "--log_dir /exp/rank_logs/x --tee 3 " in cmd
+    assert cmd.endswith("train.py --cfg cfg.yaml --cfg_assets assets.yaml --batch_size 16 --nodebug")
+
+
+def test_multi_gpu_without_rank_log_dir():
+    cmd = mld_train_cmd("train.py", "cfg.yaml", "assets.yaml", 16, n_procs=2)
+    assert "--log_dir" not in cmd and "--nproc_per_node 2 " in cmd
+
+
+@pytest.mark.parametrize("world, devices", [(1, [0]), (4, [0, 1, 2, 3]), (0, [0])])
+def test_apply_world_size_rewrites_device_list(world, devices):
+    cfg = {"DEVICE": [3], "TRAIN": {"BATCH_SIZE": 8}}
+    new = apply_world_size(cfg, world)
+    assert new["DEVICE"] == devices
+    # 不改动原配置
+    assert cfg["DEVICE"] == [3]
+
+
+@pytest.mark.parametrize("rule, lr, bs", [
+    ("none", 1e-4, 32),
+    ("linear", 4e-4, 32),
+    ("sqrt", 2e-4, 32),
+    ("keep_global", 1e-4, 8),
+])
+def test_scale_rules(rule, lr, bs):
+    out = scale_hparams(1e-4, 32, 4, rule)
+    assert math.isclose(out["lr"], lr)
+    assert out["bs"] == bs
+    assert out["global_bs"] == bs * 4
+
+
+def test_scale_from_other_base_world_and_floor():
+    assert math.isclose(scale_hparams(2e-4, 32, 4, "linear", base_world=2)["lr"], 4e-4)
+    assert scale_hparams(1e-4, 2, 8, "keep_global")["bs"] == 1
+    with pytest.raises(ValueError):
+        scale_hparams(1e-4, 32, 2, "cubic")
+
+
+def test_rank_logs_picks_latest_attempt(tmp_path):
+    for attempt in (0, 1):
+        for rank in (0, 1):
+            d = tmp_path / "run" / f"attempt_{attempt}" / str(rank)
+            d.mkdir(parents=True)
+            (d / "stdout.log").write_text(f"a{attempt}")
+    logs = rank_logs(str(tmp_path))
+    assert list(logs) == [0, 1]
+    assert all("attempt_1" in p for p in logs.values())
@@ -0,0 +1,32 @@
+# tests/test_failure_watch.py
+"""失败特征：只有要求了 kill 的任务才会被结束并判失败，其它任务只记警告"""
+from core.failure_watch import FailureWatcher, FAILURE_PATTERNS
+from core.process_mgr import ProcessManager
+
+
+def _run(cmd, job_opts=None):
+    ok, log = ProcessManager.run_with_log(cmd, "fw", ".", job_opts=job_opts)
+    job = ProcessManager.get_job(log)
+    assert job.done.wait(20)
+    return job, open(log, encoding="utf-8").read()
+
+
+def test_watcher_matches_once_across_chunks():
+    watcher = FailureWatcher(FAILURE_PATTERNS)
+    assert watcher.feed(b"step 1\nRuntimeError: CUDA out of mem") is None
+    name, line = watcher.feed(b"ory. Tried to allocate\n")
+    assert name == "cuda_oom" and "CUDA out of memory" in line
+    assert watcher.feed(b"loss = nan\n") is None
+
+
+def test_match_without_kill_is_only_a_warning(workspace):
+    job, text = _run("echo 'CUDA out of memory, retrying at lower res'; exit 0")
+    assert job.status == "finished"
+    assert job.failure is None
+    assert "只记录，不结束任务" in text
+
+
+def test_match_with_kill_fails_the_job(workspace):
+    job, text = _run("echo 'CUDA out of memory'; sleep 30", job_opts={"kill": True})
+    assert job.status == "failed"
+    assert job.failure.startswith("cuda_oom:")
@@ -0,0 +1,155 @@
+# tests/test_gpu_queue.py
+"""GPU 队列：用 fake_devices 顶替 nvidia-smi，测卡槽 / 派发 / 释放、优先级和抢占"""
+import threading
+import yaml
+from core.gpu_queue import GPUJobQueue, FakeDeviceProbe
+from core.process_mgr import ProcessManager
+
+TIMEOUT = 15
+
+
+def _queue(devices, **sched):
+    queue = GPUJobQueue()
+    queue.configure(sched_cfg={"fake_devices": devices, "slots_per_device": 1, **sched})
+    return queue
+
+
+def _submit(cmd, name, root, **kw):
+    ok, log = ProcessManager.submit(cmd, name, str(root), **kw)
+    assert ok, log
+    return log
+
+
+def _until(queue, log_path, state):
+    """派发可能发生在别的线程 (上一个任务的退出回调) 里，等队列事件而不是直接断言"""
+    assert queue.wait_until(lambda: ProcessManager.job_state(log_path) == state, TIMEOUT), \
+        f"{log_path}: {ProcessManager.job_state(log_path)} != {state}"
+
+
+def _env_of(log):
+    return ProcessManager.get_job(log).env.get("CUDA_VISIBLE_DEVICES")
+
+
+def test_fake_devices_from_global_config(workspace):
+    path = workspace / "configs" / "global_config.yaml"
+    cfg = yaml.safe_load(path.read_text(encoding="utf-8"))
+    cfg["scheduler"]["fake_devices"] = ["0", "1"]
+    cfg["scheduler"]["device_slots"] = {"1": 2}
+    path.write_text(yaml.safe_dump(cfg, allow_unicode=True), encoding="utf-8")
+    queue = GPUJobQueue()
+    assert isinstance(queue.probe, FakeDeviceProbe)
+    assert queue.slots == {"0": 1, "1": 2}
+
+
+def test_dispatch_fills_slots_then_queues_and_releases(workspace):
+    queue = _queue(["0", "1"])
+    a = _submit("sleep 30", "a", workspace)
+    b = _submit("sleep 30", "b", workspace)
+    c = _submit("echo c", "c", workspace)
+    _until(queue, a, "running")
+    _until(queue, b, "running")
+    assert {_env_of(a), _env_of(b)} == {"0", "1"}
+    assert queue.snapshot()["usage"] == {"0": 1, "1": 1}
+    assert ProcessManager.job_state(c) == "queued" and queue.position(c) == 1
+
+    freed = _env_of(a)
+    assert ProcessManager.stop_job(a)
+    _until(queue, c, "finished")
+    assert _env_of(c) == freed
+    assert ProcessManager.stop_job(b)
+    assert queue.wait_until(lambda: queue.snapshot()["usage"] == {"0": 0, "1": 0}, TIMEOUT)
+
+
+def test_pinned_device_and_multi_device_job(workspace):
+    queue = _queue(["0", "1"])
+    pinned = _submit("echo p", "pinned", workspace, gpu="1")
+    _until(queue, pinned, "finished")
+    assert _env_of(pinned) == "1"
+    ddp = _submit("echo ddp", "ddp", workspace, num_devices=2)
+    _until(queue, ddp, "finished")
+    assert _env_of(ddp) == "0,1"
+    assert not ProcessManager.submit("x", "bad", str(workspace), gpu="7")[0]
+
+
+def test_cancel_pending_job(workspace):
+    queue = _queue(["0"])
+    running = _submit("sleep 30", "running", workspace)
+    pending = _submit("echo never", "pending", workspace)
+    _until(queue, running, "running")
+    assert ProcessManager.job_state(pending) == "queued"
+    assert ProcessManager.stop_job(pending)
+    assert ProcessManager.job_state(pending) == "cancelled"
+    assert ProcessManager.stop_job(running)
+    _until(queue, running, "killed")
+    assert queue.snapshot()["usage"] == {"0": 0}
+    assert ProcessManager.job_state(pending) == "cancelled"
+
+
+def test_group_limit(workspace):
+    queue = _queue(["0", "1"])
+    first = _submit("sleep 30", "g1", workspace, group="sweep", group_limit=1)
+    second = _submit("echo g2", "g2", workspace, group="sweep", group_limit=1)
+    _until(queue, first, "running")
+    # 第二张卡空着，但同组已经满了
+    assert ProcessManager.job_state(second) == "queued"
+    assert ProcessManager.stop_job(first)
+    _until(queue, second, "finished")
+
+
+def test_higher_priority_dispatches_first(workspace):
+    queue = _queue(["0"], preemption=False)
+    blocker = _submit("sleep 30", "blocker", workspace)
+    low = _submit("echo low", "low", workspace, priority="background")
+    high = _submit("echo high", "high", workspace, priority="interactive")
+    _until(queue, blocker, "running")
+    assert queue.position(high) == 1 and queue.position(low) == 2
+    assert ProcessManager.stop_job(blocker)
+    _until(queue, low, "finished")
+    assert queue.find_by_log(high).dispatch_seq < queue.find_by_log(low).dispatch_seq
+
+
+def test_preemption_only_hits_preemptible_lower_priority(workspace):
+    queue = _queue(["0"], kill_grace_sec=1)
+    guarded = _submit("sleep 30", "guarded", workspace, priority="background")
+    high = _submit("echo high", "high", workspace, priority="interactive")
+    _until(queue, guarded, "running")
+    assert ProcessManager.job_state(high) == "queued"
+    assert queue.find_by_log(guarded).preempted_by is None
+    assert ProcessManager.stop_job(guarded)
+    _until(queue, high, "finished")
+
+    victim = _submit("sleep 30", "victim", workspace, priority="background", preemptible=True)
+    _until(queue, victim, "running")
+    high = _submit("echo high", "high2", workspace, priority="interactive")
+    _until(queue, victim, "preempted")
+    assert "preempted:" in ProcessManager.get_job(victim).failure
+    _until(queue, high, "finished")
+    assert queue.wait_until(lambda: queue.snapshot()["usage"] == {"0": 0}, TIMEOUT)
+
+
+def test_preempt_victim_that_is_still_launching(workspace, monkeypatch):
+    queue = _queue(["0"], kill_grace_sec=1)
+    original = ProcessManager.run_with_log
+    dispatched, release = threading.Event(), threading.Event()
+
+    def slow_run_with_log(command, task_name, *args, **kwargs):
+        if task_name == "victim":
+            # 卡槽已经记到 victim 头上，进程还没拉起来
+            dispatched.set()
+            release.wait(10)
+        return original(command, task_name, *args, **kwargs)
+
+    monkeypatch.setattr(ProcessManager, "run_with_log", staticmethod(slow_run_with_log))
+    submitter = threading.Thread(target=_submit, args=("sleep 30", "victim", workspace),
+                                 kwargs={"priority": "background", "preemptible": True})
+    submitter.start()
+    assert dispatched.wait(10)
+    victim = queue.snapshot()["jobs"][0]["log_path"]
+
+    high = _submit("echo high", "high", workspace, priority="interactive")
+    assert ProcessManager.job_state(high) == "queued"
+    release.set()
+    submitter.join(TIMEOUT)
+
+    _until(queue, victim, "preempted")
+    _until(queue, high, "finished")
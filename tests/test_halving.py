@@ -0,0 +1,80 @@
+# tests/test_halving.py
+"""Successive Halving：预算、按分数淘汰、晋级的 trial 带 TRAIN.RESUME 续跑；不真正起进程"""
+import os
+from core import halving
+from core.halving import HalvingStudy, Trial, rung_budgets, latest_checkpoint
+from core.process_mgr import ProcessManager
+
+
+def test_rung_budgets():
+    assert rung_budgets(10, 100, 3) == [10, 30, 90, 100]
+    assert rung_budgets(10, 90, 3) == [10, 30, 90]
+    assert rung_budgets(0, 5, 2) == [1, 2, 4, 5]
+
+
+def _study(workspace, monkeypatch, scores, states=None):
+    """scores: trial 名 -> 分数 (None 表示日志里解析不出指标)；states: 日志路径 -> job_state"""
+    trials = []
+    for name in scores:
+        exp_dir = workspace / "exps" / name
+        os.makedirs(exp_dir / "checkpoints")
+        trials.append(Trial(name, {"TRAIN": {"END_EPOCH": 1}}, str(exp_dir), str(exp_dir / "cfg.yaml"), bs=32))
+    launches = []
+
+    def launch_fn(trial, cfg):
+        launches.append((trial.name, cfg))
+        # 假装训练跑到了 END_EPOCH，存下 checkpoint
+        ckpt_dir = os.path.join(trial.exp_dir, "checkpoints")
+        open(os.path.join(ckpt_dir, f"epoch={cfg['TRAIN']['END_EPOCH'] - 1}.ckpt"), "w").close()
+        return True, f"{trial.name}_{len(launches)}.log"
+
+    states = states or {}
+    monkeypatch.setattr(ProcessManager, "job_state",
+                        staticmethod(lambda log_path: states.get(log_path, "finished")))
+    monkeypatch.setattr(halving.HalvingStudy, "POLL_SEC", 0)
+    study = HalvingStudy("study", trials, launch_fn, min_epochs=10, max_epochs=100, eta=3,
+                         scorer=lambda t: scores[t.name], record_dir=str(workspace / "records"))
+    return study, {t.name: t for t in trials}, launches
+
+
+def test_bottom_fraction_is_stopped_and_survivors_resume(workspace, monkeypatch):
+    scores = {f"t{i}": float(i) for i in range(8)}
+    scores["t8"] = None
+    study, trials, launches = _study(workspace, monkeypatch, scores)
+    study._run()
+
+    assert study.status == "finished"
+    # 9 -> 3 -> 1 -> 1，每轮的预算依次是 10 / 30 / 90 / 100
+    assert [(name, cfg["TRAIN"]["END_EPOCH"]) for name, cfg in launches[9:]] == \
+        [("t0", 30), ("t1", 30), ("t2", 30), ("t0", 90), ("t0", 100)]
+    assert all("RESUME" not in cfg["TRAIN"] for _, cfg in launches[:9])
+    # 续跑的是上一轮存下的最新 checkpoint (latest_checkpoint 按文件名里的 epoch 挑)
+    assert launches[9][1]["TRAIN"]["RESUME"].endswith("epoch=9.ckpt")
+    assert launches[12][1]["TRAIN"]["RESUME"].endswith("epoch=29.ckpt")
+    assert launches[13][1]["TRAIN"]["RESUME"].endswith("epoch=89.ckpt")
+    assert latest_checkpoint(trials["t0"].exp_dir).endswith("epoch=99.ckpt")
+
+    assert trials["t0"].status == "done"
+    assert trials["t1"].status == trials["t2"].status == "stopped"
+    assert all(trials[f"t{i}"].status == "stopped" for i in range(3, 9))
+    assert [h[1] for h in trials["t0"].history] == [10, 30, 90, 100]
+    assert os.path.exists(workspace / "records" / "study_halving.json")
+
+
+def test_unscored_trials_rank_last(workspace, monkeypatch):
+    study, trials, _ = _study(workspace, monkeypatch, {"a": None, "b": 0.9, "c": 0.1})
+    study.mode = "max"
+    study.budgets = [10, 20]
+    study._run()
+    assert [row["trial"] for row in study.to_rows()] == ["b", "c", "a"]
+    assert trials["b"].status == "done"
+    assert trials["a"].status == trials["c"].status == "stopped"
+
+
+def test_failed_trial_is_dropped_before_ranking(workspace, monkeypatch):
+    study, trials, launches = _study(workspace, monkeypatch, {"a": 0.1, "b": 0.2, "c": 0.3},
+                                     states={"a_1.log": "failed"})
+    study.budgets = [10, 20]
+    study._run()
+    assert trials["a"].status == "failed"
+    assert [name for name, _ in launches[3:]] == ["b"]
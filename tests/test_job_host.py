@@ -0,0 +1,19 @@
+# tests/test_job_host.py
+"""宿主进程：没有输出、很快退出的任务也要拿到真实的退出码"""
+import sys
+import json
+import subprocess
+from core import job_host
+from core.supervisor import APP_ROOT
+
+
+def test_quiet_fast_command_keeps_its_exit_code(tmp_path):
+    for i in range(10):
+        log_path = str(tmp_path / f"quiet_{i}.log")
+        spec = {"command": f"mkdir {tmp_path}/d{i} && touch {tmp_path}/d{i}/x",
+                "root_dir": str(tmp_path), "log_path": log_path, "watch": False}
+        with open(job_host.spec_path(log_path), "w", encoding="utf-8") as f:
+            json.dump(spec, f)
+        subprocess.run([sys.executable, "-m", "core.job_host", job_host.spec_path(log_path)],
+                       cwd=APP_ROOT, check=True, timeout=30)
+        assert job_host.read_state(log_path)["exit_code"] == 0
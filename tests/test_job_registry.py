@@ -0,0 +1,54 @@
+# tests/test_job_registry.py
+"""服务重启之后的任务对账：任务由独立的宿主进程托管，启动它的进程退出后任务还在"""
+import os
+import sys
+import time
+import subprocess
+from core.job_registry import JobRegistry
+from core.process_mgr import ProcessManager
+from core.job_host import read_state
+
+LAUNCH = ("from core.process_mgr import ProcessManager\n"
+          "ok, log = ProcessManager.run_with_log({cmd!r}, 'survivor', '.')\n"
+          "print(log)\n")
+
+
+def _launch_in_other_process(cmd):
+    """模拟一次 Streamlit 生命周期：在子进程里提交任务，然后子进程直接退出"""
+    out = subprocess.run([sys.executable, "-c", LAUNCH.format(cmd=cmd)],
+                         capture_output=True, text=True, timeout=60, check=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+def _wait(predicate, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_job_survives_restart_and_can_be_stopped(workspace):
+    log_path = _launch_in_other_process("for i in $(seq 1 300); do echo step $i; sleep 0.1; done")
+
+    # 新进程里第一次拿任务表时对账
+    row = JobRegistry().get(log_path)
+    assert row["status"] == "orphaned"
+    assert JobRegistry._pid_alive(row["pid"])
+    # 启动它的进程已经退出，日志还在往下写
+    size = os.path.getsize(log_path)
+    assert _wait(lambda: os.path.getsize(log_path) > size)
+
+    assert ProcessManager.stop_job(log_path)
+    assert _wait(lambda: not JobRegistry._pid_alive(row["pid"]))
+    assert JobRegistry().get(log_path)["status"] == "killed"
+
+
+def test_job_finished_during_restart_is_settled_from_state(workspace):
+    log_path = _launch_in_other_process("echo done; exit 3")
+    assert _wait(lambda: read_state(log_path).get("end_time"))
+
+    row = JobRegistry().get(log_path)
+    assert row["status"] == "failed"
+    assert row["exit_code"] == 3
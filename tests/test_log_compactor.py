@@ -0,0 +1,59 @@
+# tests/test_log_compactor.py
+"""进度条压缩：\r 帧只留最后一帧 + 按时间抽样，跨 chunk 的 UTF-8 / 控制序列不被拆坏"""
+from core.log_compactor import LogCompactor
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _frame(epoch, pct):
+    return f"Epoch {epoch}: {pct:3d}%|####| {pct}/100 [00:01<00:01, 9.8it/s, loss=0.5]"
+
+
+def _run(chunks, clock=None, interval=5.0):
+    c = LogCompactor(interval=interval, clock=clock or _Clock())
+    out = b"".join(c.feed(chunk) for chunk in chunks) + c.close()
+    return out.decode("utf-8").splitlines()
+
+
+def test_plain_lines_pass_through():
+    assert _run([b"hello\nworld\n", b"no newline at end"]) == ["hello", "world", "no newline at end"]
+
+
+def test_carriage_return_frames_are_sampled_by_interval():
+    clock = _Clock()
+    c = LogCompactor(interval=5.0, clock=clock)
+    out = []
+    for pct in range(0, 100, 10):
+        clock.now = pct / 10          # 每帧间隔 1 秒
+        out.append(c.feed(("\r" + _frame(0, pct)).encode("utf-8")))
+    clock.now = 10
+    out.append(c.feed(("\r" + _frame(0, 100) + "\n").encode("utf-8")))
+    out.append(c.close())
+    lines = b"".join(out).decode("utf-8").splitlines()
+    # 一帧在下一个 \r 到来时才算结束：第 1 秒结束的 0%、第 6 秒结束的 50%、换行收尾的 100%
+    assert lines == [_frame(0, 0), _frame(0, 50), _frame(0, 100)]
+
+
+def test_new_bar_flushes_last_frame_of_previous_bar():
+    chunks = [("\r" + _frame(0, p)).encode("utf-8") for p in (0, 50, 99)]
+    chunks.append(("\r" + _frame(1, 0)).encode("utf-8"))
+    lines = _run(chunks)
+    assert lines == [_frame(0, 0), _frame(0, 99), _frame(1, 0)]
+
+
+def test_utf8_and_control_sequences_split_across_chunks():
+    data = ("训练开始\r\n" + "\x1b[32m绿色\x1b[0m\n").encode("utf-8")
+    # 逐字节喂进去：多字节字符、\r\n、ESC 序列都会被切开
+    lines = _run([data[i:i + 1] for i in range(len(data))])
+    assert lines == ["训练开始", "\x1b[32m绿色\x1b[0m"]
+
+
+def test_cursor_controls_are_dropped_and_cr_lf_is_one_line_break():
+    lines = _run([b"\x1b[?25lstep 1\x1b[K\r", b"\nstep 2\x1b[?25h\n"])
+    assert lines == ["step 1", "step 2"]
@@ -0,0 +1,54 @@
+# tests/test_log_stream.py
+"""日志推送服务：令牌、lines 参数和跨域来源的校验"""
+import os
+import socket
+import http.client
+import pytest
+from core.log_stream import LogStreamServer
+
+
+@pytest.fixture
+def server(workspace):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    srv = LogStreamServer()
+    srv.port = port
+    assert srv.host == "127.0.0.1"
+    assert srv.ensure_started()
+    os.makedirs("logs", exist_ok=True)
+    log = os.path.abspath("logs/demo.log")
+    with open(log, "w") as f:
+        f.write("hello\n")
+    yield srv, log
+    srv._httpd.shutdown()
+
+
+def _get(srv, path, origin=None):
+    conn = http.client.HTTPConnection(srv.host, srv.port, timeout=5)
+    conn.request("GET", path, headers={"Origin": origin} if origin else {})
+    resp = conn.getresponse()
+    headers = dict(resp.getheaders())
+    conn.close()
+    return resp.status, headers
+
+
+def test_requires_token(server):
+    srv, log = server
+    assert _get(srv, f"/stream?path={log}")[0] == 403
+    assert _get(srv, f"/stream?path={log}&token=wrong")[0] == 403
+
+
+def test_rejects_bad_lines(server):
+    srv, log = server
+    assert _get(srv, f"/stream?path={log}&lines=abc&token={srv.token}")[0] == 400
+
+
+def test_no_wildcard_origin(server):
+    srv, log = server
+    status, headers = _get(srv, f"/stream?path={log}&lines=99999&token={srv.token}",
+                           origin="http://127.0.0.1:8501")
+    assert status == 200
+    assert headers.get("Access-Control-Allow-Origin") == "http://127.0.0.1:8501"
+    _, headers = _get(srv, f"/stream?path={log}&token={srv.token}", origin="https://evil.example")
+    assert "Access-Control-Allow-Origin" not in headers
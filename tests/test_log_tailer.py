@@ -0,0 +1,70 @@
+# tests/test_log_tailer.py
+"""增量读日志尾部：追加、半行、被截断的 UTF-8、截断 / 轮转后重建"""
+import os
+from core.log_tailer import LogTailer
+
+
+def _append(path, data):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def test_incremental_reads_keep_offsets(tmp_path):
+    log = str(tmp_path / "a.log")
+    _append(log, b"one\ntwo\n")
+    tailer = LogTailer()
+    assert tailer.read_lines(log) == [(0, "one"), (4, "two")]
+    _append(log, b"three\nfou")
+    assert tailer.read_lines(log)[-2:] == [(8, "three"), (14, "fou")]
+    _append(log, b"r\n")
+    assert tailer.read_lines(log, lines=2) == [(8, "three"), (14, "four")]
+    assert tailer.read_tail(str(tmp_path / "missing.log")) is None
+
+
+def test_utf8_sequence_split_across_reads(tmp_path):
+    log = str(tmp_path / "u.log")
+    data = "训练完成\n".encode("utf-8")
+    tailer = LogTailer()
+    # 在 “完” 的 3 个字节中间断开
+    cut = len("训练".encode("utf-8")) + 1
+    _append(log, data[:cut])
+    assert tailer.read_tail(log) == "训练"
+    _append(log, data[cut:])
+    assert tailer.read_tail(log) == "训练完成"
+
+
+def test_truncated_file_is_reread(tmp_path):
+    log = str(tmp_path / "t.log")
+    _append(log, b"old line 1\nold line 2\n")
+    tailer = LogTailer()
+    tailer.read_lines(log)
+    with open(log, "wb") as f:
+        f.write(b"new\n")
+    assert tailer.read_lines(log) == [(0, "new")]
+
+
+def test_rotation_by_rename_and_by_rewrite(tmp_path):
+    log = str(tmp_path / "r.log")
+    _append(log, b"first run\n")
+    tailer = LogTailer()
+    tailer.read_lines(log)
+
+    # logrotate：改名后新建同名文件 (inode 变了)
+    os.rename(log, log + ".1")
+    _append(log, b"second run, longer than before\n")
+    assert tailer.read_tail(log) == "second run, longer than before"
+
+    # 同一个 inode 被整个重写 (文件头对不上)，而且比之前更长
+    with open(log, "r+b") as f:
+        f.write(b"third run!" + b"x" * 40 + b"\n")
+    assert tailer.read_tail(log) == "third run!" + "x" * 40
+
+
+def test_first_open_reads_only_the_end(tmp_path, monkeypatch):
+    log = str(tmp_path / "big.log")
+    _append(log, b"".join(b"line %03d\n" % i for i in range(100)))
+    monkeypatch.setattr(LogTailer, "INITIAL_BYTES", 45)
+    lines = LogTailer().read_lines(log)
+    # 从中间开始读，残缺的第一行被丢掉
+    assert [text for _, text in lines] == ["line 096", "line 097", "line 098", "line 099"]
+    assert lines[0][0] == 96 * 9
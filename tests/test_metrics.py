@@ -0,0 +1,49 @@
+# tests/test_metrics.py
+"""指标库：分几次扫进来的行按它们在日志里的位置排序，和扫描时间无关"""
+import time
+from core.metrics import MetricsStore, EvalScraper
+
+
+def test_series_keeps_log_order_across_scans(workspace):
+    log = workspace / "train.log"
+    store = MetricsStore()
+    store.track(str(log), "exp")
+    log.write_text("Epoch 0:  50%|#| 1/2 [00:01<00:01, 2.0it/s, loss=0.9]\n"
+                   "Epoch 0: 100%|#| 2/2 [00:01<00:00, 2.0it/s, loss=0.8]\n")
+    store.scan("exp")
+    with open(log, "a") as f:
+        f.write("Epoch 1: 100%|#| 2/2 [00:01<00:00, 2.0it/s, loss=0.7]\n")
+    store.scan("exp")
+
+    rows = store.series("exp", "loss")
+    assert [r[4] for r in rows] == [0.9, 0.8, 0.7]
+    # 同一批扫进来的行入库时间相同，seq 仍然能分出先后
+    assert rows[0][0] == rows[1][0]
+    assert store.latest_values("exp")["loss"] == 0.7
+
+
+def test_later_run_sorts_after_earlier_run(workspace):
+    store = MetricsStore()
+    first, second = workspace / "a_run2.log", workspace / "b_run1.log"
+    store.track(str(first), "exp")
+    time.sleep(0.01)
+    store.track(str(second), "exp")
+    # 后登记的日志先被扫描
+    second.write_text("Epoch 0: 100%|#| 2/2 [00:01<00:00, 2.0it/s, loss=0.5]\n")
+    store.scan("exp")
+    first.write_text("Epoch 0: 100%|#| 2/2 [00:01<00:00, 2.0it/s, loss=1.5]\n")
+    store.scan("exp")
+    assert [r[4] for r in store.series("exp", "loss")] == [1.5, 0.5]
+
+
+def test_eval_scraper_requires_separator():
+    scraper = EvalScraper()
+    for line, value in [("Metrics/FID: 0.52", 0.52),
+                        ("{'Metrics/FID': tensor(0.52)}", 0.52),
+                        ("│ Metrics/FID │ 0.52 │", 0.52),
+                        ("FID = 1.5e-1", 0.15),
+                        ("FID tensor(-0.3)", -0.3)]:
+        assert scraper.parse_line(line)[0]["metrics"]["FID"] == value, line
+    assert scraper.parse_line("Evaluating FID for epoch 12") == []
+    assert scraper.parse_line("Computing R_precision on 32 batches") == []
+    assert scraper.parse_line("R_precision (top 1): 0.7")[0]["metrics"] == {"R_precision": 0.7}
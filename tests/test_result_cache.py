@@ -0,0 +1,31 @@
+# tests/test_result_cache.py
+"""结果缓存：走 GPU 队列提交的任务也要在启动前登记，跑得再快也能记下产物"""
+from core.gpu_queue import GPUJobQueue
+from core.process_mgr import ProcessManager
+from core.result_cache import ResultCache, dirs_since
+
+
+def test_fast_queued_job_is_cached_with_outputs_created_at_start(workspace):
+    queue = GPUJobQueue()
+    queue.configure(sched_cfg={"fake_devices": ["0"], "slots_per_device": 1})
+    out = workspace / "results"
+    out.mkdir()
+    cache = {"params": {"seed": 1}, "outputs": lambda since: dirs_since(str(out), since)}
+    cmd = f"mkdir {out}/run1 && touch {out}/run1/motion.npy"
+
+    ok, log_path = ProcessManager.submit(cmd, "cached", str(workspace), cache=cache)
+    assert ok and not ProcessManager.cache_hit(log_path)
+    # 卡槽在缓存登记之后才释放
+    assert queue.wait_until(lambda: ProcessManager.job_state(log_path) == "finished"
+                            and queue.snapshot()["usage"] == {"0": 0}, 15)
+
+    ok, again = ProcessManager.submit(cmd, "cached", str(workspace), cache=cache)
+    assert ok and again == log_path and ProcessManager.cache_hit(again)
+
+
+def test_rejected_submit_drops_cache_entry(workspace):
+    GPUJobQueue().configure(sched_cfg={"fake_devices": ["0"], "slots_per_device": 1})
+    ok, _ = ProcessManager.submit("echo hi", "nowhere", str(workspace), gpu="7",
+                                  cache={"outputs": [str(workspace)]})
+    assert not ok
+    assert ResultCache()._pending == {}
@@ -0,0 +1,31 @@
+# tests/test_supervisor.py
+"""JobSupervisor：单例并发初始化、启动失败的任务不留在任务表里"""
+import threading
+from core.supervisor import JobSupervisor
+from core.process_mgr import ProcessManager
+
+
+def test_singleton_is_fully_built_for_concurrent_callers(workspace):
+    seen, barrier = [], threading.Barrier(8)
+
+    def grab():
+        barrier.wait()
+        sup = JobSupervisor()
+        seen.append((sup, hasattr(sup, "watch_cfg")))
+
+    threads = [threading.Thread(target=grab) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(sup) for sup, _ in seen}) == 1
+    assert all(ready for _, ready in seen)
+
+
+def test_failed_launch_leaves_no_zombie_job(workspace):
+    log_path = str(workspace / "missing_dir" / "job.log")
+    ok, msg = ProcessManager.run_with_log("echo hi", "broken", str(workspace), log_path=log_path)
+    assert not ok and msg
+    assert ProcessManager.get_job(log_path) is None
+    assert ProcessManager.job_state(log_path) == "failed"
+    assert JobSupervisor().list_jobs() == []
@@ -0,0 +1,98 @@
+# tests/test_telemetry.py
+"""资源采样：假 GPU 探测器、环形缓冲区容量、每轮的时间预算"""
+import time
+import subprocess
+from core.telemetry import ResourceSampler, FakeGpuUsageProbe, make_gpu_probe
+
+
+class _Job:
+    """sample_once 只用到 job_id / pid / is_alive"""
+
+    def __init__(self, job_id, pid):
+        self.job_id, self.pid, self.is_alive = job_id, pid, True
+
+
+class _CountingProbe(FakeGpuUsageProbe):
+    def __init__(self, usage):
+        super().__init__(usage)
+        self.calls = 0
+
+    def sample(self):
+        self.calls += 1
+        return super().sample()
+
+
+def _sleeper():
+    return subprocess.Popen(["sleep", "30"], start_new_session=True)
+
+
+def test_fake_gpu_probe_from_config():
+    assert isinstance(make_gpu_probe({"gpu_probe": "fake"}), FakeGpuUsageProbe)
+
+
+def test_samples_child_process_with_fake_gpu_probe(workspace):
+    proc = _sleeper()
+    try:
+        sampler = ResourceSampler()
+        probe = _CountingProbe({proc.pid: 512.0})
+        sampler.set_gpu_probe(probe)
+        sampler.gpu_every = 5
+        job = _Job("sleep_1", proc.pid)
+        for _ in range(6):
+            sampler.sample_once([job])
+
+        latest = sampler.latest("sleep_1")
+        assert latest["nprocs"] == 1 and latest["threads"] >= 1 and latest["rss_mb"] > 0
+        assert latest["gpu_mem_mb"] == 512.0
+        # 第 1 轮和第 6 轮问 GPU，其它轮用缓存
+        assert probe.calls == 2
+        assert sampler.summary("sleep_1")["samples"] == 6
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_ring_buffers_are_bounded(workspace):
+    procs = [_sleeper() for _ in range(3)]
+    try:
+        sampler = ResourceSampler()
+        sampler.set_gpu_probe(FakeGpuUsageProbe())
+        sampler.history = 3
+        sampler.MAX_JOBS = 2
+        jobs = [_Job(f"job_{i}", p.pid) for i, p in enumerate(procs)]
+        for _ in range(5):
+            sampler.sample_once(jobs[:2])
+        assert len(sampler.samples("job_0")) == 3
+
+        # 第三个任务进来，最早的那个整个缓冲区被挤掉
+        sampler.sample_once(jobs)
+        assert sampler.samples("job_0") == []
+        assert len(sampler.samples("job_2")) == 1
+    finally:
+        for p in procs:
+            p.kill()
+            p.wait()
+
+
+def test_pass_interval_respects_overhead_budget(workspace):
+    sampler = ResourceSampler()
+    sampler.interval, sampler.max_overhead = 1.0, 0.05
+    assert abs(sampler.next_wait(0.01) - 0.99) < 1e-9
+    # 一轮 0.1s 时 5% 预算要求两轮开头隔 2s
+    assert abs(sampler.next_wait(0.1) - 1.9) < 1e-9
+
+    starts = []
+
+    def slow_pass(jobs=None):
+        starts.append(time.monotonic())
+        time.sleep(0.02)
+
+    sampler.interval, sampler.max_overhead = 0.1, 0.1
+    sampler.sample_once = slow_pass
+    sampler.ensure_started()
+    time.sleep(1.1)
+    sampler.shutdown()
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    # 一轮 0.02s、预算 10%：每轮至少隔 0.2s，远大于 interval
+    assert 3 <= len(starts) <= 6
+    assert min(gaps) >= 0.19
@@ -0,0 +1,110 @@
+# tests/test_worker_pool.py
+"""空闲的常驻 worker 在有任务等卡时让出卡槽"""
+import time
+import pytest
+from core.gpu_queue import GPUJobQueue, FakeDeviceProbe
+from core.process_mgr import ProcessManager
+from core.worker_pool import WarmWorker, WarmWorkerPool
+
+
+def _wait(predicate, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def _ready_worker(pool, root):
+    ok, log = ProcessManager.submit("sleep 60", "warm_fake", str(root), priority="interactive")
+    assert ok and _wait(lambda: ProcessManager.job_state(log) == "running")
+    worker = WarmWorker("fake@auto", "fake.ckpt", None, str(root), str(root / "none.sock"))
+    worker.log_path, worker.status = log, "ready"
+    pool._workers[worker.key] = worker
+    return worker
+
+
+def test_idle_worker_yields_slot_to_waiting_job(workspace):
+    GPUJobQueue().configure(probe=FakeDeviceProbe(["0"]), sched_cfg={"slots_per_device": 1})
+    pool = WarmWorkerPool()
+    worker = _ready_worker(pool, workspace)
+
+    ok, waiting = ProcessManager.submit("echo hi", "single_infer", str(workspace), priority="interactive")
+    assert ProcessManager.job_state(waiting) == "queued"
+
+    # 刚用过：先不让
+    worker.last_used = time.time()
+    pool._reap(time.time())
+    assert worker.status == "ready"
+
+    worker.last_used = time.time() - pool.yield_after - 1
+    pool._reap(time.time())
+    assert worker.status == "stopped"
+    assert _wait(lambda: ProcessManager.job_state(waiting) == "finished")
+
+
+def test_idle_worker_keeps_slot_when_nobody_waits(workspace):
+    GPUJobQueue().configure(probe=FakeDeviceProbe(["0", "1"]), sched_cfg={"slots_per_device": 1})
+    pool = WarmWorkerPool()
+    worker = _ready_worker(pool, workspace)
+    worker.last_used = time.time() - pool.yield_after - 1
+    pool._reap(time.time())
+    assert worker.status == "ready"
+    ProcessManager.stop_job(worker.log_path)
+
+
+def _fake_worker(pool, name, busy=0, last_used=0.0):
+    worker = WarmWorker(pool.worker_key(f"{name}.ckpt", None), f"{name}.ckpt", None, ".", f"{name}.sock")
+    worker.status, worker.busy, worker.last_used = "ready", busy, last_used
+    worker.log_path = f"{name}.log"
+    pool._workers[worker.key] = worker
+    return worker
+
+
+def _unlocked_stop(pool, stopped):
+    """替换 _stop：记下停了谁，并确认调用时没有拿着池子的锁"""
+    def stop(worker):
+        assert pool._lock.acquire(blocking=False), "_stop 不能在锁里调用"
+        pool._lock.release()
+        stopped.append(worker.key)
+        worker.status = "stopped"
+    return stop
+
+
+def test_full_pool_of_busy_workers_refuses_new_worker(workspace, monkeypatch):
+    pool = WarmWorkerPool()
+    pool.max_workers = 1
+    monkeypatch.setattr(WarmWorker, "alive", property(lambda w: w.status in ("starting", "ready")))
+    _fake_worker(pool, "busy", busy=1)
+    started = []
+    monkeypatch.setattr(pool, "_start_worker", started.append)
+    with pytest.raises(RuntimeError, match="上限"):
+        pool.ensure("other.ckpt", None, str(workspace))
+    assert started == [] and len(pool.workers()) == 1
+
+
+def test_full_pool_evicts_idle_worker_outside_the_lock(workspace, monkeypatch):
+    pool = WarmWorkerPool()
+    pool.max_workers = 2
+    monkeypatch.setattr(WarmWorker, "alive", property(lambda w: w.status in ("starting", "ready")))
+    old = _fake_worker(pool, "old", last_used=1.0)
+    _fake_worker(pool, "busy", busy=1)
+    stopped, started = [], []
+    monkeypatch.setattr(pool, "_stop", _unlocked_stop(pool, stopped))
+    monkeypatch.setattr(pool, "_start_worker", started.append)
+
+    worker = pool.ensure("new.ckpt", None, str(workspace))
+    assert stopped == [old.key] and started == [worker]
+    assert sum(w.status in ("starting", "ready") for w in pool.workers()) == 2
+
+
+def test_reap_stops_workers_outside_the_lock(workspace, monkeypatch):
+    pool = WarmWorkerPool()
+    idle = _fake_worker(pool, "idle", last_used=time.time() - pool.idle_ttl - 1)
+    fresh = _fake_worker(pool, "fresh", last_used=time.time())
+    stopped = []
+    monkeypatch.setattr(pool, "_stop", _unlocked_stop(pool, stopped))
+    pool._reap(time.time())
+    assert stopped == [idle.key]
+    assert fresh.status == "ready"